@@ -1,22 +1,61 @@
 import sys
 import os
 import mmap
+import bisect
+import tempfile
+import hashlib
+import difflib
+import codecs
+import fnmatch
+import shutil
+import pickle
+import threading
+import re
+import multiprocessing
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from functools import lru_cache, partial
+from collections import deque
+from array import array
+from itertools import accumulate, islice
+from operator import itemgetter, methodcaller
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QPlainTextEdit, QWidget, QVBoxLayout,
     QHBoxLayout, QFileDialog, QMessageBox, QStatusBar, QMenuBar,
     QToolBar, QLabel, QLineEdit, QDialog, QPushButton, QSplitter,
     QTreeView, QFileSystemModel, QFrame, QTextEdit, QInputDialog, QMenu,
-    QTabWidget, QTabBar, QStyle, QScrollArea, QToolTip
+    QTabWidget, QTabBar, QStyle, QToolTip, QListView, QStyledItemDelegate,
+    QProgressDialog, QCheckBox
 )
 from PySide6.QtGui import (
     QAction, QKeySequence, QFont, QColor, QPainter, QTextFormat,
     QTextCursor, QFontMetrics, QPalette, QShortcut, QTextCharFormat,
     QSyntaxHighlighter, QTextDocument
 )
-from PySide6.QtCore import Qt, QRect, QSize, QDir, Signal, QTimer, QPoint, QMimeData, QUrl, QRegularExpression, QElapsedTimer
+from PySide6.QtCore import (
+    Qt, QRect, QSize, QDir, Signal, QTimer, QPoint, QMimeData, QUrl,
+    QElapsedTimer, QObject, QThreadPool, QEventLoop, QStandardPaths,
+    QAbstractListModel, QModelIndex
+)
 from PySide6.QtGui import QDrag
 import time
 
+try:
+    import numpy as np  # Optional: vectorized newline scanning for LineIndex
+except ImportError:
+    np = None
+
+# Worker threads: Python's garbage collector runs in whichever thread pushes
+# the count of live container objects over its threshold, and a collection
+# on a pool thread can free Qt objects caught in unreachable cycles off the
+# GUI thread. Pool threads therefore keep few such objects alive: strings,
+# bytes and arrays, which the collector does not count, and at most a few
+# containers per file or per batch. Work that keeps objects per line or per
+# match runs in a spawned process (SearchEngine.pool,
+# BackgroundTokenizer.pool) and sends its results back pickled, to be
+# unpickled on the GUI thread.
+
 
 class FrameTimerWidget(QLabel):
     """Widget that displays frame timing statistics (last, average, max).
@@ -136,6 +175,144 @@ class FrameTimerWidget(QLabel):
         self.setText(text)
 
 
+class FrameTask:
+    """A piece of incremental work run by the FrameScheduler.
+
+    Has the start/stop/isActive interface of the QTimer it replaces. The step
+    callable is given the milliseconds left in this frame's budget and should
+    stop the task once its work is done. priority is an int or a callable
+    returning one, so a task can move up when its tab becomes visible.
+    """
+
+    def __init__(self, step, priority, name='', owner=None, scheduler=None):
+        self.step = step
+        self.priority = priority
+        self.name = name
+        self.scheduler = scheduler
+        self._active = False
+        if owner is not None:
+            # Drop the task with the widget it works on
+            owner.destroyed.connect(lambda *args: self.stop())
+
+    def current_priority(self):
+        return self.priority() if callable(self.priority) else self.priority
+
+    def start(self):
+        if not self._active:
+            self._active = True
+            (self.scheduler or FrameScheduler.instance()).add(self)
+
+    def stop(self):
+        if self._active:
+            self._active = False
+            (self.scheduler or FrameScheduler.instance()).remove(self)
+
+    def isActive(self):
+        return self._active
+
+
+class FrameScheduler(QObject):
+    """Runs all incremental work (loading, highlighting, replace) within one
+    per-frame time budget.
+
+    Each frame, active tasks run in priority order until FRAME_BUDGET_MS is
+    spent; tasks of equal priority take turns starting first. Queue depth and
+    time spent are kept for instrumentation (see stats()).
+    """
+
+    PRIORITY_VISIBLE_TAB = 0
+    PRIORITY_VISIBLE_REGION = 1
+    PRIORITY_BACKGROUND = 2
+
+    FRAME_BUDGET_MS = 12.0
+    FRAME_INTERVAL_MS = 16
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Return the scheduler shared by all windows."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tasks = []
+        self.frames = 0
+        self.last_frame_ms = 0.0
+        self.max_frame_ms = 0.0
+        self.total_ms = 0.0
+        self.task_ms = {}  # Task name -> total milliseconds spent
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.run_frame)
+        self.timer.setInterval(self.FRAME_INTERVAL_MS)
+
+    def add(self, task):
+        if task not in self.tasks:
+            self.tasks.append(task)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def remove(self, task):
+        if task in self.tasks:
+            self.tasks.remove(task)
+        if not self.tasks:
+            self.timer.stop()
+
+    def queue_depth(self, priority=None):
+        """Number of active tasks, optionally only those at priority."""
+        if priority is None:
+            return len(self.tasks)
+        return sum(1 for task in self.tasks if task.current_priority() == priority)
+
+    def stats(self):
+        """Return queue depth and time spent, for instrumentation."""
+        return {
+            'queue_depth': self.queue_depth(),
+            'depth_by_priority': {
+                priority: self.queue_depth(priority)
+                for priority in (self.PRIORITY_VISIBLE_TAB, self.PRIORITY_VISIBLE_REGION,
+                                 self.PRIORITY_BACKGROUND)
+            },
+            'frames': self.frames,
+            'last_frame_ms': self.last_frame_ms,
+            'max_frame_ms': self.max_frame_ms,
+            'total_ms': self.total_ms,
+            'task_ms': dict(self.task_ms),
+        }
+
+    def run_frame(self):
+        """Run tasks in priority order until the frame budget is spent."""
+        start_time = time.time()
+        # sorted() is stable, so equal priorities keep their rotation order
+        ordered = sorted(self.tasks, key=lambda task: task.current_priority())
+        ran = []
+        for task in ordered:
+            remaining_ms = self.FRAME_BUDGET_MS - (time.time() - start_time) * 1000
+            if remaining_ms <= 0:
+                break
+            if not task.isActive():
+                continue  # Stopped by an earlier task this frame
+            task_start = time.time()
+            task.step(remaining_ms)
+            spent_ms = (time.time() - task_start) * 1000
+            self.task_ms[task.name] = self.task_ms.get(task.name, 0.0) + spent_ms
+            ran.append(task)
+        # Tasks that ran go to the back so their peers start first next frame
+        for task in ran:
+            if task in self.tasks:
+                self.tasks.remove(task)
+                self.tasks.append(task)
+        frame_ms = (time.time() - start_time) * 1000
+        self.frames += 1
+        self.last_frame_ms = frame_ms
+        self.max_frame_ms = max(self.max_frame_ms, frame_ms)
+        self.total_ms += frame_ms
+        if not self.tasks:
+            self.timer.stop()
+
+
 class WelcomeScreen(QWidget):
     """Welcome screen shown when no tabs are open."""
     
@@ -557,6 +734,146 @@ class LineNumberArea(QWidget):
         self.editor.line_number_area_paint_event(event)
 
 
+class Tokenizer:
+    """Splits a line into highlighting tokens in one left-to-right pass.
+
+    All rules of a language are alternatives of a single regex, so a line
+    is scanned once however many rules there are. Tokens never overlap:
+    the match that starts first wins, and of matches starting at the same
+    place the rule listed first, so a '#' inside a string stays part of the
+    string. Tokens come back as flat (start, length, kind) triples indexing
+    self.kinds.
+
+    A rule is (source, kind) where kind is a kind name, None to consume the
+    match unformatted, a tuple giving a kind per capture group, or WORD to
+    classify an identifier as keyword, builtin or function call. A context
+    is (open_source, close_source, kind, nests) for a construct that can
+    run past the end of its line, such as a block comment or triple-quoted
+    string; close_source is matched from the end of the opener, and a
+    context that nests counts inner openers until its depth is back to 0.
+
+    The state a line ends in is 0 outside any context, otherwise
+    1 + the context index in the low byte and the nesting depth above it.
+    Lines are highlighted again only while their outgoing state changes,
+    so states must describe the open context fully.
+    """
+
+    WORD = 'word'
+    _CALL = re.compile(r'\s*\(')
+
+    def __init__(self, rules, contexts=(), keywords=(), builtins=(), calls=False):
+        self.kinds = []
+        self._words = {}
+        self._calls = calls
+        self._closers = []
+        # Action per outer group: context index, WORD, or [(group, kind)]
+        self._actions = {}
+        alternatives = []
+        group = 1
+        for index, (open_source, close_source, kind, nests) in enumerate(contexts):
+            # Nested contexts search for the next opener or closer instead
+            nested = re.compile(f'({open_source})|{close_source}') if nests else None
+            self._closers.append((re.compile(close_source), self._kind(kind), nested))
+            self._actions[group] = index
+            alternatives.append(f'({open_source})')
+            group += 1 + re.compile(open_source).groups
+        for source, kind in rules:
+            inner = re.compile(source).groups
+            if kind == self.WORD:
+                action = kind
+            elif isinstance(kind, tuple):
+                action = [(group + 1 + i, self._kind(k)) for i, k in enumerate(kind)]
+            else:
+                action = [(group, self._kind(kind))]
+            self._actions[group] = action
+            alternatives.append(f'({source})')
+            group += 1 + inner
+        for name, kind in ((builtins, 'builtin'), (keywords, 'keyword')):
+            for word in name:
+                self._words[word] = self._kind(kind)
+        self._function = self._kind('function') if calls else None
+        self._regex = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def _kind(self, name):
+        """Index of kind name in self.kinds, or None for unformatted."""
+        if name is None:
+            return None
+        if name not in self.kinds:
+            self.kinds.append(name)
+        return self.kinds.index(name)
+
+    def tokenize(self, text, state=0):
+        """Return (tokens, state) for one line entered in state."""
+        tokens = array('I')
+        pos = 0
+        if state > 0:
+            pos, state = self._close(text, 0, state, 0, tokens)
+            if state:
+                return tokens, state
+        if self._regex is None:
+            return tokens, 0
+        search = self._regex.search
+        actions = self._actions
+        words = self._words
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            group = match.lastindex
+            action = actions[group]
+            start, end = match.span()
+            if action.__class__ is int:
+                pos, state = self._close(text, end, action + 1, start, tokens)
+                if state:
+                    break
+                continue
+            if action is self.WORD:
+                kind = words.get(match.group())
+                if kind is None and self._calls and self._CALL.match(text, end):
+                    kind = self._function
+                if kind is not None:
+                    tokens.extend((start, end - start, kind))
+            else:
+                for inner, kind in action:
+                    if kind is not None:
+                        first, last = match.span(inner)
+                        if first >= 0:
+                            tokens.extend((first, last - first, kind))
+            pos = end if end > start else end + 1
+        return tokens, state
+
+    def _close(self, text, pos, state, start, tokens):
+        """Emit the context open in state from start to its close.
+
+        Returns (position, state): the end of the context and 0, or the end
+        of the line and the state the context is still open in.
+        """
+        closer, kind, nested = self._closers[(state & 0xff) - 1]
+        if nested is None:
+            match = closer.match(text, pos)
+            end = match.end() if match else len(text)
+            state = 0 if match else state
+        else:
+            depth = state >> 8
+            while True:
+                match = nested.search(text, pos)
+                if match is None:
+                    end = len(text)
+                    state = (state & 0xff) | depth << 8
+                    break
+                pos = match.end()
+                if match.lastindex == 1:
+                    depth += 1
+                elif depth:
+                    depth -= 1
+                else:
+                    end, state = pos, 0
+                    break
+        if kind is not None and end > start:
+            tokens.extend((start, end - start, kind))
+        return end, state
+
+
 class SyntaxHighlighter(QSyntaxHighlighter):
     """Multi-language syntax highlighter with static language definitions."""
     
@@ -582,8 +899,8 @@ class SyntaxHighlighter(QSyntaxHighlighter):
                 'sum', 'super', 'tuple', 'type', 'vars', 'zip'
             ],
             'comment': '#',
-            'string_delimiters': ['"""', "'''", '"', "'"],
-            'multiline_strings': True,
+            'string_delimiters': ['"', "'"],
+            'multiline_strings': ['"""', "'''"],
         },
         'javascript': {
             'keywords': [
@@ -601,9 +918,11 @@ class SyntaxHighlighter(QSyntaxHighlighter):
             ],
             'comment': '//',
             'multiline_comment': ('/*', '*/'),
-            'string_delimiters': ['"', "'", '`'],
+            'string_delimiters': ['"', "'"],
+            'multiline_strings': ['`'],
         },
         'html': {
+            'multiline_comment': ('<!--', '-->'),
             'tags': True,
             'attributes': True,
         },
@@ -697,6 +1016,7 @@ class SyntaxHighlighter(QSyntaxHighlighter):
             ],
             'comment': '//',
             'multiline_comment': ('/*', '*/'),
+            'nested_comments': True,
             'string_delimiters': ['"'],
         },
         'go': {
@@ -715,7 +1035,8 @@ class SyntaxHighlighter(QSyntaxHighlighter):
             ],
             'comment': '//',
             'multiline_comment': ('/*', '*/'),
-            'string_delimiters': ['"', "'", '`'],
+            'string_delimiters': ['"', "'"],
+            'raw_strings': ['`'],
         },
     }
     
@@ -765,9 +1086,28 @@ class SyntaxHighlighter(QSyntaxHighlighter):
         'value': '#ce9178',        # Orange (CSS values)
     }
     
+    # Languages where an identifier followed by '(' is a function call
+    CALL_LANGUAGES = ('javascript', 'java', 'c', 'cpp', 'rust', 'go')
+    
     def __init__(self, document, language=None):
         super().__init__(document)
         self.language = language
+        # Optional block -> bool deciding whether a block is highlighted now
+        self.block_filter = None
+        # Per block number: (revision, state in, tokens, state out) from a
+        # BackgroundTokenizer, or None
+        self.token_cache = []
+        # Blocks tokenized so far, and by the last edit alone
+        self.tokenized_blocks = 0
+        self.last_edit_tokenized = 0
+        self._edit_tokenized_from = 0
+        self._block_count = document.blockCount()
+        # Qt rehighlights an edit in its own contentsChange slot; attach to
+        # the document again so that slot runs between these two
+        self.setDocument(None)
+        document.contentsChange.connect(self._edit_started)
+        self.setDocument(document)
+        document.contentsChange.connect(self._edit_finished)
         self._setup_formats()
         self._setup_rules()
     
@@ -783,235 +1123,1434 @@ class SyntaxHighlighter(QSyntaxHighlighter):
     
     def _setup_rules(self):
         """Setup highlighting rules based on current language."""
-        self.rules = []
-        self.multiline_state = None
-        self.multiline_comment = None
-        
-        if not self.language or self.language not in self.LANGUAGES:
-            return
-        
-        lang_def = self.LANGUAGES[self.language]
-        
-        # Keywords
-        if 'keywords' in lang_def:
-            keywords = lang_def['keywords']
-            pattern = r'\b(' + '|'.join(keywords) + r')\b'
-            self.rules.append((QRegularExpression(pattern), 'keyword'))
-        
-        # Builtins
-        if 'builtins' in lang_def:
-            builtins = lang_def['builtins']
-            pattern = r'\b(' + '|'.join(builtins) + r')\b'
-            self.rules.append((QRegularExpression(pattern), 'builtin'))
-        
-        # Numbers
-        self.rules.append((QRegularExpression(r'\b\d+\.?\d*([eE][+-]?\d+)?\b'), 'number'))
-        self.rules.append((QRegularExpression(r'\b0[xX][0-9a-fA-F]+\b'), 'number'))
-        
-        # Function definitions and calls
-        if self.language in ['python']:
-            self.rules.append((QRegularExpression(r'\bdef\s+(\w+)'), 'function'))
-            self.rules.append((QRegularExpression(r'\bclass\s+(\w+)'), 'class'))
-            self.rules.append((QRegularExpression(r'@\w+'), 'decorator'))
-        elif self.language in ['javascript', 'java', 'c', 'cpp', 'rust', 'go']:
-            self.rules.append((QRegularExpression(r'\b\w+(?=\s*\()'), 'function'))
-        
-        # Strings (single line)
-        if 'string_delimiters' in lang_def:
-            for delim in lang_def.get('string_delimiters', []):
-                if len(delim) == 1:
-                    escaped_delim = '\\' + delim if delim in '"\'`' else delim
-                    pattern = f'{escaped_delim}[^{escaped_delim}\\\\]*(\\\\.[^{escaped_delim}\\\\]*)*{escaped_delim}'
-                    self.rules.append((QRegularExpression(pattern), 'string'))
+        self.rules, self.contexts = self.language_rules(self.language)
+        self.tokenizer = self.tokenizer_for(self.language)
+    
+    @classmethod
+    def language_rules(cls, language):
+        """Return (rules, contexts) for a language, in precedence order."""
+        lang_def = cls.LANGUAGES.get(language)
+        if not lang_def:
+            return [], []
+        rules = []
+        contexts = []
+        
+        # Constructs that can span lines: each one is a block state
+        if 'multiline_comment' in lang_def:
+            start_delim, end_delim = lang_def['multiline_comment']
+            if lang_def.get('nested_comments'):
+                close = re.escape(end_delim)
+            else:
+                close = r'.*?' + re.escape(end_delim)
+            contexts.append((re.escape(start_delim), close, 'comment',
+                             lang_def.get('nested_comments', False)))
+        for delim in lang_def.get('multiline_strings', []):
+            # Tried before the single-quote string rules they start like
+            contexts.append((re.escape(delim), r'(?:\\.|[^\\])*?' + re.escape(delim), 'string', False))
+        for delim in lang_def.get('raw_strings', []):
+            contexts.append((re.escape(delim), r'.*?' + re.escape(delim), 'string', False))
         
         # Single-line comments
         if lang_def.get('comment'):
-            comment = lang_def['comment']
-            if comment == '#':
-                self.rules.append((QRegularExpression(r'#[^\n]*'), 'comment'))
-            elif comment == '//':
-                self.rules.append((QRegularExpression(r'//[^\n]*'), 'comment'))
+            rules.append((re.escape(lang_def['comment']) + '.*', 'comment'))
+        
+        # Strings
+        for delim in lang_def.get('string_delimiters', []):
+            quote = re.escape(delim)
+            rules.append((quote + r'(?:\\.|[^' + quote + r'\\])*' + quote, 'string'))
         
         # HTML-specific rules
-        if self.language == 'html':
-            # Tags
-            self.rules.append((QRegularExpression(r'</?[\w-]+'), 'tag'))
-            self.rules.append((QRegularExpression(r'/?>'), 'tag'))
-            # Attributes
-            self.rules.append((QRegularExpression(r'\b[\w-]+(?=\s*=)'), 'attribute'))
-            # Attribute values
-            self.rules.append((QRegularExpression(r'"[^"]*"'), 'string'))
-            self.rules.append((QRegularExpression(r"'[^']*'"), 'string'))
-            # Comments
-            self.rules.append((QRegularExpression(r'<!--[^>]*-->'), 'comment'))
+        if language == 'html':
+            rules.append((r'</?[\w-]+', 'tag'))
+            rules.append((r'/?>', 'tag'))
+            rules.append((r'\b[\w-]+(?=\s*=)', 'attribute'))
+            rules.append((r'"[^"]*"', 'string'))
+            rules.append((r"'[^']*'", 'string'))
         
         # CSS-specific rules
-        if self.language == 'css':
-            # Properties
-            self.rules.append((QRegularExpression(r'[\w-]+(?=\s*:)'), 'property'))
-            # Values (after colon)
-            self.rules.append((QRegularExpression(r':\s*[^;{}]+'), 'value'))
-            # Selectors
-            self.rules.append((QRegularExpression(r'[.#]?[\w-]+(?=\s*[{,])'), 'class'))
-        
-        # Store multiline comment delimiters
-        if 'multiline_comment' in lang_def:
-            self.multiline_comment = lang_def['multiline_comment']
-        else:
-            self.multiline_comment = None
-    
-    def set_language(self, language):
-        """Change the highlighting language."""
+        if language == 'css':
+            rules.append((r'[\w-]+(?=\s*:)', 'property'))
+            rules.append((r'[.#]?[\w-]+(?=\s*[{,])', 'class'))
+            rules.append((r':\s*[^;{}]+', 'value'))
+        
+        # Definitions
+        if language == 'python':
+            rules.append((r'@\w+', 'decorator'))
+            rules.append((r'\b(def)\s+(\w+)', ('keyword', 'function')))
+            rules.append((r'\b(class)\s+(\w+)', ('keyword', 'class')))
+        
+        # Keywords, builtins and function calls, looked up per identifier
+        if 'keywords' in lang_def or 'builtins' in lang_def:
+            rules.append((r'\b[^\W\d]\w*', Tokenizer.WORD))
+        
+        # Numbers
+        rules.append((r'\b(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?)\b', 'number'))
+        return rules, contexts
+    
+    @classmethod
+    @lru_cache(maxsize=None)
+    def tokenizer_for(cls, language):
+        """The compiled Tokenizer for a language, shared by all highlighters."""
+        rules, contexts = cls.language_rules(language)
+        lang_def = cls.LANGUAGES.get(language, {})
+        return Tokenizer(rules, contexts, lang_def.get('keywords', ()),
+                         lang_def.get('builtins', ()), language in cls.CALL_LANGUAGES)
+    
+    def set_language(self, language, rehighlight=True):
+        """Change the highlighting language; returns False, having done
+        nothing, when it is already the current language.
+
+        With rehighlight=False the caller highlights the document itself,
+        as CodeEditor does lazily for large files.
+        """
+        if language == self.language:
+            return False
         self.language = language
         self._setup_rules()
+        self.token_cache = []
         # Only rehighlight if there are rules to apply
-        if self.language and self.language in self.LANGUAGES and self.rules:
+        if rehighlight and self.language and self.language in self.LANGUAGES and self.rules:
             self.rehighlight()
+        return True
     
-    def set_language_from_file(self, file_path):
-        """Detect and set language from file extension."""
-        if file_path:
-            ext = os.path.splitext(file_path)[1].lower()
-            language = self.EXTENSION_MAP.get(ext)
-            self.set_language(language)
+    def set_language_from_file(self, file_path, rehighlight=True):
+        """Detect and set language from file extension; returns whether the
+        language changed."""
+        if not file_path:
+            return False
+        ext = os.path.splitext(file_path)[1].lower()
+        return self.set_language(self.EXTENSION_MAP.get(ext), rehighlight)
     
     def highlightBlock(self, text):
         """Apply syntax highlighting to a block of text."""
-        # Apply single-line rules
-        for pattern, format_name in self.rules:
-            if format_name not in self.formats:
+        if self.block_filter is not None and not self.block_filter(self.currentBlock()):
+            # Deferred: keeping the old state stops Qt from cascading onward
+            self.setCurrentBlockState(self.currentBlock().userState())
+            return
+        state = max(self.previousBlockState(), 0)
+        if self.token_cache:
+            block = self.currentBlock()
+            number = block.blockNumber()
+            entry = self.token_cache[number] if number < len(self.token_cache) else None
+            if entry is not None and entry[0] == block.revision() and entry[1] == state:
+                self.setCurrentBlockState(entry[3])
+                self.apply_tokens(text, entry[2])
+                return
+        tokens, state = self.tokenizer.tokenize(text, state)
+        self.tokenized_blocks += 1
+        self.setCurrentBlockState(state)
+        self.apply_tokens(text, tokens)
+    
+    def _edit_started(self, position, chars_removed, chars_added):
+        """Renumber the token cache before Qt rehighlights an edit."""
+        self._edit_tokenized_from = self.tokenized_blocks
+        count = self.document().blockCount()
+        delta = count - self._block_count
+        self._block_count = count
+        if not self.token_cache:
+            return
+        first = self.document().findBlock(position).blockNumber()
+        self.shift_token_cache(first + 1, delta)
+        # Edited blocks may even reuse a cached revision, after setPlainText
+        end = min(first + 1 + max(0, delta), len(self.token_cache))
+        self.token_cache[first:end] = [None] * (end - first)
+    
+    def _edit_finished(self, position, chars_removed, chars_added):
+        self.last_edit_tokenized = self.tokenized_blocks - self._edit_tokenized_from
+    
+    def shift_token_cache(self, at, delta):
+        """Renumber cached blocks after delta blocks were inserted at at
+        (or -delta removed)."""
+        if delta > 0:
+            self.token_cache[at:at] = [None] * delta
+        elif delta < 0:
+            del self.token_cache[at:at - delta]
+    
+    def apply_tokens(self, text, tokens):
+        """Set the formats of (start, length, kind) tokens on the current block."""
+        if not tokens:
+            return
+        formats = [self.formats.get(kind) for kind in self.tokenizer.kinds]
+        if _has_astral(text):
+            # Tokens count code points; Qt positions count UTF-16 units
+            offsets = list(accumulate((2 if c > '\uffff' else 1 for c in text), initial=0))
+            for i in range(0, len(tokens), 3):
+                fmt = formats[tokens[i + 2]]
+                if fmt is not None:
+                    start = offsets[tokens[i]]
+                    self.setFormat(start, offsets[tokens[i] + tokens[i + 1]] - start, fmt)
+            return
+        set_format = self.setFormat
+        for i in range(0, len(tokens), 3):
+            fmt = formats[tokens[i + 2]]
+            if fmt is not None:
+                set_format(tokens[i], tokens[i + 1], fmt)
+
+
+class BackgroundTokenizer:
+    """Tokenizes a document's blocks in a worker process for a token cache.
+
+    The GUI thread copies block texts and revisions a chunk at a time within
+    the frame budget and hands them, in order, to a worker process that
+    tokenizes them carrying the block state from line to line. Each chunk
+    comes back on the GUI thread, in a later frame, to on_tokenized(first
+    block number, entries) with an entry of (revision, state in, tokens,
+    state out) per block. An entry only applies while its block still has
+    that revision and is entered in that state.
+
+    Tokenizing makes objects per line, so it runs in a process rather than
+    on a pool thread (see the note on worker threads at the top), which
+    also keeps it from competing with highlighting for the GIL.
+    """
+
+    # Blocks copied per chunk
+    CHUNK_BLOCKS = 1024
+    # Most of a frame's budget that copying may use, as for LiveSearch
+    COPY_BUDGET_MS = 8.0
+    # Chunks copied ahead of the one being tokenized
+    CHUNKS_AHEAD = 2
+
+    _pool = None
+
+    @classmethod
+    def pool(cls):
+        """Return the process shared by all tokenize jobs.
+
+        Chunks are tokenized one after another, so one worker is enough,
+        and the search pool's workers stay free for searches.
+        """
+        if cls._pool is None:
+            # Spawned workers do not inherit the GUI's threads and locks
+            cls._pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return cls._pool
+
+    def __init__(self, document, language, on_tokenized, first_block=0, state=0,
+                 priority=None, owner=None):
+        self.document = document
+        self.language = language
+        self.on_tokenized = on_tokenized
+        self.state = state
+        self._next_block = first_block
+        self._chunk_ms = 0.0
+        # Copied (first block number, texts, revisions) not sent yet
+        self._chunks = deque()
+        # The chunk being tokenized: (first, revisions, future)
+        self._pending = None
+        self._copied = False
+        self._task = FrameTask(
+            self._step, priority or FrameScheduler.PRIORITY_BACKGROUND,
+            name='tokenize')
+        # Stop if the document, or the widget whose priority and callback
+        # it uses, goes away under it
+        (owner or document).destroyed.connect(lambda *args: self.cancel())
+
+    def start(self):
+        self._task.start()
+
+    def cancel(self):
+        """Stop copying and tokenizing; nothing more is emitted."""
+        self._task.stop()
+        self._chunks.clear()
+        if self._pending is not None:
+            self._pending[2].cancel()
+            self._pending = None
+
+    def is_finished(self):
+        """True once every chunk has been tokenized and handed back."""
+        return self._copied and not self._chunks and self._pending is None
+
+    def _step(self, budget_ms):
+        if self._pending is not None:
+            first, revisions, future = self._pending
+            if future.done():
+                self._pending = None
+                states_in, tokens, states_out = pickle.loads(future.result())
+                if states_out:
+                    self.state = states_out[-1]
+                self.on_tokenized(first, list(zip(revisions, states_in, tokens, states_out)))
+        if not self._copied and len(self._chunks) < self.CHUNKS_AHEAD:
+            self._copy_budgeted(budget_ms)
+        if self._pending is None:
+            if self._chunks:
+                first, texts, revisions = self._chunks.popleft()
+                future = self.pool().submit(tokenize_chunk, self.language, texts, self.state)
+                self._pending = (first, revisions, future)
+            elif self._copied:
+                self._task.stop()
+
+    def _copy_budgeted(self, budget_ms):
+        budget_ms = min(budget_ms, self.COPY_BUDGET_MS)
+        timer = QElapsedTimer()
+        timer.start()
+        document = self.document
+        copied = False
+        while self._next_block < document.blockCount():
+            # Stop before a chunk that would overrun the budget
+            if len(self._chunks) >= self.CHUNKS_AHEAD or (
+                    copied and timer.elapsed() + self._chunk_ms > budget_ms):
+                return
+            copied = True
+            chunk_timer = QElapsedTimer()
+            chunk_timer.start()
+            first = self._next_block
+            block = document.findBlockByNumber(first)
+            texts = []
+            revisions = []
+            while block.isValid() and len(texts) < self.CHUNK_BLOCKS:
+                texts.append(block.text())
+                revisions.append(block.revision())
+                block = block.next()
+            self._chunks.append((first, texts, revisions))
+            self._next_block = first + len(texts)
+            self._chunk_ms = (self._chunk_ms + chunk_timer.nsecsElapsed() / 1e6) / 2
+        self._copied = True
+
+
+def tokenize_chunk(language, texts, state):
+    """Tokenize consecutive lines entered in state, in a worker process.
+
+    Returns (states in, tokens, states out) pickled, with a state array
+    and a token array per line.
+    """
+    tokenize = SyntaxHighlighter.tokenizer_for(language).tokenize
+    states_in = array('I')
+    tokens = []
+    states_out = array('I')
+    for text in texts:
+        states_in.append(state)
+        line_tokens, state = tokenize(text, state)
+        tokens.append(line_tokens)
+        states_out.append(state)
+    return pickle.dumps((states_in, tokens, states_out), pickle.HIGHEST_PROTOCOL)
+
+
+def _has_astral(text):
+    """True if text has characters outside the BMP (two UTF-16 units in Qt)."""
+    return not text.isascii() and max(text) > '\uffff'
+
+
+def _utf16_length(text):
+    """Length of text in UTF-16 units, as Qt counts positions."""
+    return len(text.encode('utf-16-le')) // 2 if _has_astral(text) else len(text)
+
+
+class IntervalSet:
+    """A set of non-negative integers stored as sorted half-open ranges.
+
+    bounds alternates range starts and ends, so a number is in the set when
+    an odd number of bounds are <= it.
+    """
+
+    def __init__(self):
+        self.bounds = []
+
+    def __contains__(self, number):
+        return bisect.bisect_right(self.bounds, number) % 2 == 1
+
+    def __bool__(self):
+        return bool(self.bounds)
+
+    def clear(self):
+        self.bounds = []
+
+    def add(self, start, end):
+        """Add the numbers in [start, end), merging touching ranges."""
+        if start >= end:
+            return
+        i = bisect.bisect_left(self.bounds, start)
+        j = bisect.bisect_right(self.bounds, end)
+        self.bounds[i:j] = ([start] if i % 2 == 0 else []) + ([end] if j % 2 == 0 else [])
+
+    def discard(self, start, end):
+        """Remove the numbers in [start, end)."""
+        if start >= end:
+            return
+        i = bisect.bisect_left(self.bounds, start)
+        j = bisect.bisect_right(self.bounds, end)
+        self.bounds[i:j] = ([start] if i % 2 == 1 else []) + ([end] if j % 2 == 1 else [])
+
+    def first_missing(self, number):
+        """The smallest number >= number that is not in the set."""
+        i = bisect.bisect_right(self.bounds, number)
+        return self.bounds[i] if i % 2 == 1 else number
+
+    def shift(self, at, delta):
+        """Renumber after delta numbers were inserted at at (or -delta removed).
+
+        Inserted numbers are not in the set; numbers after them move up.
+        """
+        if delta > 0:
+            self.bounds = [x if x < at else x + delta for x in self.bounds]
+            self.discard(at, at + delta)
+        elif delta < 0:
+            self.discard(at, at - delta)
+            bounds = [x if x <= at else x + delta for x in self.bounds]
+            # A range that ended at at now touches one that starts there
+            i = bisect.bisect_left(bounds, at)
+            if i % 2 == 1 and bounds[i:i + 2] == [at, at]:
+                del bounds[i:i + 2]
+            self.bounds = bounds
+
+
+class LineIndex:
+    """Start offset of every line, for O(log n) line <-> offset lookups.
+
+    Offsets are bytes for an index built from bytes and characters for one
+    built from text or a QTextDocument. Starts are kept in chunks of
+    CHUNK_LINES with a per-chunk shift, so an edit rewrites one chunk and
+    shifts the chunks after it instead of every later entry.
+    """
+
+    CHUNK_LINES = 4096
+    # Bytes scanned per split() when numpy is not available
+    SCAN_WINDOW = 1024 * 1024
+
+    def __init__(self, starts=None):
+        self._set_starts(array('Q', [0]) if starts is None else starts)
+
+    @classmethod
+    def from_data(cls, data):
+        """Build an index by scanning bytes, a memoryview or a str for newlines."""
+        if isinstance(data, str):
+            return cls(cls.line_starts(data, '\n'))
+        if np is not None:
+            positions = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + 1
+            starts = array('Q', [0])
+            starts.frombytes(positions.astype(np.uint64).tobytes())
+            return cls(starts)
+        return cls(cls.line_starts(data, b'\n'))
+
+    @classmethod
+    def line_starts(cls, data, newline):
+        """Line starts via split() over fixed windows (C-level, no per-line Python)."""
+        starts = array('Q', [0])
+        plus_one = (1).__add__
+        for window_start in range(0, len(data), cls.SCAN_WINDOW):
+            window = data[window_start:window_start + cls.SCAN_WINDOW]
+            if isinstance(window, memoryview):
+                window = bytes(window)
+            lengths = list(map(len, window.split(newline)))
+            lengths.pop()  # Text after the window's last newline
+            # Each newline starts a line one past the end of the part before it
+            ends = accumulate(map(plus_one, lengths), initial=window_start)
+            starts.extend(islice(ends, 1, None))
+        return starts
+
+    @classmethod
+    def count_lines(cls, data, start, end):
+        """Count the newlines in data[start:end], one SCAN_WINDOW at a time."""
+        count = 0
+        for window_start in range(start, end, cls.SCAN_WINDOW):
+            count += bytes(data[window_start:min(end, window_start + cls.SCAN_WINDOW)]).count(b'\n')
+        return count
+
+    @classmethod
+    def find_line(cls, data, line, start=0, start_line=0):
+        """Return the byte offset where line begins, or None if data ends first.
+
+        Scanning starts at start, which must be the beginning of start_line.
+        """
+        offset = start
+        current = start_line
+        while current < line:
+            window = bytes(data[offset:offset + cls.SCAN_WINDOW])
+            if not window:
+                return None
+            newlines = window.count(b'\n')
+            if current + newlines < line:
+                current += newlines
+                offset += len(window)
                 continue
-            fmt = self.formats[format_name]
-            match_iterator = pattern.globalMatch(text)
-            while match_iterator.hasNext():
-                match = match_iterator.next()
-                # For patterns with capture groups, highlight the captured group
-                if match.lastCapturedIndex() > 0:
-                    start = match.capturedStart(1)
-                    length = match.capturedLength(1)
-                else:
-                    start = match.capturedStart()
-                    length = match.capturedLength()
-                self.setFormat(start, length, fmt)
-        
-        # Handle multiline comments
-        if self.multiline_comment:
-            self._highlight_multiline_comment(text)
-        
-        # Handle Python multiline strings
-        if self.language == 'python':
-            self._highlight_python_multiline_strings(text)
-    
-    def _highlight_multiline_comment(self, text):
-        """Handle multiline comment highlighting."""
-        start_delim, end_delim = self.multiline_comment
-        
-        self.setCurrentBlockState(0)
-        
-        start_index = 0
-        if self.previousBlockState() != 1:
-            start_index = text.find(start_delim)
-        
-        while start_index >= 0:
-            end_index = text.find(end_delim, start_index + len(start_delim))
-            
-            if end_index == -1:
-                self.setCurrentBlockState(1)
-                comment_length = len(text) - start_index
+            position = -1
+            for _ in range(line - current):
+                position = window.find(b'\n', position + 1)
+            return offset + position + 1
+        return offset
+
+    @classmethod
+    def from_document(cls, document):
+        """Build an index of a QTextDocument's block positions."""
+        text = document.toPlainText()
+        if not _has_astral(text):
+            return cls.from_data(text)
+        # Qt positions count UTF-16 units: measure each line in them
+        lines = text.split('\n')
+        units = map(len, map(methodcaller('encode', 'utf-16-le'), lines))
+        lengths = map((1).__add__, map((2).__rfloordiv__, units))
+        return cls(array('Q', islice(accumulate(lengths, initial=0), len(lines))))
+
+    def _set_starts(self, starts):
+        size = self.CHUNK_LINES
+        self._chunks = [starts[i:i + size] for i in range(0, len(starts), size)]
+        self._shifts = [0] * len(self._chunks)
+        self._refresh()
+
+    def _refresh(self):
+        """Recompute the per-chunk first offsets and first line numbers."""
+        self._firsts = [chunk[0] + shift for chunk, shift in zip(self._chunks, self._shifts)]
+        self._bases = list(accumulate(map(len, self._chunks), initial=0))
+        self.line_count = self._bases.pop()
+
+    def starts(self):
+        """Return every line start as an array."""
+        result = array('Q')
+        for chunk, shift in zip(self._chunks, self._shifts):
+            result.extend(chunk if not shift else (start + shift for start in chunk))
+        return result
+
+    def line_of(self, offset):
+        """Return the 0-based line containing offset."""
+        index = max(0, bisect.bisect_right(self._firsts, offset) - 1)
+        chunk = self._chunks[index]
+        position = bisect.bisect_right(chunk, max(0, offset - self._shifts[index])) - 1
+        return self._bases[index] + max(0, position)
+
+    def offset_of(self, line):
+        """Return the start offset of 0-based line, clamped to the last line."""
+        line = max(0, min(line, self.line_count - 1))
+        index = bisect.bisect_right(self._bases, line) - 1
+        return self._chunks[index][line - self._bases[index]] + self._shifts[index]
+
+    def apply_edit(self, position, removed, added, new_starts):
+        """Update for removed chars replaced by added chars at position.
+
+        new_starts are the starts of lines that begin inside the inserted
+        text, in post-edit offsets.
+        """
+        delta = added - removed
+        first = max(0, bisect.bisect_right(self._firsts, position) - 1)
+        last = max(first, bisect.bisect_right(self._firsts, position + removed) - 1)
+        entries = []
+        for index in range(first, last + 1):
+            shift = self._shifts[index]
+            entries.extend(start + shift for start in self._chunks[index])
+        cut = position + removed
+        merged = array('Q', (start for start in entries if start <= position))
+        merged.extend(new_starts)
+        merged.extend(start + delta for start in entries if start > cut)
+        size = self.CHUNK_LINES
+        replacement = [merged[i:i + size] for i in range(0, len(merged), size)] or [array('Q', [0])]
+        self._chunks[first:last + 1] = replacement
+        self._shifts[first:last + 1] = [0] * len(replacement)
+        if delta:
+            for index in range(first + len(replacement), len(self._chunks)):
+                self._shifts[index] += delta
+        self._refresh()
+
+
+class MappedFile:
+    """Read-only memory map of a file that stays open for the life of a tab.
+
+    Slices are served through a memoryview, so reading part of the file
+    never copies the rest of it onto the heap.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mmap)
+        else:
+            # mmap cannot map an empty file
+            self.mmap = b''
+            self.view = memoryview(b'')
+
+    def __len__(self):
+        return self.size
+
+    def text(self, start=0, end=None):
+        """Decode [start, end) straight from the mapping."""
+        return str(self.view[start:end], 'utf-8', errors='ignore')
+
+    def close(self):
+        """Unmap the file. Safe to call more than once."""
+        if self.view is None:
+            return
+        self.view.release()
+        self.view = None
+        if isinstance(self.mmap, mmap.mmap):
+            try:
+                self.mmap.close()
+            except BufferError:
+                # A slice is still exported somewhere; the map goes when it does
+                pass
+        self.mmap = None
+        self._file.close()
+
+
+class PieceTable:
+    """Piece-table text buffer over a read-only original plus an append-only add buffer.
+
+    The original bytes (usually a memory-mapped file) are never copied or
+    changed. Edits append to the add buffer and rewrite the short list of
+    pieces describing the current text, so memory grows with the number of
+    edits instead of the file size. All offsets are byte offsets into the
+    UTF-8 encoded text.
+    """
+
+    ORIGINAL = 0
+    ADD = 1
+    INDEX_CHUNK = 1024 * 1024  # Newlines in the original are counted per 1MB chunk
+
+    def __init__(self, original=b''):
+        self.original = original
+        self.add_buffer = bytearray()
+        self.pieces = []  # List of (source, start, length)
+        if len(original):
+            self.pieces.append((self.ORIGINAL, 0, len(original)))
+        self.byte_length = len(original)
+        self.modified = False
+        # _chunk_newlines[i] is the number of newlines in original[:i * INDEX_CHUNK].
+        # Filled in lazily so opening a multi-GB file does not scan all of it.
+        self._chunk_newlines = array('Q', [0])
+        self.mapped_file = None
+
+    @classmethod
+    def from_file(cls, file_path):
+        """Create a piece table backed by a read-only memory map of file_path."""
+        mapped = MappedFile(file_path)
+        table = cls(mapped.mmap)
+        table.mapped_file = mapped
+        return table
+
+    def close(self):
+        """Release the memory map backing the original text."""
+        if self.mapped_file is not None:
+            self.mapped_file.close()
+            self.mapped_file = None
+
+    def _source(self, source):
+        return self.original if source == self.ORIGINAL else self.add_buffer
+
+    def _index_chunk(self):
+        """Count newlines in the next unindexed chunk of the original."""
+        chunk = len(self._chunk_newlines) - 1
+        start = chunk * self.INDEX_CHUNK
+        if start >= len(self.original):
+            return False
+        data = self.original[start:start + self.INDEX_CHUNK]
+        self._chunk_newlines.append(self._chunk_newlines[-1] + data.count(b'\n'))
+        return True
+
+    def _original_newlines_before(self, offset):
+        """Number of newlines in original[:offset]."""
+        chunk = offset // self.INDEX_CHUNK
+        while len(self._chunk_newlines) <= chunk and self._index_chunk():
+            pass
+        chunk = min(chunk, len(self._chunk_newlines) - 1)
+        chunk_start = chunk * self.INDEX_CHUNK
+        partial = self.original[chunk_start:offset].count(b'\n') if offset > chunk_start else 0
+        return self._chunk_newlines[chunk] + partial
+
+    def _original_nth_newline(self, n):
+        """Byte offset of the n-th (0-based) newline in the original, or -1."""
+        while self._chunk_newlines[-1] <= n and self._index_chunk():
+            pass
+        if self._chunk_newlines[-1] <= n:
+            return -1
+        chunk = bisect.bisect_right(self._chunk_newlines, n) - 1
+        chunk_start = chunk * self.INDEX_CHUNK
+        data = self.original[chunk_start:chunk_start + self.INDEX_CHUNK]
+        pos = -1
+        for _ in range(n - self._chunk_newlines[chunk] + 1):
+            pos = data.find(b'\n', pos + 1)
+        return chunk_start + pos
+
+    def _piece_newlines(self, piece):
+        source, start, length = piece
+        if source == self.ORIGINAL:
+            return self._original_newlines_before(start + length) - self._original_newlines_before(start)
+        return self.add_buffer.count(b'\n', start, start + length)
+
+    def line_count(self):
+        """Total number of lines (newlines + 1). Indexes the whole original."""
+        return sum(self._piece_newlines(piece) for piece in self.pieces) + 1
+
+    def line_start(self, line):
+        """Byte offset where the given 0-based line starts (byte_length if past the end)."""
+        if line <= 0:
+            return 0
+        remaining = line  # Newlines still to pass
+        pos = 0
+        for piece in self.pieces:
+            source, start, length = piece
+            if source == self.ORIGINAL:
+                before = self._original_newlines_before(start)
+                nl = self._original_nth_newline(before + remaining - 1)
+                if nl != -1 and nl < start + length:
+                    return pos + nl - start + 1
+                remaining -= self._original_newlines_before(start + length) - before
             else:
-                comment_length = end_index - start_index + len(end_delim)
-            
-            self.setFormat(start_index, comment_length, self.formats['comment'])
-            start_index = text.find(start_delim, start_index + comment_length)
-    
-    def _highlight_python_multiline_strings(self, text):
-        """Handle Python triple-quoted string highlighting."""
-        for delimiter in ['"""', "'''"]:
-            self._highlight_multiline_string(text, delimiter)
-    
-    def _highlight_multiline_string(self, text, delimiter):
-        """Highlight a multiline string with given delimiter."""
-        # This is a simplified version - full implementation would need state tracking
-        start = 0
-        while True:
-            start_index = text.find(delimiter, start)
-            if start_index == -1:
-                break
-            end_index = text.find(delimiter, start_index + len(delimiter))
-            if end_index == -1:
-                self.setFormat(start_index, len(text) - start_index, self.formats['string'])
+                nl = start - 1
+                end = start + length
+                while remaining:
+                    nl = self.add_buffer.find(b'\n', nl + 1, end)
+                    if nl == -1:
+                        break
+                    remaining -= 1
+                if nl != -1 and remaining == 0:
+                    return pos + nl - start + 1
+            pos += length
+        return self.byte_length
+
+    def read(self, start=0, end=None):
+        """Return the bytes in [start, end)."""
+        if end is None or end > self.byte_length:
+            end = self.byte_length
+        parts = []
+        pos = 0
+        for source, piece_start, length in self.pieces:
+            piece_end = pos + length
+            if piece_end > start and pos < end:
+                lo = max(start, pos) - pos + piece_start
+                hi = min(end, piece_end) - pos + piece_start
+                parts.append(self._source(source)[lo:hi])
+            if piece_end >= end:
                 break
-            else:
-                length = end_index - start_index + len(delimiter)
-                self.setFormat(start_index, length, self.formats['string'])
-                start = end_index + len(delimiter)
+            pos = piece_end
+        return b''.join(parts)
 
+    def text(self, start=0, end=None):
+        """Return [start, end) decoded as UTF-8."""
+        return self.read(start, end).decode('utf-8', errors='ignore')
 
-class CodeEditor(QPlainTextEdit):
-    """Text editor with line numbers and syntax highlighting."""
-    
-    focusReceived = Signal()
-    
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.line_number_area = LineNumberArea(self)
-        
-        # Setup syntax highlighter
-        self.highlighter = SyntaxHighlighter(self.document())
-        self.highlighting_enabled = True
-        self.is_large_file = False
-        self.highlighted_blocks = set()  # Track which blocks have been highlighted
-        self.highlight_timer = QTimer()
-        self.highlight_timer.timeout.connect(self.highlight_remaining_blocks)
-        self.highlight_timer.setInterval(50)  # Highlight in chunks every 50ms
-        
-        self.blockCountChanged.connect(self.update_line_number_area_width)
-        self.updateRequest.connect(self.on_update_request)
-        self.cursorPositionChanged.connect(self.highlight_current_line)
-        
-        self.update_line_number_area_width(0)
-        self.highlight_current_line()
-        
-        # Set font
-        font = QFont("Consolas", 11)
-        font.setFixedPitch(True)
-        self.setFont(font)
-        
-        # Set tab width
-        metrics = QFontMetrics(font)
-        self.setTabStopDistance(4 * metrics.horizontalAdvance(' '))
-    
-    def set_language(self, language):
-        """Set the syntax highlighting language."""
-        self.highlighter.set_language(language)
-    
-    def set_language_from_file(self, file_path):
-        """Set syntax highlighting based on file extension."""
-        # Mark as large file if > 5MB for lazy highlighting
+    def _split(self, offset):
+        """Ensure a piece boundary at offset; return the index of the piece starting there."""
+        pos = 0
+        for i, (source, start, length) in enumerate(self.pieces):
+            if offset == pos:
+                return i
+            if offset < pos + length:
+                head = offset - pos
+                self.pieces[i:i + 1] = [(source, start, head), (source, start + head, length - head)]
+                return i + 1
+            pos += length
+        return len(self.pieces)
+
+    def insert(self, offset, data):
+        """Insert encoded bytes at offset."""
+        if not data:
+            return
+        add_start = len(self.add_buffer)
+        self.add_buffer += data
+        index = self._split(offset)
+        previous = self.pieces[index - 1] if index > 0 else None
+        if previous and previous[0] == self.ADD and previous[1] + previous[2] == add_start:
+            # Consecutive typing extends the previous add piece
+            self.pieces[index - 1] = (self.ADD, previous[1], previous[2] + len(data))
+        else:
+            self.pieces.insert(index, (self.ADD, add_start, len(data)))
+        self.byte_length += len(data)
+        self.modified = True
+
+    def delete(self, offset, length):
+        """Delete length bytes starting at offset."""
+        length = min(length, self.byte_length - offset)
+        if length <= 0:
+            return
+        first = self._split(offset)
+        last = self._split(offset + length)
+        del self.pieces[first:last]
+        self.byte_length -= length
+        self.modified = True
+
+    def replace(self, offset, length, data):
+        """Replace length bytes at offset with data."""
+        self.delete(offset, length)
+        self.insert(offset, data)
+
+    def write_to(self, f):
+        """Write the current text to a binary file object without joining it in memory."""
+        for source, start, length in self.pieces:
+            with memoryview(self._source(source)) as view:
+                f.write(view[start:start + length])
+
+    def save(self, file_path):
+        """Atomically write the current text to file_path.
+
+        The text goes to a temporary file that is renamed over the target, so
+        a mapped original is never overwritten while pieces still point into it.
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.textedit-')
         try:
-            file_size = os.path.getsize(file_path)
-            self.is_large_file = file_size > 5 * 1024 * 1024  # 5MB threshold
-        except:
-            self.is_large_file = False
-        
-        self.highlighting_enabled = True
-        self.highlighter.set_language_from_file(file_path)
-        
-        # Only do highlighting work if the language has highlighting rules
-        if self.highlighter.rules:
-            # For all files, use incremental highlighting to keep frame times low
-            # Highlight visible blocks first, then incrementally highlight the rest
-            self.highlight_visible_blocks()
-            self.highlight_timer.start()
-    
-    def set_text_color(self, color):
-        """Set the text color for the editor."""
-        self._text_color = color
-        self.setStyleSheet(f"""
-            QPlainTextEdit {{
-                background-color: #1e1e1e;
-                color: {color.name()};
-                border: none;
+            with os.fdopen(fd, 'wb') as f:
+                self.write_to(f)
+            if os.path.exists(file_path):
+                # mkstemp creates the file private; keep the original's mode
+                shutil.copymode(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.modified = False
+
+
+class DirtyTracker:
+    """Tracks whether a document is back at its saved state without copying it.
+
+    The saved state is kept as a fingerprint rather than the text: a digest
+    of the whole file plus one hash per block. Qt's undo stack already knows
+    when the document returns to the save point. Edits that reach the saved
+    text by another route (typing a character and deleting it) are caught by
+    hashing only the blocks touched since the save, so the cost follows the
+    edited range rather than the document size.
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self.saved_hashes = None  # array('q') of hash() per block at the save point
+        self.saved_digest = None  # Digest of the saved text
+        self.saved_chars = 0
+        self.touched = None  # (first, last) block range edited since the save point
+        self._block_count = document.blockCount()
+        self._pending_hashes = None
+        self._pending_digest = None
+        self._pending_tail = ''
+        document.contentsChange.connect(self._on_contents_change)
+
+    @staticmethod
+    def _new_digest():
+        return hashlib.blake2b(digest_size=16)
+
+    def mark_saved(self, text=None):
+        """Record the current document as the saved state.
+
+        text is the document's plain text when the caller already has it;
+        without it only the undo stack is used to detect the saved state.
+        """
+        self.begin_saved_state()
+        if text is None:
+            self._pending_hashes = None
+            self._pending_digest = None
+        else:
+            self.feed_saved_text(text)
+        self.end_saved_state()
+
+    def begin_saved_state(self):
+        """Start hashing a saved state that arrives in pieces (chunked loading)."""
+        self._pending_hashes = array('q')
+        self._pending_digest = self._new_digest()
+        self._pending_tail = ''
+
+    def feed_saved_text(self, text):
+        """Hash the complete lines of the next piece of saved text."""
+        if self._pending_hashes is None:
+            return
+        if '\r' in text:
+            # Qt turns CRLF into a plain block separator
+            text = text.replace('\r\n', '\n')
+        self._pending_digest.update(text.encode('utf-8', errors='surrogatepass'))
+        lines = (self._pending_tail + text).split('\n')
+        self._pending_tail = lines.pop()
+        self._pending_hashes.extend(map(hash, lines))
+
+    def cancel_saved_state(self):
+        """Stop hashing a streamed saved state that will not arrive in order."""
+        self._pending_hashes = None
+        self._pending_digest = None
+
+    def end_saved_state(self):
+        """Finish the saved state started by begin_saved_state."""
+        hashes = self._pending_hashes
+        digest = None
+        if hashes is not None:
+            hashes.append(hash(self._pending_tail))
+            digest = self._pending_digest.digest()
+            if len(hashes) != self.document.blockCount():
+                # Text did not map onto blocks one-to-one
+                hashes = None
+                digest = None
+        self.saved_hashes = hashes
+        self.saved_digest = digest
+        self.saved_chars = self.document.characterCount()
+        self.touched = None
+        self._block_count = self.document.blockCount()
+        self._pending_hashes = None
+        self._pending_digest = None
+        self._pending_tail = ''
+
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        """Grow the touched block range to cover an edit."""
+        document = self.document
+        first = document.findBlock(position).blockNumber()
+        last = document.findBlock(position + chars_added).blockNumber()
+        if last < 0:
+            last = document.blockCount() - 1
+        delta = document.blockCount() - self._block_count
+        self._block_count = document.blockCount()
+        if self.touched is None:
+            self.touched = (first, last)
+            return
+        low, high = self.touched
+        # Blocks after the edit moved by the change in block count
+        if high >= first:
+            high = max(first, high + delta)
+        if low > first:
+            low = max(first, low + delta)
+        self.touched = (min(low, first), max(high, last))
+
+    def is_at_saved_state(self):
+        """Return True if the document text equals the saved text."""
+        document = self.document
+        if not document.isModified():
+            return True
+        if self.saved_hashes is None or self.touched is None:
+            return False
+        if (document.blockCount() != len(self.saved_hashes) or
+                document.characterCount() != self.saved_chars):
+            return False
+        # Same block count, so untouched blocks line up with their saved hashes
+        low, high = self.touched
+        block = document.findBlockByNumber(low)
+        for number in range(low, high + 1):
+            if not block.isValid() or hash(block.text()) != self.saved_hashes[number]:
+                return False
+            block = block.next()
+        return True
+
+    def current_digest(self):
+        """Return the digest of the document's current text."""
+        digest = self._new_digest()
+        block = self.document.firstBlock()
+        while block.isValid():
+            if block.blockNumber() > 0:
+                digest.update(b'\n')
+            digest.update(block.text().encode('utf-8', errors='surrogatepass'))
+            block = block.next()
+        return digest.digest()
+
+    def changed_lines(self):
+        """Return the 0-based line numbers that differ from the saved text.
+
+        Lines inserted or edited since the save are reported; lines that
+        were only deleted have no current line number and are left out.
+        Returns None when no fingerprint was recorded (e.g. huge files).
+        """
+        if self.saved_hashes is None:
+            return None
+        if not self.document.isModified() or self.touched is None:
+            return []
+        document = self.document
+        if document.blockCount() == len(self.saved_hashes):
+            # Blocks line up, so only the touched range can differ
+            low, high = self.touched
+            block = document.findBlockByNumber(low)
+            changed = []
+            for number in range(low, high + 1):
+                if not block.isValid():
+                    break
+                if hash(block.text()) != self.saved_hashes[number]:
+                    changed.append(number)
+                block = block.next()
+            return changed
+        current = []
+        block = document.firstBlock()
+        while block.isValid():
+            current.append(hash(block.text()))
+            block = block.next()
+        matcher = difflib.SequenceMatcher(None, self.saved_hashes.tolist(), current, autojunk=False)
+        changed = []
+        for tag, _, _, first, last in matcher.get_opcodes():
+            if tag in ('replace', 'insert'):
+                changed.extend(range(first, last))
+        return changed
+
+
+class TextLoader(QObject):
+    """Decodes a file's bytes on a pool thread and streams text blocks back.
+
+    Blocks end on a line boundary where possible, so the GUI thread only has
+    to insert ready-made text. At most MAX_PENDING blocks are in flight; the
+    worker waits for the GUI to take one before decoding the next.
+
+    ranges lists the (start, end) byte ranges to decode, in order; each must
+    start on a line boundary. previous is a cancelled loader of the same
+    content whose newline index this one continues.
+    """
+
+    # Decoded text and the byte range it came from
+    block_ready = Signal(str, int, int)
+    finished = Signal()
+
+    MAX_PENDING = 8
+
+    def __init__(self, content, block_size, ranges=None, previous=None):
+        super().__init__()
+        self.content = content  # Bytes, or a memoryview of the mapped file
+        self.block_size = block_size
+        self.ranges = ranges if ranges is not None else [(0, len(content))]
+        # Newline index of the prefix decoded so far: byte offset and first
+        # line of each block, up to indexed_end
+        if previous is not None:
+            self.block_offsets = array('Q', previous.block_offsets)
+            self.block_lines = array('Q', previous.block_lines)
+            self.line_count = previous.line_count
+            self.indexed_end = previous.indexed_end
+        else:
+            self.block_offsets = array('Q')
+            self.block_lines = array('Q')
+            self.line_count = 1
+            self.indexed_end = 0
+        self._slots = threading.Semaphore(self.MAX_PENDING)
+        self._cancelled = False
+        self._done = threading.Event()
+        # Guards _started against cancel(): a run still queued behind other
+        # pool work is dropped instead of waited for
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Start decoding on the global thread pool."""
+        QThreadPool.globalInstance().start(self._run)
+
+    def block_taken(self):
+        """Let the worker decode another block (call once per block_ready)."""
+        self._slots.release()
+
+    def cancel(self):
+        """Stop decoding and wait for the worker to let go of the content.
+
+        A worker that has not started yet never touches the content, so
+        there is nothing to wait for.
+        """
+        with self._lock:
+            self._cancelled = True
+            started = self._started
+        self._slots.release()
+        if started:
+            self._done.wait()
+        else:
+            self.content = None
+            self._done.set()
+
+    def line_offset(self, line):
+        """Return the byte offset of the decoded block containing line."""
+        return self.nearest_line_start(line)[0]
+
+    def nearest_line_start(self, line):
+        """Return (offset, line) of the indexed block start at or before line."""
+        index = bisect.bisect_right(self.block_lines, line) - 1
+        if index < 0:
+            return 0, 0
+        return self.block_offsets[index], self.block_lines[index]
+
+    def nearest_offset_start(self, offset):
+        """Return (offset, line) of the indexed block start at or before offset."""
+        index = bisect.bisect_right(self.block_offsets, offset) - 1
+        if index < 0:
+            return 0, 0
+        return self.block_offsets[index], self.block_lines[index]
+
+    def _run(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._started = True
+        try:
+            content = self.content
+            for range_start, range_end in self.ranges:
+                self._decode_range(content, range_start, range_end)
+                if self._cancelled:
+                    break
+            if not self._cancelled:
+                self.finished.emit()
+        finally:
+            self.content = None
+            self._done.set()
+
+    def _decode_range(self, content, offset, total):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        while offset < total and not self._cancelled:
+            end = min(offset + self.block_size, total)
+            data = bytes(content[offset:end])
+            if end < total:
+                # Cut after the last newline so blocks hold whole lines
+                cut = data.rfind(b'\n') + 1
+                if cut > 0:
+                    data = data[:cut]
+                    end = offset + cut
+            text = decoder.decode(data, final=end >= total)
+            if offset == self.indexed_end:
+                self.block_offsets.append(offset)
+                self.block_lines.append(self.line_count - 1)
+                self.line_count += data.count(b'\n')
+                self.indexed_end = end
+            start = offset
+            offset = end
+            if text:
+                self._slots.acquire()
+                if self._cancelled:
+                    break
+                self.block_ready.emit(text, start, end)
+
+
+class CodeEditor(QPlainTextEdit):
+    """Text editor with line numbers and syntax highlighting."""
+    
+    focusReceived = Signal()
+
+    # Virtual viewport: lines of a PieceTable materialized as Qt blocks at a time
+    VIRTUAL_WINDOW_LINES = 2000
+    # Re-center the window when the view gets this close to either edge
+    VIRTUAL_WINDOW_MARGIN = 200
+    # Most blocks one background highlighting call goes through
+    HIGHLIGHT_BATCH_BLOCKS = 4096
+    # Block state marking blocks to highlight in one run; no block ends in it
+    UNHIGHLIGHTED_STATE = -2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.line_number_area = LineNumberArea(self)
+
+        # Memory map of the file this tab was loaded from (large files only)
+        self.mapped_file = None
+
+        # Piece-table buffer for files too large to hold in the QTextDocument
+        self.buffer = None
+        self.window_first_line = 0  # Buffer line shown as block 0
+        self._window_start_byte = 0
+        self._window_end_byte = 0
+        self._window_trailing_newline = False
+        self._window_dirty = False
+        self._materializing = False
+        self._line_index = None  # Built on first use, then kept up to date on edits
+        # (block number, line count) while a go-to target has been loaded ahead
+        # of the lines before it: blocks from that number on are that many
+        # lines further down the file
+        self.line_gap = None
+        self.document().contentsChange.connect(self._on_contents_change)
+        self.verticalScrollBar().valueChanged.connect(self._on_virtual_scroll)
+
+        # Find matches drawn over the visible blocks: (MatchIndex, current
+        # (start, end) or None), refreshed on scroll, resize and edits
+        self.match_highlights = None
+        self._match_overlay_timer = QTimer(self)
+        self._match_overlay_timer.setSingleShot(True)
+        self._match_overlay_timer.timeout.connect(self.update_extra_selections)
+        self.verticalScrollBar().valueChanged.connect(self._schedule_match_overlay)
+        self.document().contentsChanged.connect(self._schedule_match_overlay)
+
+        # Tracks whether the document is back at its saved state
+        self.dirty_tracker = DirtyTracker(self.document())
+        
+        # Block numbers whose highlighting is current, for lazy highlighting of
+        # large files; renumbered on edits before the highlighter sees them
+        self.highlighted_ranges = IntervalSet()
+        self._highlight_block_count = 1
+        self._visible_blocks = (0, -1)
+        self._highlight_deadline = None
+        self._block_ms = 0.05
+        # Fills the highlighter's token cache for large files
+        self.tokenize_job = None
+        self._retokenize = False
+        self.document().contentsChange.connect(self._renumber_highlighted_ranges)
+        
+        # Setup syntax highlighter
+        self.highlighter = SyntaxHighlighter(self.document())
+        self.document().contentsChange.connect(self._restart_tokenize_job)
+        self.highlighting_enabled = True
+        self.is_large_file = False
+        # Background highlighting runs as a task on the shared frame scheduler
+        self.highlight_timer = FrameTask(
+            self.highlight_remaining_blocks, self._highlight_priority,
+            name='highlight', owner=self)
+        
+        self.blockCountChanged.connect(self.update_line_number_area_width)
+        self.updateRequest.connect(self.on_update_request)
+        self.cursorPositionChanged.connect(self.highlight_current_line)
+        
+        self.update_line_number_area_width(0)
+        self.highlight_current_line()
+        
+        # Set font
+        font = QFont("Consolas", 11)
+        font.setFixedPitch(True)
+        self.setFont(font)
+        
+        # Set tab width
+        metrics = QFontMetrics(font)
+        self.setTabStopDistance(4 * metrics.horizontalAdvance(' '))
+    
+    def set_language(self, language):
+        """Set the syntax highlighting language."""
+        had_rules = bool(self.highlighter.rules)
+        changed = self.highlighter.set_language(language, rehighlight=not self.is_large_file)
+        if changed and self.is_large_file:
+            self._start_lazy_highlighting(had_rules)
+
+    def load_buffer(self, buffer):
+        """Show a PieceTable through a virtual viewport.
+
+        Only VIRTUAL_WINDOW_LINES lines around the view are materialized as
+        blocks; scrolling near an edge swaps in the next window.
+        """
+        self.buffer = buffer
+        self.window_first_line = 0
+        self._materialize_window(0)
+
+    def release_buffer(self):
+        """Drop the piece-table buffer and its memory map."""
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+    def release_mapping(self):
+        """Unmap the file this editor was loaded from."""
+        if self.mapped_file is not None:
+            self.mapped_file.close()
+            self.mapped_file = None
+
+    def commit_window(self):
+        """Write edits made in the materialized window back into the buffer."""
+        if self.buffer is None or not self._window_dirty:
+            return
+        data = self.toPlainText().encode('utf-8')
+        if self._window_trailing_newline:
+            data += b'\n'
+        start, end = self._window_start_byte, self._window_end_byte
+        if self.buffer.read(start, end) != data:
+            self.buffer.replace(start, end - start, data)
+        self._window_end_byte = start + len(data)
+        self._window_dirty = False
+
+    def save_buffer(self, file_path):
+        """Save the piece-table buffer (including window edits) to file_path."""
+        self.commit_window()
+        self.buffer.save(file_path)
+
+    def show_buffer_line(self, line):
+        """Materialize the window around a 0-based buffer line and scroll to it."""
+        if self.buffer is None:
+            return
+        if not (self.window_first_line <= line < self.window_first_line + self.blockCount()):
+            self._materialize_window(max(0, line - self.VIRTUAL_WINDOW_LINES // 2))
+        self.verticalScrollBar().setValue(line - self.window_first_line)
+
+    def _materialize_window(self, first_line):
+        """Replace the document with the window of buffer lines starting at first_line."""
+        self.commit_window()
+        buffer = self.buffer
+
+        # Remember the cursor as a buffer position so it survives the swap
+        cursor = self.textCursor()
+        cursor_line = self.window_first_line + cursor.blockNumber()
+        cursor_column = cursor.positionInBlock()
+
+        start = buffer.line_start(first_line)
+        if start >= buffer.byte_length and first_line > 0:
+            first_line = max(0, buffer.line_count() - self.VIRTUAL_WINDOW_LINES)
+            start = buffer.line_start(first_line)
+        end = buffer.line_start(first_line + self.VIRTUAL_WINDOW_LINES)
+        data = buffer.read(start, end)
+        # The window's last newline belongs to the text after it
+        self._window_trailing_newline = end < buffer.byte_length
+        if self._window_trailing_newline:
+            data = data[:-1]
+
+        self._materializing = True
+        self.blockSignals(True)
+        self.setPlainText(data.decode('utf-8', errors='ignore'))
+        self.document().setModified(buffer.modified)
+        self.dirty_tracker.mark_saved()  # The buffer, not the window, knows the saved text
+        self.blockSignals(False)
+        self._materializing = False
+
+        self.window_first_line = first_line
+        self._window_start_byte = start
+        self._window_end_byte = end
+        self._window_dirty = False
+
+        block = self.document().findBlockByNumber(cursor_line - first_line)
+        if block.isValid():
+            cursor = QTextCursor(block)
+            cursor.setPosition(block.position() + min(cursor_column, block.length() - 1))
+            self.setTextCursor(cursor)
+        self.update_line_number_area_width(0)
+        self.line_number_area.update()
+
+    def file_line(self, block_number):
+        """Return the 0-based file line shown by a document block."""
+        line = self.window_first_line + block_number
+        if self.line_gap is not None and block_number >= self.line_gap[0]:
+            line += self.line_gap[1]
+        return line
+
+    def document_line(self, line):
+        """Return the block number showing a 0-based file line, or None if not loaded."""
+        block_number = line - self.window_first_line
+        if self.line_gap is not None and block_number >= self.line_gap[0]:
+            block_number -= self.line_gap[1]
+            if block_number < self.line_gap[0]:
+                return None  # Falls in the part still streaming in
+        if not 0 <= block_number < self.blockCount():
+            return None
+        return block_number
+
+    @property
+    def line_index(self):
+        """LineIndex of the document's block positions, for jumps to a line."""
+        if self._line_index is None:
+            self._line_index = LineIndex.from_document(self.document())
+        return self._line_index
+
+    def _on_contents_change(self, position, chars_removed, chars_added):
+        """Mark the materialized window as edited and update the line index."""
+        if self.buffer is not None and not self._materializing and (chars_removed or chars_added):
+            self._window_dirty = True
+        if self._line_index is not None and (chars_removed or chars_added):
+            document = self.document()
+            end = min(position + chars_added, document.characterCount() - 1)
+            # Blocks that begin inside the inserted text; Qt already has
+            # their positions, so no text is copied
+            new_starts = []
+            block = document.findBlock(position).next()
+            while block.isValid() and block.position() <= end:
+                new_starts.append(block.position())
+                block = block.next()
+            self._line_index.apply_edit(position, chars_removed, chars_added, new_starts)
+            if self._line_index.line_count != document.blockCount():
+                self._line_index = None  # Qt reported an approximate range; rebuild
+
+    def _on_virtual_scroll(self, value):
+        """Swap in a new window when the view approaches the edge of the current one."""
+        if self.buffer is None or self._materializing:
+            return
+        first = self.firstVisibleBlock().blockNumber()
+        visible = max(1, self.viewport().height() // max(1, self.fontMetrics().height()))
+        margin = min(self.VIRTUAL_WINDOW_MARGIN, self.VIRTUAL_WINDOW_LINES // 4)
+        near_top = first < margin and self.window_first_line > 0
+        near_bottom = (first + visible > self.blockCount() - margin and
+                       self._window_end_byte < self.buffer.byte_length)
+        if near_top or near_bottom:
+            line = self.window_first_line + first
+            new_first = max(0, line - self.VIRTUAL_WINDOW_LINES // 2)
+            if new_first != self.window_first_line:
+                self._materialize_window(new_first)
+                self.verticalScrollBar().setValue(line - self.window_first_line)
+
+    def set_language_from_file(self, file_path):
+        """Set syntax highlighting based on file extension.
+
+        Does nothing when neither the language nor the file's size class
+        changed, as after saving: edits were already rehighlighted.
+        """
+        was_large_file = self.is_large_file
+        # Mark as large file if > 5MB for lazy highlighting
+        try:
+            file_size = os.path.getsize(file_path)
+            self.is_large_file = file_size > 5 * 1024 * 1024  # 5MB threshold
+        except:
+            self.is_large_file = False
+        
+        self.highlighting_enabled = True
+        had_rules = bool(self.highlighter.rules)
+        changed = self.highlighter.set_language_from_file(
+            file_path, rehighlight=not self.is_large_file)
+        if not changed and self.is_large_file == was_large_file:
+            return
+        if self.is_large_file:
+            self._start_lazy_highlighting(had_rules)
+        else:
+            self.highlighter.block_filter = None
+            self.highlight_timer.stop()
+            self.cancel_tokenize_job()
+            if not changed and self.highlighter.rules:
+                # Blocks the lazy pass had not reached yet
+                self.highlighter.rehighlight()
+    
+    def _start_lazy_highlighting(self, had_rules):
+        """Highlight a large file viewport first, deferring the rest to frames.
+
+        Nothing is done yet; when neither the old nor the new language has
+        rules there are also no formats to clear and the pass ends at once.
+        """
+        self.highlighter.block_filter = self._may_highlight
+        self.highlighted_ranges.clear()
+        self._highlight_block_count = self.document().blockCount()
+        if not had_rules and not self.highlighter.rules:
+            self.highlighted_ranges.add(0, self._highlight_block_count)
+        self.start_tokenize_job()
+        self.highlight_visible_blocks()
+        self.highlight_timer.start()
+    
+    def start_tokenize_job(self):
+        """Tokenize the blocks missing from the token cache off the GUI thread."""
+        self.cancel_tokenize_job()
+        if not self.highlighter.rules:
+            return
+        cache = self.highlighter.token_cache
+        count = self.document().blockCount()
+        if len(cache) != count:
+            cache[:] = [None] * count
+        try:
+            first = cache.index(None)
+        except ValueError:
+            return
+        state = cache[first - 1][3] if first else 0
+        self.tokenize_job = BackgroundTokenizer(
+            self.document(), self.highlighter.language, self._on_tokenized,
+            first, state, priority=self._highlight_priority, owner=self)
+        self.tokenize_job.start()
+    
+    def cancel_tokenize_job(self):
+        if self.tokenize_job is not None:
+            self.tokenize_job.cancel()
+            self.tokenize_job = None
+    
+    def _on_tokenized(self, first, entries):
+        """Store a chunk of cache entries from the tokenize job."""
+        self.highlighter.token_cache[first:first + len(entries)] = entries
+    
+    def _renumber_highlighted_ranges(self, position, chars_removed, chars_added):
+        """Keep highlighted_ranges on the right blocks when lines come and go."""
+        count = self.document().blockCount()
+        delta = count - self._highlight_block_count
+        self._highlight_block_count = count
+        if not delta and not self.highlighted_ranges:
+            return
+        first = self.document().findBlock(position).blockNumber()
+        if self.highlighted_ranges:
+            # The edited blocks are highlighted again right after this
+            self.highlighted_ranges.shift(first + 1, delta)
+            self.highlighted_ranges.discard(first, first + 1 + max(0, delta))
+        if delta and self.tokenize_job is not None:
+            # Its chunks are numbered for the old blocks; it starts again
+            # once the highlighter has renumbered the token cache
+            self.cancel_tokenize_job()
+            self._retokenize = True
+    
+    def _restart_tokenize_job(self, position, chars_removed, chars_added):
+        if self._retokenize:
+            self._retokenize = False
+            self.start_tokenize_job()
+    
+    def _may_highlight(self, block):
+        """Block filter for large files: highlight visible blocks right away,
+        others only during a background step; the rest wait for the timer."""
+        number = block.blockNumber()
+        first, last = self._visible_blocks
+        if (first <= number <= last or (self._highlight_deadline is not None
+                                        and time.perf_counter() < self._highlight_deadline)):
+            self.highlighted_ranges.add(number, number + 1)
+            return True
+        self.highlighted_ranges.discard(number, number + 1)
+        if self.highlighting_enabled:
+            self.highlight_timer.start()
+        return False
+    
+    def set_text_color(self, color):
+        """Set the text color for the editor."""
+        self._text_color = color
+        self.setStyleSheet(f"""
+            QPlainTextEdit {{
+                background-color: #1e1e1e;
+                color: {color.name()};
+                border: none;
                 selection-background-color: #264f78;
             }}
         """)
@@ -1022,7 +2561,7 @@ class CodeEditor(QPlainTextEdit):
     
     def line_number_area_width(self):
         digits = 1
-        max_num = max(1, self.blockCount())
+        max_num = max(1, self.file_line(self.blockCount()))
         while max_num >= 10:
             max_num //= 10
             digits += 1
@@ -1053,65 +2592,80 @@ class CodeEditor(QPlainTextEdit):
                 self.highlight_visible_blocks()
     
     def highlight_visible_blocks(self):
-        """Highlight only the blocks currently visible in the viewport."""
+        """Highlight the blocks in the viewport that are not highlighted yet."""
         if not self.highlighting_enabled or not self.is_large_file:
             return
         
         block = self.firstVisibleBlock()
-        end_block = None
-        
+        first = block.blockNumber()
+        last = first
         # Find the last visible block
-        current_block = block
-        while current_block.isValid():
-            rect = self.blockBoundingGeometry(current_block).translated(self.contentOffset())
-            if rect.top() > self.viewport().rect().bottom():
-                break
-            end_block = current_block
-            current_block = current_block.next()
-        
-        # Highlight visible blocks
-        current_block = block
-        while current_block.isValid():
-            block_num = current_block.blockNumber()
-            if block_num not in self.highlighted_blocks:
-                self.highlighter.highlightBlock(current_block.text())
-                self.highlighted_blocks.add(block_num)
-            
-            if current_block == end_block:
+        bottom = self.viewport().rect().bottom()
+        offset = self.contentOffset()
+        while block.isValid():
+            if self.blockBoundingGeometry(block).translated(offset).top() > bottom:
                 break
-            current_block = current_block.next()
+            last = block.blockNumber()
+            block = block.next()
+        self._visible_blocks = (first, last)
+        
+        # rehighlightBlock also redoes following blocks whose state changes
+        document = self.document()
+        number = self.highlighted_ranges.first_missing(first)
+        while number <= last:
+            self.highlighter.rehighlightBlock(document.findBlockByNumber(number))
+            number = self.highlighted_ranges.first_missing(number + 1)
     
-    def highlight_remaining_blocks(self):
-        """Incrementally highlight remaining unhighlighted blocks."""
+    def _highlight_priority(self):
+        """Highlighting runs ahead of hidden tabs' work while this editor is shown."""
+        if self.isVisible():
+            return FrameScheduler.PRIORITY_VISIBLE_REGION
+        return FrameScheduler.PRIORITY_BACKGROUND
+    
+    def highlight_remaining_blocks(self, budget_ms=10.0):
+        """Highlight blocks that are not done yet, in order, for budget_ms."""
         if not self.highlighting_enabled or not self.is_large_file:
             self.highlight_timer.stop()
             return
         
-        # Dynamically adjust blocks per frame to keep frame time under 14ms
-        # Start with 20 blocks per frame for safety, measuring will adjust
-        blocks_to_highlight = getattr(self, '_highlight_blocks_per_frame', 20)
-        start_time = time.time()
-        count = 0
-        block = self.document().firstBlock()
-        
-        while block.isValid() and count < blocks_to_highlight:
-            block_num = block.blockNumber()
-            if block_num not in self.highlighted_blocks:
-                self.highlighter.highlightBlock(block.text())
-                self.highlighted_blocks.add(block_num)
-                count += 1
-            block = block.next()
-        
-        # Measure frame time and adjust for next frame
-        frame_time = (time.time() - start_time) * 1000  # Convert to ms
-        if frame_time > 0 and count > 0:
-            # Calculate blocks per frame to hit ~10ms target (leaving 6ms buffer)
-            target_ms = 10.0
-            new_blocks = max(1, int(blocks_to_highlight * (target_ms / frame_time)))
-            self._highlight_blocks_per_frame = new_blocks
+        document = self.document()
+        count = document.blockCount()
+        number = self.highlighted_ranges.first_missing(0)
+        start = time.perf_counter()
+        self._highlight_deadline = start + budget_ms / 1000.0
+        highlighted = 0
+        try:
+            while number < count and time.perf_counter() < self._highlight_deadline:
+                # A run of blocks not done yet that should fit in the time left
+                left_ms = (self._highlight_deadline - time.perf_counter()) * 1000
+                run = max(16, min(self.HIGHLIGHT_BATCH_BLOCKS, int(left_ms / self._block_ms)))
+                end = min(count, number + run)
+                done = self.highlighted_ranges.bounds
+                i = bisect.bisect_right(done, number)
+                if i < len(done):
+                    end = min(end, done[i])
+                # One rehighlightBlock call goes through the whole run: a
+                # block whose state changes makes Qt go on to the next, so
+                # give them all a state no block ends in. The block filter
+                # stops the run at the deadline.
+                block = document.findBlockByNumber(number)
+                first = block
+                for _ in range(end - number - 1):
+                    block.setUserState(self.UNHIGHLIGHTED_STATE)
+                    block = block.next()
+                self.highlighter.rehighlightBlock(first)
+                next_number = self.highlighted_ranges.first_missing(number)
+                highlighted += next_number - number
+                number = next_number
+        finally:
+            self._highlight_deadline = None
+        if highlighted:
+            # Running estimate of the time one block takes
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._block_ms = (self._block_ms + elapsed_ms / highlighted) / 2
         
         # Stop timer if all blocks are highlighted
-        if count == 0:
+        if number >= count:
             self.highlight_timer.stop()
     
     def resizeEvent(self, event):
@@ -1122,8 +2676,45 @@ class CodeEditor(QPlainTextEdit):
         self.line_number_area.setGeometry(
             QRect(0, cr.top(), self.line_number_area_width(), cr.height())
         )
+        self._schedule_match_overlay()
     
     def highlight_current_line(self):
+        self.update_extra_selections()
+    
+    def set_match_highlights(self, index, current=None):
+        """Draw the matches of a MatchIndex over the text, emphasizing current.
+
+        Matches are extra selections rather than document formats, so the
+        document, its undo stack and its modified flag are left alone.
+        """
+        self.match_highlights = (index, current)
+        self.update_extra_selections()
+    
+    def clear_match_highlights(self):
+        if self.match_highlights is not None:
+            self.match_highlights = None
+            self.update_extra_selections()
+    
+    def _schedule_match_overlay(self, *args):
+        if self.match_highlights is not None:
+            self._match_overlay_timer.start(0)
+    
+    def visible_range(self):
+        """Return the document positions spanned by the blocks in the viewport."""
+        block = self.firstVisibleBlock()
+        start = block.position()
+        end = start
+        offset = self.contentOffset()
+        height = self.viewport().height()
+        while block.isValid():
+            if self.blockBoundingGeometry(block).translated(offset).top() > height:
+                break
+            end = block.position() + block.length()
+            block = block.next()
+        return start, end
+    
+    def update_extra_selections(self):
+        """Set the current line highlight plus the find matches in view."""
         extra_selections = []
         if not self.isReadOnly():
             selection = QTextEdit.ExtraSelection()
@@ -1133,8 +2724,33 @@ class CodeEditor(QPlainTextEdit):
             selection.cursor = self.textCursor()
             selection.cursor.clearSelection()
             extra_selections.append(selection)
+        if self.match_highlights is not None:
+            extra_selections.extend(self._match_selections(*self.match_highlights))
         self.setExtraSelections(extra_selections)
     
+    def _match_selections(self, index, current):
+        # Only matches in view are drawn, however many the index holds
+        start, end = self.visible_range()
+        lo = bisect.bisect_left(index.starts, start)
+        hi = bisect.bisect_left(index.starts, end)
+        match_format = QTextCharFormat()
+        match_format.setBackground(QColor("#555555"))
+        match_format.setForeground(QColor("#ffffff"))
+        current_format = QTextCharFormat()
+        current_format.setBackground(QColor("#ffff00"))
+        current_format.setForeground(QColor("#000000"))
+        current_format.setFontWeight(700)
+        selections = []
+        document = self.document()
+        for match_start, match_end in zip(index.starts[lo:hi], index.ends[lo:hi]):
+            selection = QTextEdit.ExtraSelection()
+            selection.format = current_format if (match_start, match_end) == current else match_format
+            selection.cursor = QTextCursor(document)
+            selection.cursor.setPosition(match_start)
+            selection.cursor.setPosition(match_end, QTextCursor.KeepAnchor)
+            selections.append(selection)
+        return selections
+    
     def focusInEvent(self, event):
         """Emit focusReceived signal when this editor gets focus."""
         super().focusInEvent(event)
@@ -1172,7 +2788,7 @@ class CodeEditor(QPlainTextEdit):
         
         while block.isValid() and top <= event.rect().bottom():
             if block.isVisible() and bottom >= event.rect().top():
-                number = str(block_number + 1)
+                number = str(self.file_line(block_number) + 1)
                 painter.setPen(QColor("#858585"))
                 painter.drawText(0, top, self.line_number_area.width() - 10,
                                self.fontMetrics().height(),
@@ -1185,18 +2801,634 @@ class CodeEditor(QPlainTextEdit):
 
 
 
+class SearchQuery:
+    """The text to search for and how to match it.
+
+    Hashable and picklable, so a query keys the compiled-pattern cache and
+    can be handed to search worker processes. Plain queries without regex
+    or whole-word matching compile to a LiteralPattern.
+    """
+
+    def __init__(self, text, regex=False, whole_word=False, case_sensitive=False):
+        self.text = text
+        self.regex = regex
+        self.whole_word = whole_word
+        self.case_sensitive = case_sensitive
+
+    @classmethod
+    def coerce(cls, query):
+        """Return query as a SearchQuery; plain strings use the default modes."""
+        return query if isinstance(query, SearchQuery) else cls(query)
+
+    def _key(self):
+        return (self.text, self.regex, self.whole_word, self.case_sensitive)
+
+    def __eq__(self, other):
+        return isinstance(other, SearchQuery) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'SearchQuery(%r, regex=%r, whole_word=%r, case_sensitive=%r)' % self._key()
+
+    def is_literal(self):
+        return not self.regex and not self.whole_word
+
+    def pattern(self):
+        """Return the compiled pattern for text; raises re.error for a bad regex."""
+        return compile_search(self)
+
+    def bytes_pattern(self):
+        """Return a pattern over raw UTF-8 bytes, or None if text must be decoded."""
+        return compile_search(self, binary=True)
+
+    def literal_text(self):
+        """Text every match contains, for index lookups, or None for a regex."""
+        return None if self.regex else self.text
+
+    def subn(self, replacement, text):
+        """Replace every match in text, returning (new_text, count).
+
+        In regex mode replacement may refer to groups (\\1, \\g<name>);
+        otherwise it is inserted as is.
+        """
+        pattern = self.pattern()
+        if isinstance(pattern, LiteralPattern):
+            return pattern.subn(replacement, text)
+        if not self.regex:
+            replacement = replacement.replace('\\', '\\\\')
+        return pattern.subn(replacement, text)
+
+    def check_replacement(self, replacement):
+        """Raise re.error if replacement refers to groups the pattern lacks."""
+        self.subn(replacement, '')
+
+    def line_replacer(self, replacement):
+        """Return a function replacing every match in a text line by line.
+
+        A match never spans lines, in a whole file as in an editor's blocks.
+        The function returns (new_text, count, keep), where the first keep
+        characters are unchanged: they end with the last line before the
+        first match. The pattern is looked up once, here, not per call.
+        """
+        pattern = self.pattern()
+        if not self.regex and not isinstance(pattern, LiteralPattern):
+            replacement = replacement.replace('\\', '\\\\')
+        if isinstance(pattern, LiteralPattern) and '\n' not in pattern.pattern:
+            # A literal cannot run past a line, so replace the text in one go
+            def replace(text):
+                first = next(pattern.spans(text), None)
+                if first is None:
+                    return text, 0, len(text)
+                new_text, count = pattern.subn(replacement, text)
+                return new_text, count, text.rfind('\n', 0, first[0]) + 1
+            return replace
+        subn = partial(pattern.subn, replacement)
+
+        def replace(text):
+            lines = text.split('\n')
+            results = list(map(subn, lines))
+            count = sum(map(itemgetter(1), results))
+            if not count:
+                return text, 0, len(text)
+            first = next(i for i, (line, replaced) in enumerate(results) if replaced)
+            keep = sum(map(len, lines[:first])) + first
+            return '\n'.join(map(itemgetter(0), results)), count, keep
+        return replace
+
+
+class LiteralMatch:
+    """The span of a LiteralPattern match, with the parts of re.Match in use."""
+
+    __slots__ = ('string', '_start', '_end')
+
+    def __init__(self, string, start, end):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def span(self):
+        return self._start, self._end
+
+    def group(self):
+        return self.string[self._start:self._end]
+
+
+class LiteralPattern:
+    """Plain text found with str.find or bytes.find instead of the regex engine.
+
+    Stands in for a compiled pattern where finditer, search and subn are
+    all that is needed. Case-insensitive search lowercases both sides,
+    which keeps positions only for bytes and ASCII text; other text goes
+    through the equivalent regex. An empty needle matches nothing.
+    """
+
+    def __init__(self, text, case_sensitive):
+        self.pattern = text
+        self.case_sensitive = case_sensitive
+        self.needle = text if case_sensitive else text.lower()
+        self._regex = None
+        if not case_sensitive and isinstance(text, str):
+            self._regex = re.compile(re.escape(text), re.IGNORECASE)
+
+    def _haystack(self, text):
+        if self.case_sensitive:
+            return text
+        if isinstance(text, bytes) or text.isascii():
+            return text.lower()
+        return None
+
+    def spans(self, text):
+        """Yield the (start, end) of each non-overlapping match in text."""
+        if not self.needle:
+            return
+        haystack = self._haystack(text)
+        if haystack is None:
+            for match in self._regex.finditer(text):
+                yield match.span()
+            return
+        needle = self.needle
+        size = len(needle)
+        i = haystack.find(needle)
+        while i >= 0:
+            yield i, i + size
+            i = haystack.find(needle, i + size)
+
+    def finditer(self, text):
+        for start, end in self.spans(text):
+            yield LiteralMatch(text, start, end)
+
+    def search(self, text):
+        return next(self.finditer(text), None)
+
+    def subn(self, replacement, text):
+        """Replace every match with replacement, taken literally."""
+        if not self.needle:
+            return text, 0
+        if self.case_sensitive:
+            count = text.count(self.needle)
+            return (text.replace(self.needle, replacement) if count else text), count
+        pieces = []
+        last = 0
+        for start, end in self.spans(text):
+            pieces.append(text[last:start])
+            pieces.append(replacement)
+            last = end
+        if not pieces:
+            return text, 0
+        pieces.append(text[last:])
+        return type(text)().join(pieces), len(pieces) // 2
+
+
+@lru_cache(maxsize=64)
+def compile_search(query, binary=False):
+    """Compile query, shared by every search; see SearchQuery.pattern.
+
+    With binary, returns a pattern over UTF-8 bytes, or None where only
+    decoded text matches correctly: regex and whole-word queries, and
+    case-insensitive ones with non-ASCII text, which need Unicode rules.
+    """
+    text = query.text
+    if binary:
+        if not query.is_literal() or not (query.case_sensitive or text.isascii()):
+            return None
+        return LiteralPattern(text.encode('utf-8'), query.case_sensitive)
+    if query.is_literal():
+        return LiteralPattern(text, query.case_sensitive)
+    source = text if query.regex else re.escape(text)
+    if query.whole_word:
+        source = r'\b(?:%s)\b' % source
+    flags = re.MULTILINE if query.regex else 0
+    if not query.case_sensitive:
+        flags |= re.IGNORECASE
+    return re.compile(source, flags)
+
+
+class MatchIndex:
+    """Positions of every match of one pattern in a document, kept up to date.
+
+    The document is scanned once; after that an edit rescans only the
+    blocks it touched and shifts the matches after them. Matches are kept as
+    sorted start and end positions, so finding the next or previous match
+    is a binary search. Matches do not span blocks.
+    """
+
+    def __init__(self, document, pattern, matches=None):
+        self.document = document
+        self.pattern = pattern
+        self.starts = []
+        self.ends = []
+        self._following = False
+        if matches is not None:
+            # Starts and ends already scanned from the current text
+            self.starts, self.ends = matches
+        else:
+            self.build()
+        self.follow()
+
+    def close(self):
+        """Stop following edits."""
+        if self._following:
+            self._following = False
+            self.document.contentsChange.disconnect(self._on_contents_change)
+
+    def follow(self):
+        """Follow edits again after close(), e.g. around format-only changes."""
+        if not self._following:
+            self._following = True
+            self.document.contentsChange.connect(self._on_contents_change)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def matches(self):
+        return list(zip(self.starts, self.ends))
+
+    def build(self):
+        self.starts, self.ends = self.scan(self.pattern, self.document.toPlainText(), 0)
+
+    @classmethod
+    def scan(cls, pattern, text, base):
+        """Return match starts and ends in text as document positions from
+        base, leaving out empty matches."""
+        starts = []
+        ends = []
+        astral = _has_astral(text)
+        if isinstance(pattern, LiteralPattern) and not astral and '\n' not in pattern.pattern:
+            # A literal cannot run past a line, so search the text in one go
+            for start, end in pattern.spans(text):
+                starts.append(base + start)
+                ends.append(base + end)
+            return starts, ends
+        for line_start, line in cls._lines(text):
+            for match in pattern.finditer(line):
+                start, end = match.span()
+                if start == end:
+                    continue
+                if astral:
+                    # Qt positions count UTF-16 units
+                    start = len(line[:start].encode('utf-16-le')) // 2
+                    end = start + len(match.group().encode('utf-16-le')) // 2
+                starts.append(base + line_start + start)
+                ends.append(base + line_start + end)
+        return starts, ends
+
+    @staticmethod
+    def _lines(text):
+        if '\n' not in text:
+            yield 0, text
+            return
+        utf16 = _has_astral(text)
+        position = 0
+        for line in text.split('\n'):
+            yield position, line
+            position += (len(line.encode('utf-16-le')) // 2 if utf16 else len(line)) + 1
+
+    def _on_contents_change(self, position, removed, added):
+        document = self.document
+        end = min(position + added, document.characterCount() - 1)
+        first = document.findBlock(position)
+        last = document.findBlock(end)
+        if not first.isValid() or not last.isValid():
+            self.build()
+            return
+        new_start = first.position()
+        new_end = last.position() + last.length() - 1
+        delta = added - removed
+        old_end = new_end - delta
+        cursor = QTextCursor(document)
+        cursor.setPosition(new_start)
+        cursor.setPosition(new_end, QTextCursor.KeepAnchor)
+        text = cursor.selectedText().replace('\u2029', '\n')
+        starts, ends = self.scan(self.pattern, text, new_start)
+        lo = bisect.bisect_left(self.starts, new_start)
+        hi = bisect.bisect_right(self.starts, old_end)
+        tail_starts = self.starts[hi:]
+        tail_ends = self.ends[hi:]
+        if delta:
+            tail_starts = [s + delta for s in tail_starts]
+            tail_ends = [e + delta for e in tail_ends]
+        self.starts[lo:] = starts + tail_starts
+        self.ends[lo:] = ends + tail_ends
+
+    def next_match(self, position):
+        """Return the index of the first match at or after position, wrapping."""
+        if not self.starts:
+            return None
+        i = bisect.bisect_left(self.starts, position)
+        return i if i < len(self.starts) else 0
+
+    def previous_match(self, position):
+        """Return the index of the last match ending at or before position, wrapping."""
+        if not self.starts:
+            return None
+        i = bisect.bisect_left(self.starts, position) - 1
+        while i >= 0 and self.ends[i] > position:
+            i -= 1
+        return i if i >= 0 else len(self.starts) - 1
+
+
+class LiveSearch(QObject):
+    """Finds every match of a pattern in a document off the GUI thread.
+
+    The GUI thread copies the text out of the document a chunk of whole
+    blocks at a time, within the frame budget, and a pool thread scans each
+    chunk as it arrives. A search is tied to the document revision it
+    started from; cancel it and start a new one when the query or the text
+    changes.
+    """
+
+    # Matches found so far
+    progress = Signal(int)
+    # Sorted match starts and ends, as for MatchIndex
+    finished = Signal(object, object)
+
+    # Characters copied per chunk; documents smaller than this are
+    # quicker to scan in place
+    CHUNK_CHARS = 1 << 16
+    # Most of a frame's budget that copying may use; the scanning thread
+    # competes with the GUI thread for the GIL, so leave it some slack
+    COPY_BUDGET_MS = 8.0
+
+    def __init__(self, document, pattern):
+        super().__init__()
+        self.document = document
+        self.pattern = pattern
+        self.revision = document.revision()
+        self.match_count = 0
+        self._position = 0
+        # Running estimate of the time one chunk takes to copy
+        self._chunk_ms = 0.0
+        self._chunks = deque()
+        self._copied = False
+        self._ready = threading.Condition()
+        self._cancelled = False
+        self._done = threading.Event()
+        self._copy_task = FrameTask(
+            self._copy_chunks, FrameScheduler.PRIORITY_VISIBLE_TAB, name='find')
+
+    def start(self):
+        self._copy_task.start()
+        QThreadPool.globalInstance().start(self._run)
+
+    def cancel(self):
+        """Stop copying and scanning; nothing more is emitted."""
+        self._copy_task.stop()
+        with self._ready:
+            self._cancelled = True
+            self._ready.notify()
+
+    def is_finished(self):
+        return self._done.is_set()
+
+    def _copy_chunks(self, budget_ms):
+        document = self.document
+        if document.revision() != self.revision:
+            # The text changed under the snapshot; the owner starts over
+            self.cancel()
+            return
+        budget_ms = min(budget_ms, self.COPY_BUDGET_MS)
+        timer = QElapsedTimer()
+        timer.start()
+        end_of_text = document.characterCount() - 1
+        cursor = QTextCursor(document)
+        copied = False
+        while self._position < end_of_text:
+            # Stop before a chunk that would overrun the budget
+            if copied and timer.elapsed() + self._chunk_ms > budget_ms:
+                return
+            copied = True
+            chunk_timer = QElapsedTimer()
+            chunk_timer.start()
+            block = document.findBlock(min(self._position + self.CHUNK_CHARS, end_of_text))
+            end = min(block.position() + block.length() - 1, end_of_text)
+            cursor.setPosition(self._position)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            chunk = (self._position, cursor.selectedText().replace('\u2029', '\n'))
+            with self._ready:
+                self._chunks.append(chunk)
+                self._ready.notify()
+            self._position = end + 1
+            self._chunk_ms = (self._chunk_ms + chunk_timer.nsecsElapsed() / 1e6) / 2
+        self._copy_task.stop()
+        with self._ready:
+            self._copied = True
+            self._ready.notify()
+
+    def _run(self):
+        try:
+            starts = []
+            ends = []
+            while True:
+                with self._ready:
+                    while not (self._chunks or self._copied or self._cancelled):
+                        self._ready.wait()
+                    if self._cancelled:
+                        return
+                    if not self._chunks:
+                        break
+                    base, text = self._chunks.popleft()
+                # Chunks end on block boundaries and matches do not span blocks
+                chunk_starts, chunk_ends = MatchIndex.scan(self.pattern, text, base)
+                starts += chunk_starts
+                ends += chunk_ends
+                if chunk_starts:
+                    self.match_count = len(starts)
+                    self.progress.emit(self.match_count)
+                # Hand the GIL back so the GUI thread never waits a whole
+                # switch interval for it
+                time.sleep(0)
+            self.finished.emit(starts, ends)
+        finally:
+            self._done.set()
+
+
 class FindReplaceDialog(QDialog):
     """Find and Replace dialog."""
     
+    # Typing pause before the live search starts
+    LIVE_SEARCH_DELAY_MS = 150
+    # Documents larger than this are replaced a few chunks per frame
+    CHUNKED_REPLACE_CHARS = 10 * 1024 * 1024
+    # Characters of whole blocks read and replaced at a time
+    REPLACE_CHUNK_CHARS = 1 << 14
+    
     def __init__(self, editor, parent=None):
         super().__init__(parent)
         self.editor = editor
         self.parent_editor = parent
         self.setWindowTitle("Find and Replace")
-        self.setFixedSize(400, 150)
+        self.setFixedSize(400, 180)
         self.current_match_index = 0
-        self.all_matches = []
+        # Built once per query, then kept up to date as the document is edited
+        self.match_index = None
+        self._match_query = None
+        self._current_match = None
+        # Find-as-you-type: a LiveSearch runs once typing pauses
+        self.live_search = None
+        self._live_query = None
+        self.live_search_timer = QTimer(self)
+        self.live_search_timer.setSingleShot(True)
+        self.live_search_timer.setInterval(self.LIVE_SEARCH_DELAY_MS)
+        self.live_search_timer.timeout.connect(self.start_live_search)
         self.setup_ui()
+        self.find_input.textChanged.connect(self.live_search_timer.start)
+        for option in (self.regex_check, self.whole_word_check, self.case_check):
+            option.toggled.connect(self.live_search_timer.start)
+        self._document = None
+        if isinstance(self.editor, QPlainTextEdit):
+            self._document = self.editor.document()
+            self._document.contentsChanged.connect(self._on_document_changed)
+    
+    @property
+    def all_matches(self):
+        """(start, end) of every match of the current query."""
+        return self.match_index.matches() if self.match_index is not None else []
+    
+    def update_match_index(self, text):
+        """Return the match index for text, rebuilding it only when the query changes.
+
+        Returns None if text is not a valid regex.
+        """
+        query = self.search_query(text)
+        if self.match_index is None or query != self._match_query:
+            self.cancel_live_search()
+            self.clear_match_index()
+            pattern = self.compile_query(query)
+            if pattern is None:
+                return None
+            self.match_index = MatchIndex(self.editor.document(), pattern)
+            self._match_query = query
+            self.update_match_count()
+        return self.match_index
+    
+    def search_query(self, text=None):
+        """Return a SearchQuery for text (default: the find field) with the chosen modes."""
+        return SearchQuery(self.find_input.text() if text is None else text,
+                           regex=self.regex_check.isChecked(),
+                           whole_word=self.whole_word_check.isChecked(),
+                           case_sensitive=self.case_check.isChecked())
+    
+    def compile_query(self, query):
+        """Return query's pattern, or None after reporting an invalid regex."""
+        try:
+            return query.pattern()
+        except re.error as e:
+            self.match_count_label.setText(f"Invalid pattern: {e}")
+            return None
+    
+    def clear_match_index(self):
+        if self.match_index is not None:
+            self.match_index.close()
+        self.match_index = None
+        self._match_query = None
+        self._current_match = None
+    
+    def start_live_search(self):
+        """Index the current query's matches without blocking the editor."""
+        query = self.search_query()
+        self.live_search_timer.stop()
+        if self.match_index is not None and query == self._match_query:
+            self.update_match_count()
+            return
+        self.cancel_live_search()
+        self.clear_match_index()
+        if not query.text or self._document is None:
+            self.show_match_highlights(None)
+            self.update_match_count()
+            return
+        pattern = self.compile_query(query)
+        if pattern is None:
+            self.show_match_highlights(None)
+            return
+        document = self.editor.document()
+        if document.characterCount() <= LiveSearch.CHUNK_CHARS:
+            # Small documents scan within a frame
+            self.highlight_all_matches()
+            return
+        self.live_search = LiveSearch(document, pattern)
+        self._live_query = query
+        self.live_search.progress.connect(self._on_live_progress)
+        self.live_search.finished.connect(self._on_live_finished)
+        self.live_search.start()
+        self.update_match_count()
+    
+    def cancel_live_search(self):
+        if self.live_search is not None:
+            self.live_search.cancel()
+            self.live_search = None
+            self._live_query = None
+    
+    def _on_live_progress(self, count):
+        if self.sender() is self.live_search:
+            self.update_match_count()
+    
+    def _on_live_finished(self, starts, ends):
+        search = self.live_search
+        if self.sender() is not search:
+            return
+        self.live_search = None
+        query = self._live_query
+        self._live_query = None
+        if self.editor.document().revision() != search.revision:
+            self.live_search_timer.start()
+            return
+        self.match_index = MatchIndex(self.editor.document(), search.pattern, (starts, ends))
+        self._match_query = query
+        self.show_match_highlights(self.match_index)
+        self.update_match_count()
+    
+    def _on_document_changed(self):
+        search = self.live_search
+        if search is not None and self.editor.document().revision() != search.revision:
+            # The snapshot is stale; search the new text once edits pause
+            self.cancel_live_search()
+            self.live_search_timer.start()
+        elif self.match_index is not None:
+            self.update_match_count()
+    
+    def update_match_count(self):
+        """Show how many matches the query has, counting up during a live search."""
+        if self.live_search is not None:
+            count = self.live_search.match_count
+            searching = "..."
+        elif self.match_index is not None:
+            count = len(self.match_index)
+            searching = ""
+        else:
+            self.match_count_label.setText("")
+            return
+        if count == 0 and not searching:
+            self.match_count_label.setText("No matches")
+        else:
+            noun = "match" if count == 1 else "matches"
+            self.match_count_label.setText(f"{count:,} {noun}{searching}")
+    
+    def done(self, result):
+        self.live_search_timer.stop()
+        self.cancel_live_search()
+        if self._document is not None:
+            self._document.contentsChanged.disconnect(self._on_document_changed)
+            self._document = None
+        self.clear_match_index()
+        self.show_match_highlights(None)
+        super().done(result)
+    
+    def show_match_highlights(self, index, current=None):
+        """Draw index's matches over the editor, or clear them if index is None."""
+        if not isinstance(self.editor, CodeEditor):
+            return
+        if index is None:
+            self.editor.clear_match_highlights()
+        else:
+            self.editor.set_match_highlights(index, current)
     
     def keyPressEvent(self, event):
         """Handle key press events, allowing Ctrl+P to toggle frame timer."""
@@ -1218,6 +3450,9 @@ class FindReplaceDialog(QDialog):
         self.find_btn = QPushButton("Find Next")
         self.find_btn.clicked.connect(self.find_next)
         find_layout.addWidget(self.find_btn)
+        self.find_previous_btn = QPushButton("Previous")
+        self.find_previous_btn.clicked.connect(self.find_previous)
+        find_layout.addWidget(self.find_previous_btn)
         layout.addLayout(find_layout)
         
         # Replace row
@@ -1230,341 +3465,1142 @@ class FindReplaceDialog(QDialog):
         replace_layout.addWidget(self.replace_btn)
         layout.addLayout(replace_layout)
         
-        # Replace all button
+        # Match count and replace all button
+        bottom_layout = QHBoxLayout()
+        self.match_count_label = QLabel()
+        bottom_layout.addWidget(self.match_count_label, 1)
         self.replace_all_btn = QPushButton("Replace All")
         self.replace_all_btn.clicked.connect(self.replace_all)
-        layout.addWidget(self.replace_all_btn)
+        bottom_layout.addWidget(self.replace_all_btn)
+        layout.addLayout(bottom_layout)
+        
+        # Search modes
+        options_layout = QHBoxLayout()
+        self.regex_check = QCheckBox("Regex")
+        options_layout.addWidget(self.regex_check)
+        self.whole_word_check = QCheckBox("Whole word")
+        options_layout.addWidget(self.whole_word_check)
+        self.case_check = QCheckBox("Match case")
+        options_layout.addWidget(self.case_check)
+        options_layout.addStretch()
+        layout.insertLayout(2, options_layout)
     
     def highlight_all_matches(self):
         """Highlight all instances of the search text."""
         text = self.find_input.text()
-        self.all_matches = []
-        
-        # Clear previous highlights
+        self._current_match = None
+        if not text:
+            self.clear_match_index()
+            self.show_match_highlights(None)
+            self.update_match_count()
+            return
+        # Drawn as an overlay on the visible matches only
+        self.show_match_highlights(self.update_match_index(text))
+    
+    def highlight_current_match(self, start, end):
+        """Highlight a specific match with emphasis."""
+        # Create cursor for current match
         cursor = self.editor.textCursor()
-        cursor.select(QTextCursor.Document)
-        format = QTextCharFormat()
-        cursor.setCharFormat(format)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        
+        # Set cursor position to this match
+        self.editor.setTextCursor(cursor)
         
+        # Highlight with emphasis
+        self._current_match = (start, end)
+        if self.match_index is not None:
+            self.show_match_highlights(self.match_index, self._current_match)
+    
+    def find_next(self):
+        text = self.find_input.text()
         if not text:
             return
-        
-        # Find all matches
-        document = self.editor.document()
-        cursor = QTextCursor(document)
-        cursor.movePosition(QTextCursor.Start)
-        
-        while True:
-            cursor = document.find(text, cursor)
-            if cursor.isNull():
-                break
-            
-            self.all_matches.append((cursor.selectionStart(), cursor.selectionEnd()))
-            
-            # Highlight this match (non-emphasized)
-            format = QTextCharFormat()
-            format.setBackground(QColor("#555555"))
-            format.setForeground(QColor("#ffffff"))
-            cursor.setCharFormat(format)
-            
-            # Move cursor forward to find next match
-            cursor.movePosition(QTextCursor.EndOfWord)
-    
-    def highlight_current_match(self, start, end):
-        """Highlight a specific match with emphasis."""
-        # Create cursor for current match
-        cursor = self.editor.textCursor()
-        cursor.setPosition(start)
-        cursor.setPosition(end, QTextCursor.KeepAnchor)
-        
-        # Highlight with emphasis
-        format = QTextCharFormat()
-        format.setBackground(QColor("#ffff00"))
-        format.setForeground(QColor("#000000"))
-        format.setFontWeight(700)
-        cursor.setCharFormat(format)
-        
-        # Set cursor position to this match
-        self.editor.setTextCursor(cursor)
-    
-    def find_next(self):
-        text = self.find_input.text()
-        if text:
-            # Find using Qt's built-in find
-            cursor = self.editor.textCursor()
-            
-            # If there's a current selection, move past it before searching for next
-            if cursor.hasSelection():
-                cursor.setPosition(cursor.selectionEnd())
-            
-            self.editor.setTextCursor(cursor)
-            
-            if self.editor.find(text):
-                # Highlight all matches to refresh
-                self.highlight_all_matches()
-                # Emphasize the current selection
-                cursor = self.editor.textCursor()
-                if cursor.hasSelection():
-                    self.highlight_current_match(cursor.selectionStart(), cursor.selectionEnd())
-            else:
-                # Wrap around to start
-                cursor = self.editor.textCursor()
-                cursor.movePosition(QTextCursor.Start)
-                self.editor.setTextCursor(cursor)
-                if self.editor.find(text):
-                    self.highlight_all_matches()
-                    cursor = self.editor.textCursor()
-                    if cursor.hasSelection():
-                        self.highlight_current_match(cursor.selectionStart(), cursor.selectionEnd())
-    
-    def replace(self):
-        cursor = self.editor.textCursor()
-        if cursor.hasSelection():
-            cursor.insertText(self.replace_input.text())
-        self.highlight_all_matches()
-        if self.all_matches:
-            self.find_next()
-    
-    def replace_all(self):
-         find_text = self.find_input.text()
-         replace_text = self.replace_input.text()
-         if find_text:
-             import re
-             content = self.editor.toPlainText()
-             
-             # Compile regex pattern once for efficiency
-             pattern_obj = re.compile(re.escape(find_text), re.IGNORECASE)
-             
-             # Count matches before replacement
-             matches = len(pattern_obj.findall(content))
-             
-             # For large content, defer the actual replacement to keep frames responsive
-             if len(content) > 10 * 1024 * 1024:  # 10MB threshold
-                 # Store data for deferred processing - defer the split to the next frame
-                 self._pending_replace = {
-                     'pattern': pattern_obj,
-                     'replace_text': replace_text,
-                     'content': content,
-                     'total_matches': matches
-                 }
-                 # Defer the split operation to the next frame
-                 QTimer.singleShot(0, self._prepare_chunked_replace)
-             else:
-                 # For smaller files, do replacement all at once
-                 new_content = pattern_obj.sub(replace_text, content)
-                 
-                 if new_content != content:
-                     # Use edit block for proper undo support
-                     cursor = self.editor.textCursor()
-                     cursor.beginEditBlock()
-                     cursor.select(QTextCursor.Document)
-                     cursor.insertText(new_content)
-                     cursor.endEditBlock()
-                     self.editor.document().setModified(True)
-                 
-                 # Show result (defer to avoid blocking in tests)
-                 QTimer.singleShot(0, lambda: self._show_replace_result(matches))
-    
-    def _prepare_chunked_replace(self):
-         """Prepare for chunked replace by splitting content (deferred to next frame)."""
-         if not hasattr(self, '_pending_replace'):
-             return
-         
-         pending = self._pending_replace
-         del self._pending_replace
-         
-         # Now do the split on this frame (which is now a new frame)
-         self._replace_state = {
-             'pattern': pending['pattern'],
-             'replace_text': pending['replace_text'],
-             'lines': pending['content'].split('\n'),
-             'line_index': 0,
-             'total_matches': pending['total_matches'],
-             'replaced_count': 0
-         }
-         
-         # Initialize lines per frame to a small value to avoid frame drops
-         self._replace_lines_per_frame = 100
-         
-         # Start chunked replacement
-         self._replace_timer = QTimer(self.editor)
-         self._replace_timer.timeout.connect(self._replace_next_chunk)
-         self._replace_timer.start(16)  # ~60fps
-    
-    def _replace_next_chunk(self):
-         """Process the next chunk of lines for find and replace."""
-         if not hasattr(self, '_replace_state'):
-             return
-         
-         state = self._replace_state
-         
-         # Dynamically adjust lines per frame to fit in ~12ms (leaving 4ms buffer for other tasks)
-         lines_per_frame = getattr(self, '_replace_lines_per_frame', 100)
-         start_idx = state['line_index']
-         start_time = time.time()
-         end_idx = min(start_idx + lines_per_frame, len(state['lines']))
-         
-         # Use pre-compiled pattern object for efficiency
-         pattern = state['pattern']
-         
-         for i in range(start_idx, end_idx):
-             line = state['lines'][i]
-             new_line = pattern.sub(state['replace_text'], line)
-             if new_line != line:
-                 # Count actual replacements made on this line
-                 state['replaced_count'] += len(pattern.findall(line))
-             state['lines'][i] = new_line
-         
-         # Measure frame time and adjust for next frame
-         frame_time = (time.time() - start_time) * 1000
-         lines_processed = end_idx - start_idx
-         if frame_time > 0 and lines_processed > 0:
-             target_ms = 12.0
-             new_lines = max(100, int(lines_processed * (target_ms / frame_time)))
-             self._replace_lines_per_frame = new_lines
-         
-         state['line_index'] = end_idx
-         
-         # Check if we're done
-         if end_idx >= len(state['lines']):
-             # Join back the lines and update editor
-             new_content = '\n'.join(state['lines'])
-             cursor = self.editor.textCursor()
-             cursor.beginEditBlock()
-             cursor.select(QTextCursor.Document)
-             cursor.insertText(new_content)
-             cursor.endEditBlock()
-             self.editor.document().setModified(True)
-             
-             # Clean up
-             self._replace_timer.stop()
-             del self._replace_timer
-             matches = state['total_matches']
-             del self._replace_state
-             
-             # Show result
-             QTimer.singleShot(0, lambda m=matches: self._show_replace_result(m))
-    
-    def _show_replace_result(self, matches):
-        """Show replace result in a non-blocking way."""
-        # Only show message if dialog is visible (skip in tests)
-        if self.isVisible():
-            if matches > 0:
-                QMessageBox.information(self, "Replace Complete", f"Replaced {matches} occurrences.")
-            else:
-                QMessageBox.information(self, "No Matches", "No matches found to replace.")
+        if self.match_index is None or self.search_query(text) != self._match_query:
+            # New query: scan the document once and highlight every match
+            if self.update_match_index(text) is None:
+                return
+            self.highlight_all_matches()
+        index = self.match_index
+        
+        # Search from past the current selection, wrapping around to the start
+        cursor = self.editor.textCursor()
+        position = cursor.selectionEnd() if cursor.hasSelection() else cursor.position()
+        i = index.next_match(position)
+        if i is None:
+            return
+        self.current_match_index = i
+        self.highlight_current_match(index.starts[i], index.ends[i])
+    
+    def find_previous(self):
+        text = self.find_input.text()
+        if not text:
+            return
+        if self.match_index is None or self.search_query(text) != self._match_query:
+            if self.update_match_index(text) is None:
+                return
+            self.highlight_all_matches()
+        index = self.match_index
+        cursor = self.editor.textCursor()
+        position = cursor.selectionStart() if cursor.hasSelection() else cursor.position()
+        i = index.previous_match(position)
+        if i is None:
+            return
+        self.current_match_index = i
+        self.highlight_current_match(index.starts[i], index.ends[i])
+    
+    def replace(self):
+        query = self.search_query()
+        cursor = self.editor.textCursor()
+        if cursor.hasSelection():
+            replacement = self.replace_input.text()
+            if query.regex:
+                # Expand group references against the selected match
+                pattern = self.compile_query(query)
+                if pattern is None:
+                    return
+                try:
+                    replacement = pattern.sub(replacement, cursor.selectedText(), count=1)
+                except re.error as e:
+                    self.match_count_label.setText(f"Invalid replacement: {e}")
+                    return
+            cursor.insertText(replacement)
+            self._current_match = None
+        if not query.text:
+            return
+        index = self.update_match_index(query.text)
+        if index is not None and index.starts:
+            self.find_next()
+    
+    def replace_all(self):
+        """Replace every match, editing the document a chunk of blocks at a time.
+
+        The whole replace is one undo step. Large documents are edited a few
+        chunks per frame; _replace_state is set until the replace is done.
+        Each block is replaced on its own, as MatchIndex finds matches, so a
+        pattern never matches across lines whatever the chunking.
+        """
+        query = self.search_query()
+        if not query.text or hasattr(self, '_replace_state'):
+            return
+        replace_text = self.replace_input.text()
+        pattern = self.compile_query(query)
+        if pattern is None:
+            return
+        try:
+            query.check_replacement(replace_text)
+        except re.error as e:
+            self.match_count_label.setText(f"Invalid replacement: {e}")
+            return
+        self.live_search_timer.stop()
+        self.cancel_live_search()
+        document = self.editor.document()
+        self._replace_state = {
+            'replace': query.line_replacer(replace_text),
+            'position': 0,
+            'replaced_count': 0,
+            'edited': False,
+            # Running estimate of the time one chunk takes
+            'chunk_ms': 0.0,
+        }
+        if document.characterCount() > self.CHUNKED_REPLACE_CHARS:
+            # The user is waiting on it, so it runs with the visible tab's priority
+            self._replace_timer = FrameTask(
+                self._replace_next_chunk, FrameScheduler.PRIORITY_VISIBLE_TAB,
+                name='replace', owner=self.editor)
+            self._replace_timer.start()
+        else:
+            self._replace_next_chunk(None)
+    
+    def _replace_next_chunk(self, budget_ms=12.0):
+        """Replace matches in the next chunks of blocks, within budget_ms if given."""
+        if not hasattr(self, '_replace_state'):
+            return
+        state = self._replace_state
+        replace = state['replace']
+        document = self.editor.document()
+        end_of_text = document.characterCount() - 1
+        cursor = QTextCursor(document)
+        timer = QElapsedTimer()
+        timer.start()
+        replaced_any = False
+        while state['position'] < end_of_text:
+            if (budget_ms is not None and replaced_any
+                    and timer.elapsed() + state['chunk_ms'] > budget_ms):
+                return
+            replaced_any = True
+            chunk_timer = QElapsedTimer()
+            chunk_timer.start()
+            start = state['position']
+            block = document.findBlock(min(start + self.REPLACE_CHUNK_CHARS, end_of_text))
+            end = min(block.position() + block.length() - 1, end_of_text)
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            text = cursor.selectedText().replace('\u2029', '\n')
+            new_text, count, keep = replace(text)
+            if count:
+                state['replaced_count'] += count
+                # Blocks before the first match are left alone
+                new_text = new_text[keep:]
+                cursor.setPosition(start + _utf16_length(text[:keep]))
+                cursor.setPosition(end, QTextCursor.KeepAnchor)
+                if state['edited']:
+                    # One undo step for the whole replace
+                    cursor.joinPreviousEditBlock()
+                else:
+                    cursor.beginEditBlock()
+                    state['edited'] = True
+                cursor.insertText(new_text)
+                cursor.endEditBlock()
+                end = cursor.position()
+                end_of_text = document.characterCount() - 1
+            state['position'] = end + 1
+            state['chunk_ms'] = (state['chunk_ms'] + chunk_timer.nsecsElapsed() / 1e6) / 2
+        
+        if hasattr(self, '_replace_timer'):
+            self._replace_timer.stop()
+            del self._replace_timer
+        del self._replace_state
+        if state['edited']:
+            document.setModified(True)
+        matches = state['replaced_count']
+        # Show result (defer to avoid blocking in tests)
+        QTimer.singleShot(0, lambda: self._show_replace_result(matches))
+    
+    def _show_replace_result(self, matches):
+        """Show replace result in a non-blocking way."""
+        # Only show message if dialog is visible (skip in tests)
+        if self.isVisible():
+            if matches > 0:
+                QMessageBox.information(self, "Replace Complete", f"Replaced {matches} occurrences.")
+            else:
+                QMessageBox.information(self, "No Matches", "No matches found to replace.")
+
+
+def search_file(file_path, query):
+    """Return (file_path, line_num, line_text, match_start, match_text) for each match.
+
+    query is a SearchQuery or plain text. Files with a NUL byte in their
+    first block are taken as binary and skipped. Where the query allows,
+    the raw bytes are searched without decoding. As in MatchIndex, empty
+    matches, such as those of ^, are not results.
+    """
+    query = SearchQuery.coerce(query)
+    pattern = query.bytes_pattern() or query.pattern()
+    with open(file_path, 'rb') as f:
+        data = f.read(SearchFilter.SNIFF_BYTES)
+        if SearchFilter.is_binary(data):
+            return []
+        data += f.read()
+    if isinstance(pattern.pattern, str):
+        data = data.decode('utf-8', errors='ignore')
+        newline = '\n'
+    else:
+        newline = b'\n'
+    results = []
+    line_num = 1
+    counted_to = 0
+    for match in pattern.finditer(data):
+        start, end = match.span()
+        if start == end:
+            continue
+        line_num += data.count(newline, counted_to, start)
+        counted_to = start
+        line_start = data.rfind(newline, 0, start) + 1
+        line_end = data.find(newline, start)
+        line_end = len(data) if line_end < 0 else line_end + 1
+        line = data[line_start:line_end]
+        before = data[line_start:start]
+        match_text = match.group()
+        if newline == b'\n':
+            line = line.decode('utf-8', errors='ignore')
+            before = before.decode('utf-8', errors='ignore')
+            match_text = match_text.decode('utf-8', errors='ignore')
+        if line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+        results.append((file_path, line_num, line, len(before), match_text))
+    return results
+
+
+def search_files(file_paths, query):
+    """Search a batch of files; return (results, errors).
+
+    errors has a (file_path, message) for each file that could not be read.
+    """
+    results = []
+    errors = []
+    for file_path in file_paths:
+        try:
+            results.extend(search_file(file_path, query))
+        except (OSError, UnicodeError) as e:
+            errors.append((file_path, str(e)))
+    return results, errors
+
+
+def search_files_pickled(file_paths, query):
+    """Search a batch of files in a worker process: (match count, pickled
+    results, errors)."""
+    results, errors = search_files(file_paths, query)
+    return len(results), pickle.dumps(results, pickle.HIGHEST_PROTOCOL), errors
+
+
+class GitIgnore:
+    """Matches paths against the rules of the .gitignore files above them.
+
+    Rules are (base, regex, negated, dir_only), where base is the folder of
+    the .gitignore relative to the search root, using '/' separators.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    def child(self, root, rel_dir):
+        """Return the rules that apply inside rel_dir, adding its .gitignore."""
+        try:
+            with open(os.path.join(root, rel_dir, '.gitignore'), encoding='utf-8', errors='ignore') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return self
+        base = '' if rel_dir in ('', os.curdir) else rel_dir.replace(os.sep, '/')
+        rules = [rule for rule in (self.parse_rule(base, line) for line in lines) if rule]
+        return GitIgnore(self.rules + rules) if rules else self
+
+    @staticmethod
+    def parse_rule(base, line):
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            return None
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        # A slash other than a trailing one anchors the pattern to base
+        anchored = '/' in line
+        line = line.lstrip('/')
+        regex = GitIgnore.translate(line)
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        return base, re.compile(regex + r'\Z'), negated, dir_only
+
+    @staticmethod
+    def translate(pattern):
+        """Translate a gitignore glob to a regex where '*' stops at '/'."""
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                parts.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                parts.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                parts.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                parts.append('[^/]')
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 2 if pattern[i + 1:i + 2] == ']' else i + 1)
+                chars = pattern[i + 1:end].replace('\\', '\\\\')
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                parts.append('[' + chars + ']')
+                i = end + 1
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return ''.join(parts)
+
+    def ignored(self, rel_path, is_dir):
+        """Return whether rel_path ('/' separated) is ignored; the last matching rule wins."""
+        ignored = False
+        for base, regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + '/'):
+                    continue
+                path = rel_path[len(base) + 1:]
+            else:
+                path = rel_path
+            if regex.match(path):
+                ignored = not negated
+        return ignored
+
+
+class SearchFilter:
+    """Decides which files under a folder a search reads.
+
+    Directories are pruned during the walk, so excluded and ignored subtrees
+    are never listed. Files are kept if they pass the include and exclude
+    globs, any .gitignore rules and the size cap; binary files are skipped
+    when read, by search_file.
+    """
+
+    # Always excluded, in addition to the user's exclude globs
+    DEFAULT_EXCLUDES = (
+        '.git', '.hg', '.svn', '__pycache__', 'node_modules', '.coverage',
+        '*.pyc', '*.pyo', '*.so', '*.dll', '*.exe', '*.o', '*.a', '*.class',
+        '*.png', '*.jpg', '*.jpeg', '*.gif', '*.bmp', '*.ico', '*.pdf',
+        '*.zip', '*.gz', '*.tar', '*.7z', '*.sqlite', '*.db',
+    )
+    MAX_FILE_SIZE = 16 * 1024 * 1024
+    # A NUL byte in this many leading bytes marks a file as binary
+    SNIFF_BYTES = 8192
+
+    def __init__(self, include=(), exclude=(), use_gitignore=True, max_file_size=None):
+        self.include = list(include)
+        self.exclude = list(self.DEFAULT_EXCLUDES) + list(exclude)
+        self.use_gitignore = use_gitignore
+        self.max_file_size = self.MAX_FILE_SIZE if max_file_size is None else max_file_size
+
+    @staticmethod
+    def parse_globs(text):
+        """Split a comma-separated list of globs as typed in the search dialog."""
+        return [glob.strip() for glob in text.split(',') if glob.strip()]
+
+    @staticmethod
+    def is_binary(head):
+        return b'\0' in head
+
+    def _matches(self, globs, name, rel_path):
+        return any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(rel_path, glob) for glob in globs)
+
+    def excluded(self, rel_path):
+        """Return whether rel_path ('/' separated) or any folder above it is excluded."""
+        parts = rel_path.split('/')
+        return any(self._matches(self.exclude, parts[i], '/'.join(parts[:i + 1]))
+                   for i in range(len(parts)))
+
+    def included(self, rel_path):
+        return not self.include or self._matches(self.include, rel_path.rsplit('/', 1)[-1], rel_path)
+
+    def accepts(self, rel_path):
+        """Check a file's path against the globs alone, e.g. for indexed paths."""
+        rel_path = rel_path.replace(os.sep, '/')
+        return self.included(rel_path) and not self.excluded(rel_path)
+
+    def walk(self, root, cancelled=lambda: False):
+        """Yield (path, stat_result) for each file under root that passes the filter."""
+        ignores = {'': GitIgnore().child(root, '') if self.use_gitignore else GitIgnore()}
+        for dir_path, dirs, files in os.walk(root):
+            if cancelled():
+                return
+            rel_dir = os.path.relpath(dir_path, root)
+            rel_dir = '' if rel_dir == os.curdir else rel_dir.replace(os.sep, '/')
+            gitignore = ignores.pop(rel_dir, GitIgnore())
+            prefix = rel_dir + '/' if rel_dir else ''
+            kept = []
+            for name in dirs:
+                rel_path = prefix + name
+                if self._matches(self.exclude, name, rel_path) or gitignore.ignored(rel_path, True):
+                    continue
+                kept.append(name)
+                ignores[rel_path] = gitignore.child(root, rel_path) if self.use_gitignore else gitignore
+            # Pruning in place keeps os.walk out of the skipped subtrees
+            dirs[:] = kept
+            for name in files:
+                rel_path = prefix + name
+                if self._matches(self.exclude, name, rel_path) or gitignore.ignored(rel_path, False):
+                    continue
+                if not self.included(rel_path):
+                    continue
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_size <= self.max_file_size:
+                    yield path, st
+
+
+class SearchEngine(QObject):
+    """Searches every file under a folder and streams the matches back.
+
+    Larger trees are searched in batches on a shared process pool; the walk
+    and the hand-off run on a pool thread so the GUI stays responsive. A
+    synchronous run() searches small trees in-process, where starting
+    workers would cost more than the search; a search started with start()
+    always uses the pool, whose batches come back pickled and are unpickled
+    on the GUI thread (see the note on worker threads at the top).
+    """
+
+    # A list of (file_path, line_num, line_text, match_start, match_text)
+    results_found = Signal(list)
+    # A list of (file_path, message) for files that could not be read
+    errors_found = Signal(list)
+    # Files searched so far
+    progress = Signal(int)
+    # True if the search was cancelled
+    finished = Signal(bool)
+    # A pickled batch of results from the pool thread
+    _batch_ready = Signal(object)
+
+    BATCH_FILES = 32
+    # Trees with fewer files than this are searched in-process
+    POOL_MIN_FILES = 64
+
+    _pool = None
+
+    @classmethod
+    def pool(cls):
+        """Return the process pool shared by all searches, using all cores."""
+        if cls._pool is None:
+            # Spawned workers do not inherit the GUI's threads and locks
+            cls._pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn'))
+        return cls._pool
+
+    def __init__(self, folder_path, query, parent=None, index=None, search_filter=None):
+        super().__init__(parent)
+        self.folder_path = folder_path
+        self.query = SearchQuery.coerce(query)
+        # A TrigramIndex of folder_path narrows the search to candidate files
+        self.index = index
+        self.search_filter = search_filter or SearchFilter()
+        self.files_searched = 0
+        self.match_count = 0
+        self.errors = []  # (file_path, message)
+        self._cancelled = False
+        self._done = threading.Event()
+        self._batch_ready.connect(self._unpickle_batch)
+
+    def start(self):
+        """Search on a pool thread, emitting results_found as batches finish."""
+        QThreadPool.globalInstance().start(self._run)
+
+    def cancel(self):
+        """Stop handing out files; batches already running are dropped."""
+        self._cancelled = True
+
+    def is_finished(self):
+        return self._done.is_set()
+
+    def run(self):
+        """Search synchronously and return every result."""
+        results = []
+        for batch in self._search_batches():
+            results.extend(batch)
+        return results
+
+    def _run(self):
+        try:
+            for count, data, errors in self.map_batches(search_files_pickled, self.query,
+                                                        in_process=False):
+                self.match_count += count
+                if count and not self._cancelled:
+                    self._batch_ready.emit(data)
+                if errors:
+                    self.errors.extend(errors)
+                    self.errors_found.emit(errors)
+                self.progress.emit(self.files_searched)
+            self.finished.emit(self._cancelled)
+        finally:
+            self._done.set()
+
+    def _unpickle_batch(self, data):
+        if not self._cancelled:
+            self.results_found.emit(pickle.loads(data))
+
+    def files(self):
+        """Yield the paths of the files to search, as filtered or indexed."""
+        if self.index is not None and self.index.covers(self.search_filter):
+            for path in self.index.candidates(self.query, self.search_filter):
+                if self._cancelled:
+                    return
+                yield path
+            return
+        for path, st in self.search_filter.walk(self.folder_path, lambda: self._cancelled):
+            yield path
+
+    def _search_batches(self):
+        """Yield lists of results, one per searched batch of files."""
+        for results, errors in self.map_batches(search_files, self.query):
+            self.match_count += len(results)
+            self.errors.extend(errors)
+            yield results
+
+    def map_batches(self, func, *args, in_process=True):
+        """Yield func(batch, *args) for batches of files(), in order of completion.
+
+        Small trees run in-process unless in_process is False, larger ones on
+        the process pool. After a cancel, batches already running are still
+        waited for and yielded, so callers can clean up what they did.
+        """
+        paths = self.files()
+        head = []
+        for path in paths:
+            head.append(path)
+            if len(head) >= self.POOL_MIN_FILES:
+                break
+        if in_process and len(head) < self.POOL_MIN_FILES:
+            for start in range(0, len(head), self.BATCH_FILES):
+                if self._cancelled:
+                    return
+                batch = head[start:start + self.BATCH_FILES]
+                result = func(batch, *args)
+                self.files_searched += len(batch)
+                yield result
+            return
+        yield from self._map_in_pool(head, paths, func, args)
+
+    def _map_in_pool(self, head, paths, func, args):
+        pool = self.pool()
+        # Keep a couple of batches per worker queued so cancelling is quick
+        max_pending = 2 * (os.cpu_count() or 1)
+        pending = {}
+        batch = list(head)
+        paths_left = True
+        while paths_left or pending or batch:
+            while paths_left and len(pending) < max_pending and not self._cancelled:
+                for path in paths:
+                    batch.append(path)
+                    if len(batch) >= self.BATCH_FILES:
+                        break
+                else:
+                    paths_left = False
+                while len(batch) >= self.BATCH_FILES or (batch and not paths_left):
+                    chunk, batch = batch[:self.BATCH_FILES], batch[self.BATCH_FILES:]
+                    pending[pool.submit(func, chunk, *args)] = len(chunk)
+            if self._cancelled:
+                running = [future for future in pending if not future.cancel()]
+                for future in running:
+                    self.files_searched += pending[future]
+                    yield future.result()
+                return
+            if not pending:
+                continue
+            done, _ = wait_futures(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                self.files_searched += pending.pop(future)
+                yield future.result()
+
+
+def file_trigrams(data):
+    """Return the sorted trigrams of ASCII-lowercased bytes as array('I')."""
+    data = data.lower()
+    if len(data) < 3:
+        return array('I')
+    if np is not None:
+        b = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+        grams = np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+        return array('I', grams.astype(np.uint32).tobytes())
+    return array('I', sorted({a << 16 | b << 8 | c for a, b, c in zip(data, data[1:], data[2:])}))
+
+
+def index_files(root, rel_paths):
+    """Return (rel_path, mtime_ns, size, trigrams) for each readable file.
+
+    Binary files get trigrams of None and are never search candidates.
+    """
+    entries = []
+    for rel_path in rel_paths:
+        try:
+            with open(os.path.join(root, rel_path), 'rb') as f:
+                st = os.fstat(f.fileno())
+                data = f.read(SearchFilter.SNIFF_BYTES)
+                trigrams = None
+                if not SearchFilter.is_binary(data):
+                    trigrams = file_trigrams(data + f.read())
+            entries.append((rel_path, st.st_mtime_ns, st.st_size, trigrams))
+        except OSError:
+            pass
+    return entries
+
+
+class TrigramIndex:
+    """Persistent trigram index of the files under a folder.
+
+    Each file keeps the sorted trigrams of its lowercased bytes, so a search
+    only reads files that contain every trigram of the query. Entries are
+    checked against file mtimes and sizes by a refresh, which a query only
+    runs once REFRESH_SECONDS have passed or mark_stale() was called; moves
+    and deletes made in the file tree are applied without re-reading files.
+    Files passing a default SearchFilter are indexed, but those above its
+    size cap are only listed, and are candidates for every search whose own
+    filter takes them. A search's own globs and size cap are applied to the
+    candidates.
+    """
+
+    VERSION = 3
+    BATCH_FILES = 32
+    # Fewer changed files than this are indexed in-process
+    POOL_MIN_FILES = 64
+    # A query older than this after the last refresh checks the tree again
+    REFRESH_SECONDS = 30.0
+
+    def __init__(self, root, index_path=None):
+        self.root = root
+        self.index_path = index_path or self.default_index_path(root)
+        self.search_filter = SearchFilter()
+        # Relative path -> (mtime_ns, size, trigrams or None if binary)
+        self.files = {}
+        # Relative path -> (mtime_ns, size) of files too large to index
+        self.large_files = {}
+        # Files read by the last refresh
+        self.files_indexed = 0
+        # time.monotonic() of the last refresh, or None to refresh on next use
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._cancelled = False
+        self._done = threading.Event()
+
+    @staticmethod
+    def default_index_path(root):
+        folder = os.environ.get('TEXTEDIT_INDEX_DIR') or os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation), 'search-index')
+        name = hashlib.sha1(os.path.abspath(root).encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(folder, name + '.idx')
+
+    def start(self):
+        """Load and bring the index up to date on a pool thread."""
+        QThreadPool.globalInstance().start(self._build)
+
+    def cancel(self):
+        """Stop a background build after the current batch."""
+        self._cancelled = True
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _build(self):
+        try:
+            self.refresh()
+        finally:
+            self._done.set()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            return
+        if state.get('version') == self.VERSION and state.get('root') == os.path.abspath(self.root):
+            with self._lock:
+                self.files = state['files']
+                self.large_files = state['large_files']
+
+    def save(self):
+        """Write the index atomically next to its previous version."""
+        with self._lock:
+            state = {'version': self.VERSION, 'root': os.path.abspath(self.root),
+                     'files': dict(self.files), 'large_files': dict(self.large_files)}
+            self._dirty = False
+        folder = os.path.dirname(self.index_path)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            pass
+
+    def refresh(self):
+        """Re-index new and changed files and drop deleted ones."""
+        with self._refresh_lock:
+            if not self._loaded:
+                self.load()
+                self._loaded = True
+            started = time.monotonic()
+            max_size = self.search_filter.max_file_size
+            # Larger files are listed too, so searches that take them find them
+            listing = SearchFilter(use_gitignore=self.search_filter.use_gitignore,
+                                   max_file_size=sys.maxsize)
+            seen = {}
+            large = {}
+            for path, st in listing.walk(self.root, lambda: self._cancelled):
+                stamp = (st.st_mtime_ns, st.st_size)
+                (seen if st.st_size <= max_size else large)[os.path.relpath(path, self.root)] = stamp
+            if self._cancelled:
+                return
+            with self._lock:
+                for rel_path in [p for p in self.files if p not in seen]:
+                    del self.files[rel_path]
+                    self._dirty = True
+                if large != self.large_files:
+                    self.large_files = large
+                    self._dirty = True
+                changed = [rel_path for rel_path, stamp in seen.items()
+                           if self.files.get(rel_path, (None, None))[:2] != stamp]
+            self.files_indexed = 0
+            for entries in self._index_batches(changed):
+                if self._cancelled:
+                    break
+                with self._lock:
+                    for rel_path, mtime_ns, size, trigrams in entries:
+                        self.files[rel_path] = (mtime_ns, size, trigrams)
+                    self._dirty = True
+                self.files_indexed += len(entries)
+            if not self._cancelled:
+                self.refreshed_at = started
+            if self._dirty:
+                self.save()
+
+    def mark_stale(self):
+        """Have the next query check the tree again, e.g. after files were written."""
+        self.refreshed_at = None
+
+    def covers(self, search_filter):
+        """Whether every file search_filter takes is listed in the index."""
+        return search_filter.use_gitignore or not self.search_filter.use_gitignore
+
+    def _index_batches(self, rel_paths):
+        batches = [rel_paths[i:i + self.BATCH_FILES]
+                   for i in range(0, len(rel_paths), self.BATCH_FILES)]
+        if len(rel_paths) < self.POOL_MIN_FILES:
+            for batch in batches:
+                yield index_files(self.root, batch)
+            return
+        pool = SearchEngine.pool()
+        futures = [pool.submit(index_files, self.root, batch)
+                   for batch in batches]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def candidates(self, query, search_filter=None):
+        """Return the paths of files that may match query (a SearchQuery or text).
+
+        Files too large to index are returned whenever search_filter takes
+        them, to be scanned.
+        """
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.REFRESH_SECONDS:
+            self.refresh()
+        max_size = search_filter.max_file_size if search_filter is not None else SearchFilter.MAX_FILE_SIZE
+        # Only ASCII case folding matches the lowercased bytes that were
+        # indexed; a regex has no text every match must contain
+        grams = []
+        find_text = SearchQuery.coerce(query).literal_text()
+        if find_text is not None and find_text.isascii():
+            query = find_text.lower().encode('ascii')
+            grams = sorted({a << 16 | b << 8 | c for a, b, c in zip(query, query[1:], query[2:])})
+        paths = []
+        with self._lock:
+            for rel_path, (mtime_ns, size, trigrams) in self.files.items():
+                if trigrams is None or size > max_size:
+                    continue
+                if not all(self._contains(trigrams, g) for g in grams):
+                    continue
+                if search_filter is None or search_filter.accepts(rel_path):
+                    paths.append(os.path.join(self.root, rel_path))
+            for rel_path, (mtime_ns, size) in self.large_files.items():
+                if size <= max_size and (search_filter is None or search_filter.accepts(rel_path)):
+                    paths.append(os.path.join(self.root, rel_path))
+        return paths
+
+    @staticmethod
+    def _contains(trigrams, gram):
+        i = bisect.bisect_left(trigrams, gram)
+        return i < len(trigrams) and trigrams[i] == gram
+
+    def _relative(self, path):
+        rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        if rel_path == os.curdir or rel_path.startswith(os.pardir):
+            return None
+        return rel_path
+
+    def file_moved(self, old_path, new_path):
+        """Carry the entries of a moved file or folder over to its new path."""
+        old_rel = self._relative(old_path)
+        if old_rel is None:
+            return
+        new_rel = self._relative(new_path) if new_path is not None else None
+        with self._lock:
+            for entries in (self.files, self.large_files):
+                for rel_path in list(entries):
+                    if rel_path == old_rel or rel_path.startswith(old_rel + os.sep):
+                        entry = entries.pop(rel_path)
+                        if new_rel is not None:
+                            entries[new_rel + rel_path[len(old_rel):]] = entry
+                        self._dirty = True
+
+    def file_deleted(self, path):
+        """Drop the entries of a deleted file or folder."""
+        self.file_moved(path, None)
+
+
+def prepare_replacements(file_paths, query, replace_text):
+    """Write the replaced text of each matching file to a temp file beside it.
+
+    Returns (file_path, count, temp_path, error) for each file that matched
+    or failed; the files themselves are not changed.
+    """
+    query = SearchQuery.coerce(query)
+    quick = query.bytes_pattern()
+    pattern = query.pattern()
+    replace = query.line_replacer(replace_text)
+    prepared = []
+    for file_path in file_paths:
+        temp_path = None
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            if SearchFilter.is_binary(data[:SearchFilter.SNIFF_BYTES]):
+                continue
+            if quick is not None:
+                if quick.search(data) is None:
+                    continue
+            elif pattern.search(data.decode('utf-8', errors='ignore')) is None:
+                # Decoded as search_file does, so a file that search skips
+                # cannot fail the replace; only matching files must be UTF-8
+                continue
+            new_text, count, keep = replace(data.decode('utf-8'))
+            if not count:
+                continue
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(file_path) or None,
+                prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(new_text.encode('utf-8'))
+            shutil.copymode(file_path, temp_path)
+            prepared.append((file_path, count, temp_path, None))
+        except (OSError, UnicodeDecodeError) as e:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            prepared.append((file_path, 0, None, str(e)))
+    return prepared
+
+
+class ReplaceTransaction(QObject):
+    """Replaces text in the files under a folder, all or nothing.
+
+    Matching files are rewritten into temp files beside them, in batches on
+    the search process pool. Only when every file has been prepared are the
+    originals backed up and the temp files renamed over them; a failure or a
+    cancel part way puts back the files already replaced. rollback() undoes
+    a committed batch until discard() drops the backups; a file changed
+    again since the replace is left as it is and reported in errors.
+    """
+
+    # Files scanned so far
+    progress = Signal(int)
+    # True if the replacement was committed
+    finished = Signal(bool)
+
+    def __init__(self, folder_path, query, replace_text, parent=None, index=None,
+                 search_filter=None):
+        super().__init__(parent)
+        self.query = SearchQuery.coerce(query)
+        self.replace_text = replace_text
+        self.engine = SearchEngine(folder_path, self.query, index=index, search_filter=search_filter)
+        self.replaced_count = 0
+        self.files = []  # Files replaced, in commit order
+        self.errors = []  # (file_path, message)
+        self.committed = False
+        self.cancelled = False
+        self._backups = {}  # File path -> backup copy
+        # File path -> (mtime_ns, size) of the file as replaced
+        self._stamps = {}
+        self._backup_dir = None
+        self._done = threading.Event()
+
+    def start(self):
+        """Run on a pool thread, emitting finished when done."""
+        QThreadPool.globalInstance().start(self._run)
+
+    def cancel(self):
+        self.cancelled = True
+        self.engine.cancel()
+
+    def is_finished(self):
+        return self._done.is_set()
+
+    def _run(self):
+        try:
+            self.finished.emit(self.run())
+        finally:
+            self._done.set()
+
+    def run(self):
+        """Prepare every file, then commit them all; return whether it committed."""
+        prepared = []
+        try:
+            for batch in self.engine.map_batches(prepare_replacements, self.query, self.replace_text):
+                prepared.extend(batch)
+                self.progress.emit(self.engine.files_searched)
+            self.errors = [(file_path, error) for file_path, count, temp_path, error in prepared if error]
+            if self.errors or self.cancelled:
+                return False
+            self._commit([entry for entry in prepared if entry[2]])
+            return self.committed
+        finally:
+            for file_path, count, temp_path, error in prepared:
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _commit(self, prepared):
+        if not prepared:
+            return
+        self._backup_dir = tempfile.mkdtemp(prefix='textedit-replace-')
+        file_path = None
+        try:
+            for file_path, count, temp_path, error in prepared:
+                if self.cancelled:
+                    self._restore()
+                    return
+                backup_path = os.path.join(self._backup_dir, str(len(self._backups)))
+                shutil.copy2(file_path, backup_path)
+                self._backups[file_path] = backup_path
+                # Atomic on the same filesystem: readers see the old or the new file
+                os.replace(temp_path, file_path)
+                st = os.stat(file_path)
+                self._stamps[file_path] = (st.st_mtime_ns, st.st_size)
+                self.files.append(file_path)
+                self.replaced_count += count
+        except OSError as e:
+            self.errors.append((file_path, str(e)))
+            self._restore()
+            return
+        self.committed = True
+
+    def _restore(self):
+        """Put back the backed-up originals not changed since; return their paths."""
+        restored = []
+        for file_path in self.files:
+            backup_path = self._backups[file_path]
+            try:
+                st = os.stat(file_path)
+                if (st.st_mtime_ns, st.st_size) != self._stamps.get(file_path):
+                    self.errors.append((file_path, "changed since the replace; not restored"))
+                    continue
+                fd, temp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(file_path) or None,
+                    prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp')
+                os.close(fd)
+                shutil.copy2(backup_path, temp_path)
+                os.replace(temp_path, file_path)
+                restored.append(file_path)
+            except OSError as e:
+                self.errors.append((file_path, str(e)))
+        self.files = []
+        self.replaced_count = 0
+        self.committed = False
+        return restored
 
+    def rollback(self):
+        """Restore the files of a committed batch; return the paths restored."""
+        restored = self._restore()
+        self.discard()
+        return restored
 
-class SearchResultButton(QWidget):
-    """Button-like widget for each search result that opens the file on click."""
-    
-    def __init__(self, file_path, line_num, line_text, match_start, match_text, text_editor, parent=None):
+    def discard(self):
+        """Drop the backups; the batch can no longer be rolled back."""
+        self._backups = {}
+        if self._backup_dir is not None:
+            shutil.rmtree(self._backup_dir, ignore_errors=True)
+            self._backup_dir = None
+
+
+class SearchResultsModel(QAbstractListModel):
+    """List model over multi-file search results that grows as batches arrive."""
+
+    # The (file_path, line_num, line_text, match_start, match_text) tuple
+    ResultRole = Qt.UserRole
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.file_path = file_path
-        self.line_num = line_num
-        self.text_editor = text_editor
-        self.match_text = match_text
-        self.match_start = match_start
-        self.setCursor(Qt.PointingHandCursor)
-        
-        # Create the button content with highlighting
-        file_name = os.path.basename(file_path)
-        
-        # Create full line with highlighted match
-        before = line_text[:match_start]
-        match = line_text[match_start:match_start + len(match_text)]
-        after = line_text[match_start + len(match_text):]
-        
-        # Create HTML text with file info and highlighted line
-        html_text = f"<b>{file_name}:{line_num}</b><br>"
-        html_text += f"<font color='#888888'>{before}</font>"
-        html_text += f"<font style='background-color: #ffff00; color: #000000;'><b>{match}</b></font>"
-        html_text += f"<font color='#888888'>{after}</font>"
-        
-        # Use a QLabel to display HTML
-        self.label = QLabel(html_text)
-        self.label.setWordWrap(True)
-        self.label.setCursor(Qt.PointingHandCursor)
-        
-        # Style the label like a button
-        self.label.setStyleSheet("""
-            QLabel {
-                background-color: #2d2d30;
-                color: #d4d4d4;
-                border: 1px solid #3e3e42;
-                padding: 8px;
-                margin: 2px;
-                font-family: Consolas;
-                font-size: 9pt;
-            }
-        """)
-        
-        # Layout
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(self.label)
-        
-        # Track hover state for button-like appearance
-        self.is_hovered = False
-    
-    def mousePressEvent(self, event):
-        """Open file when clicked."""
-        self.open_file()
-    
-    def enterEvent(self, event):
-        """Change appearance on hover."""
-        self.label.setStyleSheet("""
-            QLabel {
-                background-color: #3e3e42;
-                color: #d4d4d4;
-                border: 1px solid #007acc;
-                padding: 8px;
-                margin: 2px;
-                font-family: Consolas;
-                font-size: 9pt;
-            }
-        """)
-        super().enterEvent(event)
-    
-    def leaveEvent(self, event):
-        """Restore appearance when mouse leaves."""
-        self.label.setStyleSheet("""
-            QLabel {
-                background-color: #2d2d30;
-                color: #d4d4d4;
-                border: 1px solid #3e3e42;
-                padding: 8px;
-                margin: 2px;
-                font-family: Consolas;
-                font-size: 9pt;
-            }
-        """)
-        super().leaveEvent(event)
-    
-    def open_file(self):
-        """Open the file in the text editor."""
-        self.text_editor.open_file_with_line(self.file_path, self.line_num, self.match_text, self.match_start)
-        
-        # Close the parent dialogs (MultiFileSearchResultsDialog and MultiFileSearchDialog)
-        parent = self.parent()
-        results_dialog = None
-        search_dialog = None
-        
-        # Find both dialogs in the parent hierarchy
-        while parent:
-            if isinstance(parent, MultiFileSearchResultsDialog) and not results_dialog:
-                results_dialog = parent
-            elif isinstance(parent, MultiFileSearchDialog) and not search_dialog:
-                search_dialog = parent
-            parent = parent.parent()
-        
-        # Close results dialog first
-        if results_dialog:
-            results_dialog.close()
-        
-        # Close search dialog
-        if search_dialog:
-            search_dialog.close()
+        self.results = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.results):
+            return None
+        result = self.results[index.row()]
+        if role == self.ResultRole:
+            return result
+        if role == Qt.DisplayRole:
+            file_path, line_num, line_text = result[:3]
+            return f"{os.path.basename(file_path)}:{line_num}  {line_text.strip()}"
+        if role == Qt.ToolTipRole:
+            return result[0]
+        return None
+
+    def append_results(self, results):
+        if not results:
+            return
+        first = len(self.results)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        self.results.extend(results)
+        self.endInsertRows()
+
+
+class SearchResultDelegate(QStyledItemDelegate):
+    """Paints a search result as its file:line over the line with the match highlighted."""
+
+    PADDING = 8
+    # Characters kept before a match that would otherwise be scrolled off
+    CONTEXT_CHARS = 40
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont("Consolas", 9)
+        self.bold_font = QFont(self.font)
+        self.bold_font.setBold(True)
+
+    def sizeHint(self, option, index):
+        height = QFontMetrics(self.bold_font).height() + QFontMetrics(self.font).height()
+        return QSize(option.rect.width(), height + 2 * self.PADDING + 4)
+
+    def paint(self, painter, option, index):
+        file_path, line_num, line_text, match_start, match_text = index.data(SearchResultsModel.ResultRole)
+        painter.save()
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        hovered = option.state & QStyle.State_MouseOver
+        painter.setPen(QColor("#007acc") if hovered else QColor("#3e3e42"))
+        painter.setBrush(QColor("#3e3e42") if hovered else QColor("#2d2d30"))
+        painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        
+        x = rect.left() + self.PADDING
+        y = rect.top() + self.PADDING
+        bold_metrics = QFontMetrics(self.bold_font)
+        painter.setFont(self.bold_font)
+        painter.setPen(QColor("#d4d4d4"))
+        painter.drawText(x, y + bold_metrics.ascent(), f"{os.path.basename(file_path)}:{line_num}")
+        
+        # Show the line from its first non-blank character, or from a little
+        # before the match on long lines
+        line = line_text.rstrip("\r\n")
+        match_end = match_start + len(match_text)
+        start = min(len(line) - len(line.lstrip()), match_start)
+        start = max(start, match_start - self.CONTEXT_CHARS)
+        prefix = "…" if start > len(line) - len(line.lstrip()) else ""
+        segments = [(prefix + line[start:match_start], QColor("#888888"), None),
+                    (line[match_start:match_end], QColor("#000000"), QColor("#ffff00")),
+                    (line[match_end:], QColor("#888888"), None)]
+        metrics = QFontMetrics(self.font)
+        painter.setFont(self.font)
+        y += bold_metrics.height()
+        right = rect.right() - self.PADDING
+        for text, color, background in segments:
+            if x >= right:
+                break
+            text = metrics.elidedText(text.replace("\t", "    "), Qt.ElideRight, right - x)
+            width = metrics.horizontalAdvance(text)
+            if background is not None:
+                painter.fillRect(QRect(x, y, width, metrics.height()), background)
+            painter.setPen(color)
+            painter.drawText(x, y + metrics.ascent(), text)
+            x += width
+        painter.restore()
 
 
 class MultiFileSearchResultsDialog(QDialog):
@@ -1572,46 +4608,76 @@ class MultiFileSearchResultsDialog(QDialog):
     
     def __init__(self, results, text_editor, parent=None):
         super().__init__(parent)
-        self.results = results  # List of (file_path, line_num, line_text, match_pos, match_text)
+        self.model = SearchResultsModel(self)
+        self.results = self.model.results  # List of (file_path, line_num, line_text, match_pos, match_text)
         self.text_editor = text_editor
-        self.setWindowTitle(f"Search Results - {len(results)} matches")
+        self.searching = False
+        self.errors = []  # (file_path, message) of files that could not be read
         self.setGeometry(100, 100, 800, 600)
         self.setup_ui()
+        self.add_results(results)
     
     def setup_ui(self):
         layout = QVBoxLayout(self)
         
-        # Scrollable area for results
-        scroll_area = QWidget()
-        scroll_layout = QVBoxLayout(scroll_area)
-        scroll_layout.setContentsMargins(5, 5, 5, 5)
-        scroll_layout.setSpacing(2)
-        
-        # Create a button for each result with highlighting
-        for file_path, line_num, line_text, match_pos, match_text in self.results:
-            # File info button with full line and highlighting inside
-            btn = SearchResultButton(file_path, line_num, line_text, match_pos, match_text, self.text_editor)
-            scroll_layout.addWidget(btn)
-        
-        scroll_layout.addStretch()
-        
-        # Scroll area
-        scroll_widget = QScrollArea()
-        scroll_widget.setWidget(scroll_area)
-        scroll_widget.setWidgetResizable(True)
-        scroll_widget.setStyleSheet("""
-            QScrollArea {
+        # Only the rows in view are painted, so large result sets stay cheap
+        self.results_view = QListView()
+        self.results_view.setModel(self.model)
+        self.results_view.setItemDelegate(SearchResultDelegate(self.results_view))
+        self.results_view.setUniformItemSizes(True)
+        self.results_view.setMouseTracking(True)
+        self.results_view.setCursor(Qt.PointingHandCursor)
+        self.results_view.setStyleSheet("""
+            QListView {
                 background-color: #1e1e1e;
                 border: none;
             }
         """)
-        layout.addWidget(scroll_widget)
+        self.results_view.clicked.connect(self.open_result)
+        layout.addWidget(self.results_view)
         
         # Close button
         close_btn = QPushButton("Close")
         close_btn.clicked.connect(self.close)
         close_btn.setMaximumWidth(100)
         layout.addWidget(close_btn)
+    
+    def add_results(self, results):
+        """Append a batch of results, e.g. as a running search streams them in."""
+        self.model.append_results(results)
+        self.update_title()
+    
+    def add_errors(self, errors):
+        """Note files the search could not read."""
+        self.errors.extend(errors)
+        self.setToolTip("Could not read:\n" + "\n".join(
+            f"{path}: {error}" for path, error in self.errors[:10]))
+        self.update_title()
+    
+    def open_result(self, index):
+        """Open the clicked result and close the search dialogs."""
+        file_path, line_num, line_text, match_start, match_text = index.data(SearchResultsModel.ResultRole)
+        self.text_editor.open_file_with_line(file_path, line_num, match_text, match_start)
+        search_dialog = self.parent()
+        self.close()
+        if isinstance(search_dialog, MultiFileSearchDialog):
+            search_dialog.close()
+    
+    def search_started(self):
+        self.searching = True
+        self.update_title()
+    
+    def search_finished(self, cancelled=False):
+        self.searching = False
+        self.update_title()
+    
+    def update_title(self):
+        title = f"Search Results - {len(self.results)} matches"
+        if self.errors:
+            title += f", {len(self.errors)} files could not be read"
+        if self.searching:
+            title += " (searching...)"
+        self.setWindowTitle(title)
 
 
 class MultiFileSearchDialog(QDialog):
@@ -1622,8 +4688,9 @@ class MultiFileSearchDialog(QDialog):
         self.folder_path = folder_path
         self.text_editor = text_editor_instance
         self.parent_editor = parent
+        self.last_replace = None  # ReplaceTransaction that Undo Replace All rolls back
         self.setWindowTitle("Multi-File Find and Replace")
-        self.setGeometry(100, 100, 500, 250)
+        self.setGeometry(100, 100, 500, 340)
         self.setup_ui()
     
     def keyPressEvent(self, event):
@@ -1652,6 +4719,32 @@ class MultiFileSearchDialog(QDialog):
         replace_layout.addWidget(self.replace_input)
         layout.addLayout(replace_layout)
         
+        # Search modes
+        options_layout = QHBoxLayout()
+        self.regex_check = QCheckBox("Regex")
+        options_layout.addWidget(self.regex_check)
+        self.whole_word_check = QCheckBox("Whole word")
+        options_layout.addWidget(self.whole_word_check)
+        self.case_check = QCheckBox("Match case")
+        options_layout.addWidget(self.case_check)
+        options_layout.addStretch()
+        layout.addLayout(options_layout)
+        
+        # File filter rows (comma-separated globs)
+        include_layout = QHBoxLayout()
+        include_layout.addWidget(QLabel("Include:"))
+        self.include_input = QLineEdit()
+        self.include_input.setPlaceholderText("e.g. *.py, src/*")
+        include_layout.addWidget(self.include_input)
+        layout.addLayout(include_layout)
+        
+        exclude_layout = QHBoxLayout()
+        exclude_layout.addWidget(QLabel("Exclude:"))
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setPlaceholderText("e.g. build, *.min.js")
+        exclude_layout.addWidget(self.exclude_input)
+        layout.addLayout(exclude_layout)
+        
         # Folder info
         folder_layout = QHBoxLayout()
         folder_layout.addWidget(QLabel("Searching in:"))
@@ -1671,100 +4764,211 @@ class MultiFileSearchDialog(QDialog):
         replace_all_btn.clicked.connect(self.replace_all_files)
         button_layout.addWidget(replace_all_btn)
         
+        self.undo_replace_btn = QPushButton("Undo Replace All")
+        self.undo_replace_btn.setEnabled(False)
+        self.undo_replace_btn.clicked.connect(self.undo_replace_all)
+        button_layout.addWidget(self.undo_replace_btn)
+        
         close_btn = QPushButton("Close")
         close_btn.clicked.connect(self.close)
         button_layout.addWidget(close_btn)
         
         layout.addLayout(button_layout)
     
+    def search_index(self):
+        """Return the editor's trigram index if it covers this folder."""
+        index = getattr(self.text_editor, 'search_index', None)
+        if isinstance(index, TrigramIndex) and \
+                os.path.abspath(index.root) == os.path.abspath(self.folder_path):
+            return index
+        return None
+    
+    def mark_index_stale(self):
+        """Have the trigram index check the files a replace rewrote."""
+        index = self.search_index()
+        if index is not None:
+            index.mark_stale()
+    
+    def search_filter(self):
+        """Build the file filter from the include and exclude fields."""
+        return SearchFilter(SearchFilter.parse_globs(self.include_input.text()),
+                            SearchFilter.parse_globs(self.exclude_input.text()))
+    
+    def search_query(self):
+        """Return the find text and modes as a SearchQuery.
+
+        Warns and returns None if the text is empty or not a valid regex.
+        """
+        query = SearchQuery(self.find_input.text(),
+                            regex=self.regex_check.isChecked(),
+                            whole_word=self.whole_word_check.isChecked(),
+                            case_sensitive=self.case_check.isChecked())
+        if not query.text:
+            QMessageBox.warning(self, "Input Error", "Please enter text to find.")
+            return None
+        try:
+            query.pattern()
+        except re.error as e:
+            QMessageBox.warning(self, "Invalid Pattern", f"Invalid regular expression: {e}")
+            return None
+        return query
+    
     def find_all_files(self):
         """Search for text in all files in the folder."""
-        find_text = self.find_input.text()
-        if not find_text:
-            QMessageBox.warning(self, "Input Error", "Please enter text to find.")
+        query = self.search_query()
+        if query is None:
             return []
         
-        results = []
-        import re
-        
-        for root, dirs, files in os.walk(self.folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for line_num, line in enumerate(f, 1):
-                            if find_text.lower() in line.lower():
-                                # Find all match positions
-                                matches = list(re.finditer(re.escape(find_text), line, re.IGNORECASE))
-                                for match in matches:
-                                    results.append((file_path, line_num, line, match.start(), match.group()))
-                except Exception:
-                    pass
-        
-        return results
+        return SearchEngine(self.folder_path, query, index=self.search_index(),
+                            search_filter=self.search_filter()).run()
     
     def find_all(self):
-        """Show all search results."""
-        results = self.find_all_files()
-        if results:
-            dialog = MultiFileSearchResultsDialog(results, self.text_editor, self)
-            dialog.exec()
-        else:
+        """Show search results as they stream in from the search engine."""
+        query = self.search_query()
+        if query is None:
+            return
+        
+        search = SearchEngine(self.folder_path, query, self, self.search_index(),
+                              self.search_filter())
+        dialog = MultiFileSearchResultsDialog([], self.text_editor, self)
+        search.results_found.connect(dialog.add_results)
+        search.errors_found.connect(dialog.add_errors)
+        search.finished.connect(dialog.search_finished)
+        # Run the event loop until the first matches arrive or the search
+        # ends, so an empty search still reports "No Results"
+        loop = QEventLoop()
+        search.results_found.connect(loop.quit)
+        search.finished.connect(loop.quit)
+        dialog.search_started()
+        search.start()
+        loop.exec()
+        search.results_found.disconnect(loop.quit)
+        
+        if not dialog.results and not dialog.searching:
             QMessageBox.information(self, "No Results", "No matches found.")
+            return
+        dialog.exec()
+        # Closing the results stops a search that is still running
+        search.cancel()
     
     def replace_all_files(self):
-        """Replace all occurrences in all files."""
-        find_text = self.find_input.text()
+        """Replace all occurrences in all files, as one transaction."""
         replace_text = self.replace_input.text()
-        
-        if not find_text:
-            QMessageBox.warning(self, "Input Error", "Please enter text to find.")
+        query = self.search_query()
+        if query is None:
+            return
+        try:
+            query.check_replacement(replace_text)
+        except re.error as e:
+            QMessageBox.warning(self, "Invalid Pattern", f"Invalid replacement: {e}")
             return
         
-        results = self.find_all_files()
-        if not results:
+        # A new batch replaces the one Undo Replace All would restore
+        self.discard_last_replace()
+        transaction = ReplaceTransaction(self.folder_path, query, replace_text, None,
+                                         self.search_index(), self.search_filter())
+        progress = QProgressDialog("Replacing...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("Replace All")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(transaction.cancel)
+        transaction.progress.connect(self.show_replace_progress)
+        self._replace_progress = progress
+        # Keep the GUI responsive while the files are rewritten off-thread
+        loop = QEventLoop()
+        transaction.finished.connect(loop.quit)
+        transaction.start()
+        loop.exec()
+        self._replace_progress = None
+        # Closing a progress dialog emits canceled
+        progress.canceled.disconnect(transaction.cancel)
+        progress.close()
+        
+        if transaction.errors:
+            details = "\n".join(f"{path}: {error}" for path, error in transaction.errors[:10])
+            QMessageBox.warning(self, "Error", f"No files were changed. Could not process:\n{details}")
+            return
+        if transaction.cancelled and not transaction.committed:
+            QMessageBox.information(self, "Replace Cancelled", "No files were changed.")
+            return
+        if not transaction.committed:
             QMessageBox.information(self, "No Results", "No matches found.")
             return
         
-        # Group results by file - only need file paths, not individual matches
-        files_to_replace = set()
-        for file_path, line_num, line, match_pos, match_text in results:
-            files_to_replace.add(file_path)
-        
-        # Replace in each file
-        import re
-        replaced_count = 0
-        pattern = re.escape(find_text)
-        
-        for file_path in files_to_replace:
+        self.last_replace = transaction
+        self.undo_replace_btn.setEnabled(True)
+        self.mark_index_stale()
+        skipped = self.reload_open_files(transaction.files)
+        QMessageBox.information(self, "Replace Complete", f"Replaced {transaction.replaced_count} occurrences in {len(transaction.files)} files." + self.skipped_tabs_note(skipped))
+    
+    def show_replace_progress(self, files_scanned):
+        if self._replace_progress is not None:
+            self._replace_progress.setLabelText(f"Replacing... {files_scanned} files scanned")
+    
+    def undo_replace_all(self):
+        """Put back every file changed by the last Replace All."""
+        if self.last_replace is None:
+            return
+        transaction = self.last_replace
+        self.last_replace = None
+        self.undo_replace_btn.setEnabled(False)
+        restored = transaction.rollback()
+        self.mark_index_stale()
+        note = self.skipped_tabs_note(self.reload_open_files(restored))
+        if transaction.errors:
+            details = "\n".join(f"{path}: {error}" for path, error in transaction.errors[:10])
+            QMessageBox.warning(self, "Error", f"Could not restore:\n{details}" + note)
+        else:
+            QMessageBox.information(self, "Undo Replace All", f"Restored {len(restored)} files." + note)
+    
+    def discard_last_replace(self):
+        if self.last_replace is not None:
+            self.last_replace.discard()
+            self.last_replace = None
+            self.undo_replace_btn.setEnabled(False)
+    
+    def done(self, result):
+        # Once the dialog is closed the batch can no longer be undone
+        self.discard_last_replace()
+        super().done(result)
+    
+    def reload_open_files(self, file_paths):
+        """Show the new contents of replaced files in any tabs they are open in.
+
+        Tabs with unsaved changes are left alone, so no edits are lost;
+        returns their file paths.
+        """
+        open_files = getattr(self.text_editor, 'open_files', None) or {}
+        skipped = []
+        for file_path in file_paths:
+            if file_path not in open_files:
+                continue
+            pane, tab_index = open_files[file_path]
+            editor = pane.tab_widget.widget(tab_index)
+            if not editor:
+                continue
+            if editor.document().isModified():
+                skipped.append(file_path)
+                continue
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
+                with open(file_path, 'r', encoding='utf-8', newline='') as f:
                     content = f.read()
-                
-                # Count matches before replacement (do it once)
-                match_count = len(re.findall(pattern, content, flags=re.IGNORECASE))
-                
-                # Replace all occurrences
-                new_content = re.sub(pattern, replace_text, content, flags=re.IGNORECASE)
-                
-                if new_content != content:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    
-                    replaced_count += match_count
-                    
-                    # Update any open tabs with this file
-                    if file_path in self.text_editor.open_files:
-                        pane, tab_index = self.text_editor.open_files[file_path]
-                        editor = pane.tab_widget.widget(tab_index)
-                        if editor:
-                            editor.setPlainText(new_content)
-                            editor.document().setModified(True)
-            except Exception as e:
-                QMessageBox.warning(self, "Error", f"Could not process {file_path}: {e}")
-        
-        QMessageBox.information(self, "Replace Complete", f"Replaced {replaced_count} occurrences in {len(files_to_replace)} files.")
+            except OSError as e:
+                QMessageBox.warning(self, "Error", f"Could not reload {file_path}: {e}")
+                continue
+            editor.setPlainText(content)
+            # The tab now shows what is on disk
+            editor.document().setModified(False)
+            editor.dirty_tracker.mark_saved(content)
+        return skipped
 
+    @staticmethod
+    def skipped_tabs_note(skipped):
+        """Message text listing tabs not reloaded for their unsaved changes."""
+        if not skipped:
+            return ""
+        names = "\n".join(skipped[:10])
+        return f"\n\nNot reloaded, as they have unsaved changes:\n{names}"
 
 
 class DragDropFileTree(QTreeView):
@@ -1879,13 +5083,26 @@ class TextEditor(QMainWindow):
     """Main text editor window."""
     
     MAX_SPLIT_PANES = 3
+    # Files above this size are edited through a piece table and virtual viewport
+    VIRTUAL_VIEW_THRESHOLD = 256 * 1024 * 1024
+    # Most of a frame's scheduler budget that inserting loaded text may use;
+    # chunks grow or shrink to fit it
+    LOAD_FRAME_BUDGET_MS = 12.0
+    # First chunk is big enough that small files load in a single frame
+    LOAD_INITIAL_CHUNK = 128 * 1024
+    LOAD_MIN_CHUNK = 8 * 1024
+    LOAD_MAX_CHUNK = 4 * 1024 * 1024
+    # A go-to target further than this past the loaded text is loaded first,
+    # starting a little before it, and the skipped lines fill in behind
+    LOAD_REGION_BYTES = 512 * 1024
+    LOAD_REGION_BEFORE = 16 * 1024
     
     def __init__(self):
          super().__init__()
          self.current_file = None
          self.open_files = {}  # Maps file path to (pane, tab_index)
          self.file_modified_state = {}  # Tracks if each file is modified
-         self.saved_content = {}  # Maps (pane, tab_index) to saved content for comparison
+         self.search_index = None  # TrigramIndex of the opened folder
          self.zoom_indicator_timer = QTimer()
          self.zoom_indicator_timer.timeout.connect(self.hide_zoom_indicator)
          self.split_panes = []  # List of SplitEditorPane objects
@@ -2081,6 +5298,11 @@ class TextEditor(QMainWindow):
         find_action.triggered.connect(self.show_find_dialog)
         edit_menu.addAction(find_action)
         
+        goto_line_action = QAction("&Go to Line...", self)
+        goto_line_action.setShortcut("Ctrl+G")
+        goto_line_action.triggered.connect(self.show_go_to_line_dialog)
+        edit_menu.addAction(goto_line_action)
+        
         multifile_find_action = QAction("Multi-File Find and Replace...", self)
         multifile_find_action.setShortcut("Ctrl+Shift+F")
         multifile_find_action.triggered.connect(self.show_multifile_find_dialog)
@@ -2367,11 +5589,28 @@ class TextEditor(QMainWindow):
                 file_path = fp
                 break
         
+        # A file still streaming in is only partly in the document; stop its
+        # load and load it again in the new tab from the same bytes
+        pending_load = getattr(source_editor, '_pending_file_load', None)
+        if pending_load is not None:
+            source_editor._pending_file_load = None
+        elif hasattr(source_editor, '_load_content'):
+            content = source_editor._load_content
+            pending_load = (file_path, content, len(content))
+            self._cancel_text_load(source_editor)
+        
         # Move the tab to the destination pane
         # Get tab info
         tab_text = source_pane.tab_widget.tabText(tab_index)
-        tab_content = source_editor.toPlainText()
-        is_modified = source_editor.document().isModified()
+        source_editor.commit_window()
+        tab_buffer = source_editor.buffer
+        tab_mapping = source_editor.mapped_file
+        # The buffer and mapping move with the tab
+        source_editor.buffer = None
+        source_editor.mapped_file = None
+        loaded = tab_buffer is None and pending_load is None
+        tab_content = source_editor.toPlainText() if loaded else None
+        is_modified = pending_load is None and source_editor.document().isModified()
         
         # Remove from source pane
         source_pane.tab_widget.removeTab(tab_index)
@@ -2398,16 +5637,23 @@ class TextEditor(QMainWindow):
         new_editor, _ = self.create_new_tab(file_path)
         
         # Block signals while setting content to prevent spurious modification marking
-        new_editor.blockSignals(True)
-        new_editor.setPlainText(tab_content)
-        new_editor.blockSignals(False)
+        new_editor.mapped_file = tab_mapping
+        if pending_load is not None:
+            new_editor._pending_file_load = pending_load
+            self._deferred_load_text(new_editor, file_path)
+        elif tab_buffer is not None:
+            new_editor.load_buffer(tab_buffer)
+        else:
+            new_editor.blockSignals(True)
+            new_editor.setPlainText(tab_content)
+            new_editor.blockSignals(False)
         
         # Update tracking
         current_index = dest_pane.tab_widget.currentIndex()
         if file_path:
             self.open_files[file_path] = (dest_pane, current_index)
         
-        # If file was NOT modified, store content so it stays unmodified
+        # If file was NOT modified, record its saved state so it stays unmodified
         # If it WAS modified, mark it and update tab title
         if is_modified:
             new_editor.document().setModified(True)
@@ -2415,11 +5661,10 @@ class TextEditor(QMainWindow):
             base_name = os.path.basename(file_path) if file_path else "Untitled"
             dest_pane.tab_widget.setTabText(current_index, base_name + " *")
             dest_pane.update_file_label(base_name + " *")
-        else:
+        elif pending_load is None:
             new_editor.document().setModified(False)
-            # Store the saved content so on_text_changed knows this is unmodified
-            key = (dest_pane, current_index)
-            self.saved_content[key] = tab_content
+            # Fingerprint the saved state so on_text_changed knows this is unmodified
+            new_editor.dirty_tracker.mark_saved(tab_content)
     
     def close_split_pane(self, pane):
         """Close a split pane."""
@@ -2575,10 +5820,8 @@ class TextEditor(QMainWindow):
             self.open_files[file_path] = (self.active_pane, index)
             self.file_modified_state[file_path] = False
         
-        # Store original content for untitled documents so we can track if it's modified
-        # For untitled docs, the original content is empty string
-        key = (self.active_pane, index)
-        self.saved_content[key] = ""
+        # Untitled documents start out saved as the empty string
+        editor.dirty_tracker.mark_saved("")
         
         self.tab_widget.setCurrentIndex(index)
         self.current_file = file_path
@@ -2658,9 +5901,9 @@ class TextEditor(QMainWindow):
         if file_path:
             # Tab has an associated file, save to it
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(editor.toPlainText())
+                content = self._write_editor_to_file(editor, file_path)
                 editor.document().setModified(False)
+                editor.dirty_tracker.mark_saved(content)
                 return True
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not save file:\n{e}")
@@ -2673,9 +5916,9 @@ class TextEditor(QMainWindow):
             )
             if file_path:
                 try:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(editor.toPlainText())
+                    content = self._write_editor_to_file(editor, file_path)
                     editor.document().setModified(False)
+                    editor.dirty_tracker.mark_saved(content)
                     # Track the new file
                     self.open_files[file_path] = (self.active_pane, index)
                     self.tab_widget.setTabText(index, os.path.basename(file_path))
@@ -2685,8 +5928,67 @@ class TextEditor(QMainWindow):
                     return False
             return False
     
+    def _write_editor_to_file(self, editor, file_path):
+        """Write an editor's text to disk, streaming piece-table buffers."""
+        if self.search_index is not None:
+            self.search_index.mark_stale()
+        if editor.buffer is not None:
+            editor.save_buffer(file_path)
+            return None
+        content = editor.toPlainText()
+        mapped_file = editor.mapped_file
+        if mapped_file is not None and os.path.abspath(mapped_file.file_path) == os.path.abspath(file_path):
+            # Truncating a mapped file would fault any later read of the mapping,
+            # so write beside it and rename over it, then drop the stale mapping
+            directory = os.path.dirname(os.path.abspath(file_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.textedit-')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                # mkstemp creates the file private; keep the original's mode
+                shutil.copymode(file_path, tmp_path)
+                os.replace(tmp_path, file_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if not hasattr(editor, '_load_content'):
+                editor.release_mapping()
+            return content
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return content
+    
+    def _release_editor_resources(self, editor):
+        """Stop any chunked load and background highlighting, and release the
+        editor's mapping and buffer."""
+        editor.highlight_timer.stop()
+        editor.cancel_tokenize_job()
+        self._cancel_text_load(editor)
+        editor.release_buffer()
+        editor.release_mapping()
+    
+    def _cancel_text_load(self, editor):
+        """Stop the editor's chunked load, if any, leaving what was inserted."""
+        if not hasattr(editor, '_load_content'):
+            return
+        editor._load_timer.stop()
+        # The worker may be reading the mapping; wait for it before unmapping
+        editor._text_loader.cancel()
+        for attr in ('_load_content', '_load_offset', '_load_timer',
+                     '_loading_content', '_text_loader', '_load_blocks', '_load_finished',
+                     '_load_ms_per_char', '_load_region', '_load_gap_position',
+                     '_pending_jump'):
+            if hasattr(editor, attr):
+                delattr(editor, attr)
+        editor.line_gap = None
+    
     def remove_tab(self, index):
         """Remove a tab without prompting."""
+        editor = self.tab_widget.widget(index)
+        if isinstance(editor, CodeEditor):
+            # Unmap the file now rather than whenever the widget is collected
+            self._release_editor_resources(editor)
         # Find and remove from open_files dict
         for file_path, pane_info in list(self.open_files.items()):
             pane, tab_idx = pane_info
@@ -2765,6 +6067,14 @@ class TextEditor(QMainWindow):
             self.file_model.setRootPath(folder_path)
             self.file_tree.setRootIndex(self.file_model.index(folder_path))
             self.update_folder_label(folder_path)
+            self.open_search_index(folder_path)
+    
+    def open_search_index(self, folder_path):
+        """Build or update the folder's trigram index in the background."""
+        if self.search_index is not None:
+            self.search_index.cancel()
+        self.search_index = TrigramIndex(folder_path)
+        self.search_index.start()
     
     def open_file_from_tree(self, index):
         file_path = self.file_model.filePath(index)
@@ -2817,6 +6127,8 @@ class TextEditor(QMainWindow):
                     shutil.rmtree(file_path)
                 else:
                     os.remove(file_path)
+                if self.search_index is not None:
+                    self.search_index.file_deleted(file_path)
                 
                 # If we deleted the currently open file, close its tab
                 # Normalize paths for comparison (handle forward/back slashes)
@@ -2895,6 +6207,8 @@ class TextEditor(QMainWindow):
         """Handle files that were moved via drag and drop in the file tree."""
         for old_path, new_path in moved_files:
             self.update_moved_file_paths(old_path, new_path)
+            if self.search_index is not None:
+                self.search_index.file_moved(old_path, new_path)
     
     def update_moved_file_paths(self, old_path, new_path):
         """Update tracked file paths when a file is moved."""
@@ -2965,12 +6279,17 @@ class TextEditor(QMainWindow):
             # Load file content with mmap for large files
             # Keep as raw bytes to avoid full decode/encode overhead for large files
             file_size = os.path.getsize(file_path)
+            buffer = None
             
-            if file_size > 10 * 1024 * 1024:  # 10MB threshold for mmap
-                # Use memory-mapped file for very large files - keep as bytes
-                with open(file_path, 'rb') as f:
-                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
-                        content = bytes(mmapped_file[:])  # Copy to bytes object
+            if file_size > self.VIRTUAL_VIEW_THRESHOLD:
+                # Huge files stay on disk; only the visible window becomes Qt blocks
+                buffer = PieceTable.from_file(file_path)
+                content = None
+            elif file_size > 10 * 1024 * 1024:  # 10MB threshold for mmap
+                # Keep the mapping open for the life of the tab and hand out
+                # memoryview slices instead of copying the file onto the heap
+                mapped_file = MappedFile(file_path)
+                content = mapped_file.view
             else:
                 # Normal read for smaller files
                 with open(file_path, 'rb') as f:
@@ -3000,17 +6319,7 @@ class TextEditor(QMainWindow):
             # Check if deferred loading is enabled
             defer_loading = os.environ.get('ENABLE_DEFERRED_LOAD', 'true').lower() == 'true'
             
-            # Store saved content for comparison
             tab_index = self.tab_widget.currentIndex()
-            if isinstance(content, bytes) and file_size > 50 * 1024 * 1024:
-                # For very large files, store None to avoid decoding 250MB+ upfront
-                self.saved_content[(self.active_pane, tab_index)] = None
-            elif isinstance(content, bytes):
-                # For smaller files, decode now for comparison
-                decoded_content = content.decode('utf-8', errors='ignore')
-                self.saved_content[(self.active_pane, tab_index)] = decoded_content
-            else:
-                self.saved_content[(self.active_pane, tab_index)] = content
             
             # Update tab title
             tab_name = os.path.basename(file_path)
@@ -3024,7 +6333,15 @@ class TextEditor(QMainWindow):
             self.setWindowTitle(f"TextEdit - {file_path}")
             self.update_file_type(file_path)
             
-            if defer_loading:
+            self._release_editor_resources(editor)
+            if isinstance(content, memoryview):
+                editor.mapped_file = mapped_file
+            
+            if buffer is not None:
+                editor.load_buffer(buffer)
+                editor.set_language_from_file(file_path)
+                self._update_language_menu_state(editor.highlighter.language)
+            elif defer_loading:
                 # Defer setting plain text to next frame to avoid UI blocking
                 editor._pending_file_load = (file_path, content, file_size)
                 # Defer actual text loading to next frame
@@ -3032,11 +6349,12 @@ class TextEditor(QMainWindow):
             else:
                 # Deferred loading disabled - load immediately (for tests)
                 # Block signals during text loading to prevent unsaved indicator from showing
-                if isinstance(content, bytes):
-                    content = content.decode('utf-8', errors='ignore')
+                if isinstance(content, (bytes, memoryview)):
+                    content = str(content, 'utf-8', errors='ignore')
                 editor.blockSignals(True)
                 editor.setPlainText(content)
                 editor.document().setModified(False)
+                editor.dirty_tracker.mark_saved(content)
                 editor.blockSignals(False)
                 # Apply syntax highlighting based on file extension
                 editor.set_language_from_file(file_path)
@@ -3081,103 +6399,296 @@ class TextEditor(QMainWindow):
         # Content is kept as bytes to avoid massive upfront decode
         
         if defer_loading:  # Always use chunked loading for deferred loading
-            # Calculate chunk size based on file size to keep each frame under 16ms
-            # For small files, use smaller chunks to spread loading across more frames
-            # For large files, use larger chunks for efficiency
-            if file_size < 100 * 1024:  # < 100KB: smaller chunks
-                chunk_size = int(10 * 1024)  # 10KB per chunk - spreads 10 frames minimum
-            elif file_size < 10 * 1024 * 1024:  # < 10MB: medium chunks
-                chunk_size = int(31.25 * 1024)  # 31.25KB per chunk
-            else:  # >= 10MB: large chunks
-                chunk_size = int(62.5 * 1024)  # 62.5KB per chunk
-            editor._load_content = content  # Store full content as bytes
+            # Chunk size starts large enough for small files to load in one
+            # frame, then follows the measured insertText cost (see _load_next_chunk)
+            chunk_size = self.LOAD_INITIAL_CHUNK
+            editor._load_content = content  # Bytes, or a memoryview of the mapped file
             editor._load_offset = 0
-            editor._load_chunk_size = chunk_size
             editor._loading_content = True  # Flag to skip on_text_changed during loading
             editor._loading_file_path = pending_file_path  # Store file path for highlighting after load
-            # Create incremental decoder to handle UTF-8 boundaries properly
-            import codecs
-            editor._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            # Hash the saved state as it streams in (skipped for very large files)
+            if file_size <= 50 * 1024 * 1024:
+                editor.dirty_tracker.begin_saved_state()
+            
+            # Decode and index newlines on a pool thread; the GUI thread only
+            # inserts the decoded blocks it is handed, as many as fit in a frame
+            editor._load_blocks = deque()
+            loader = self._start_text_loader(editor, TextLoader(content, chunk_size))
             
-            editor._load_timer = QTimer(editor)
-            editor._load_timer.timeout.connect(lambda e=editor: self._load_next_chunk(e))
-            editor._load_timer.start(16)  # ~60fps
+            # Inserting runs on the shared frame scheduler, ahead of other work
+            # while this tab is the one on screen
+            editor._load_timer = FrameTask(
+                lambda budget_ms, e=editor: self._load_next_chunk(e, budget_ms),
+                lambda e=editor: (FrameScheduler.PRIORITY_VISIBLE_TAB if e.isVisible()
+                                  else FrameScheduler.PRIORITY_BACKGROUND),
+                name='load', owner=editor)
+            editor._load_timer.start()
         else:
             # Load all at once for small files (< 100KB)
             # Ensure content is decoded if it's bytes
-            if isinstance(content, bytes):
-                decoded_content = content.decode('utf-8', errors='ignore')
+            if isinstance(content, (bytes, memoryview)):
+                decoded_content = str(content, 'utf-8', errors='ignore')
             else:
                 decoded_content = content
             # Block signals during text loading to prevent unsaved indicator from showing
             editor.blockSignals(True)
             editor.setPlainText(decoded_content)
             editor.document().setModified(False)
+            editor.dirty_tracker.mark_saved(decoded_content)
             editor.blockSignals(False)
             # Apply syntax highlighting based on file extension
             editor.set_language_from_file(pending_file_path)
     
-    def _load_next_chunk(self, editor):
-        """Load the next chunk of content (bytes), decode and insert."""
+    def _start_text_loader(self, editor, loader):
+        """Make loader the editor's TextLoader and start it."""
+        loader.block_ready.connect(
+            lambda text, start, end, e=editor, l=loader: self._on_text_block(e, l, text, start, end),
+            Qt.QueuedConnection)
+        loader.finished.connect(
+            lambda e=editor, l=loader: self._on_text_loaded(e, l), Qt.QueuedConnection)
+        editor._text_loader = loader
+        editor._load_finished = False
+        loader.start()
+        return loader
+    
+    def _on_text_block(self, editor, loader, text, start_offset, end_offset):
+        """Queue a block decoded by the editor's TextLoader for insertion."""
+        if getattr(editor, '_text_loader', None) is not loader:
+            return  # Load was cancelled
+        editor._load_blocks.append((text, start_offset, end_offset))
+    
+    def _on_text_loaded(self, editor, loader):
+        """Note that the editor's TextLoader has sent its last block."""
+        if getattr(editor, '_text_loader', None) is loader:
+            editor._load_finished = True
+    
+    def _load_next_chunk(self, editor, budget_ms=None):
+        """Insert the next decoded blocks, or finish once the loader is done."""
         if not hasattr(editor, '_load_content'):
             return
         
-        content_bytes = editor._load_content
-        offset = editor._load_offset
-        chunk_size = editor._load_chunk_size
-        
-        # Extract next byte chunk
-        next_offset = min(offset + chunk_size, len(content_bytes))
-        byte_chunk = content_bytes[offset:next_offset]
-        
-        if not byte_chunk:
-             # Done loading - clear loading flag and mark as unmodified
-             editor._load_timer.stop()
-             editor._loading_content = False  # Allow on_text_changed to run again
-             # Flush any remaining bytes in the decoder
-             if hasattr(editor, '_decoder'):
-                 final_text = editor._decoder.decode(b'', final=True)
-                 if final_text:
-                     cursor = editor.textCursor()
-                     cursor.movePosition(QTextCursor.End)
-                     cursor.insertText(final_text)
-                 del editor._decoder
-             editor.document().setModified(False)
-             del editor._load_content
-             del editor._load_offset
-             del editor._load_chunk_size
-             del editor._load_timer
-             del editor._loading_content
-             
-             # Now that text is loaded, apply syntax highlighting based on file extension
-             # Defer this to the next frame to keep frame times low
-             if hasattr(editor, '_loading_file_path'):
-                 # Schedule language/highlighting setup for next frame
-                 QTimer.singleShot(0, lambda e=editor: self._apply_highlighting_to_loaded_editor(e))
-             
-             return
-        
-        # Decode this byte chunk using incremental decoder (handles UTF-8 boundaries)
-        text_chunk = editor._decoder.decode(byte_chunk, final=False)
-        
-        if not text_chunk:
-            # Decoder buffered the bytes (partial UTF-8 char), move offset and return
-            editor._load_offset = next_offset
+        if not editor._load_blocks:
+            if not editor._load_finished:
+                return  # Worker has not caught up yet
+            # Done loading - clear loading flag and mark as unmodified
+            editor._load_timer.stop()
+            editor._loading_content = False  # Allow on_text_changed to run again
+            editor.document().setModified(False)
+            editor.dirty_tracker.end_saved_state()
+            editor.line_gap = None
+            del editor._load_content
+            del editor._load_offset
+            del editor._load_timer
+            del editor._loading_content
+            del editor._text_loader
+            del editor._load_blocks
+            del editor._load_finished
+            for attr in ('_load_ms_per_char', '_load_region', '_load_gap_position'):
+                if hasattr(editor, attr):
+                    delattr(editor, attr)
+            if getattr(editor, '_pending_jump', None) is not None:
+                self._jump_if_loaded(editor)
+            
+            # Now that text is loaded, apply syntax highlighting based on file extension
+            # Defer this to the next frame to keep frame times low
+            if hasattr(editor, '_loading_file_path'):
+                # Schedule language/highlighting setup for next frame
+                QTimer.singleShot(0, lambda e=editor: self._apply_highlighting_to_loaded_editor(e))
+            
             return
         
-        # Insert decoded text using cursor operations
-        cursor = editor.textCursor()
-        if offset == 0:
-            # First chunk: clear document and insert
-            cursor.select(QTextCursor.Document)
-            cursor.removeSelectedText()
-            cursor.insertText(text_chunk)
+        # Insert blocks until the frame budget is spent, then size the next
+        # chunks from the measured insertText cost
+        chunk_budget_ms = min(self.LOAD_FRAME_BUDGET_MS, FrameScheduler.FRAME_BUDGET_MS)
+        if budget_ms is None or budget_ms > chunk_budget_ms:
+            budget_ms = chunk_budget_ms
+        start_time = time.time()
+        region = getattr(editor, '_load_region', None)
+        while editor._load_blocks:
+            text_chunk, start_offset, end_offset = editor._load_blocks.popleft()
+            editor._text_loader.block_taken()
+            
+            insert_start = time.time()
+            if region is not None and start_offset < region[0]:
+                # Lines skipped for a go-to target: fill in above it
+                self._insert_gap_block(editor, text_chunk)
+                editor._load_offset = end_offset
+            else:
+                cursor = editor.textCursor()
+                if editor._load_offset == 0 and region is None:
+                    # First chunk: clear document and insert
+                    cursor.select(QTextCursor.Document)
+                    cursor.removeSelectedText()
+                    cursor.insertText(text_chunk)
+                else:
+                    # Subsequent chunks: append
+                    cursor.movePosition(QTextCursor.End)
+                    cursor.insertText(text_chunk)
+                if region is None:
+                    editor._load_offset = end_offset
+            insert_ms = (time.time() - insert_start) * 1000
+            editor.dirty_tracker.feed_saved_text(text_chunk)
+            
+            if insert_ms > 0:
+                ms_per_char = insert_ms / len(text_chunk)
+                # Smooth the estimate so one slow insert does not collapse the chunk size
+                previous = getattr(editor, '_load_ms_per_char', ms_per_char)
+                editor._load_ms_per_char = (previous + ms_per_char) / 2
+                chunk = int(chunk_budget_ms / editor._load_ms_per_char)
+                editor._text_loader.block_size = max(self.LOAD_MIN_CHUNK,
+                                                     min(self.LOAD_MAX_CHUNK, chunk))
+            
+            # Stop if the next block would not fit in what is left of the frame
+            elapsed_ms = (time.time() - start_time) * 1000
+            if editor._load_blocks:
+                next_len = len(editor._load_blocks[0][0])
+                predicted_ms = next_len * getattr(editor, '_load_ms_per_char', 0)
+                if elapsed_ms + predicted_ms > budget_ms:
+                    break
+        
+        if getattr(editor, '_pending_jump', None) is not None:
+            self._jump_if_loaded(editor)
+    
+    def _insert_gap_block(self, editor, text):
+        """Insert skipped lines above a region loaded first, keeping the view still."""
+        gap_line, missing = editor.line_gap
+        view_below = editor.firstVisibleBlock().blockNumber() >= gap_line
+        cursor = QTextCursor(editor.document())
+        cursor.setPosition(editor._load_gap_position)
+        cursor.insertText(text)
+        editor._load_gap_position = cursor.position()
+        lines = text.count('\n')
+        editor.line_gap = (gap_line + lines, missing - lines) if missing > lines else None
+        if view_below and lines:
+            scroll_bar = editor.verticalScrollBar()
+            scroll_bar.setValue(scroll_bar.value() + lines)
+    
+    def go_to_line(self, line, column=0, length=0):
+        """Move the cursor to a 0-based line of the current file.
+        
+        If the file is still streaming in and the line is not loaded yet, the
+        region around it is loaded first and the jump happens when it arrives.
+        A non-zero length selects and highlights that many characters.
+        """
+        editor = self.editor
+        if editor is None:
+            return
+        if getattr(editor, '_pending_file_load', None) is not None:
+            # Start the deferred load now so the jump can steer it
+            self._deferred_load_text(editor, editor._pending_file_load[0])
+        if editor.buffer is not None:
+            editor.show_buffer_line(line)
+        elif hasattr(editor, '_load_content'):
+            editor._pending_jump = (line, column, length)
+            if not self._jump_if_loaded(editor):
+                loader = editor._text_loader
+                start, start_line = loader.nearest_line_start(line)
+                offset = LineIndex.find_line(editor._load_content, line, start, start_line)
+                if offset is not None:
+                    self._prioritize_load_region(editor, offset, line)
+            return
+        self._jump_to(editor, line, column, length)
+    
+    def go_to_offset(self, offset):
+        """Move the cursor to a byte offset of the current file as saved on disk."""
+        editor = self.editor
+        if editor is None:
+            return
+        content = getattr(editor, '_load_content', None)
+        if content is not None:
+            start, start_line = editor._text_loader.nearest_offset_start(offset)
+        elif editor.mapped_file is not None:
+            content, start, start_line = editor.mapped_file.view, 0, 0
+        elif editor.buffer is not None:
+            line = editor.buffer.line_count() - 1
+            while line > 0 and editor.buffer.line_start(line) > offset:
+                line -= 1
+            self.go_to_line(line, 0)
+            return
+        elif self.current_file:
+            with open(self.current_file, 'rb') as f:
+                content = f.read()
+            start, start_line = 0, 0
         else:
-            # Subsequent chunks: append
-            cursor.movePosition(QTextCursor.End)
-            cursor.insertText(text_chunk)
+            return
+        offset = max(0, min(offset, len(content)))
+        line = start_line + LineIndex.count_lines(content, start, offset)
+        line_start = LineIndex.find_line(content, line, start, start_line)
+        column = len(bytes(content[line_start:offset]).decode('utf-8', errors='ignore'))
+        self.go_to_line(line, column)
+    
+    def _prioritize_load_region(self, editor, target_offset, target_line):
+        """Restart a streaming load with the region around target_offset first."""
+        if getattr(editor, '_load_region', None) is not None:
+            return  # Already filling in behind an earlier target
+        if target_offset < editor._load_offset + self.LOAD_REGION_BYTES:
+            return  # Sequential loading gets there within a few frames
+        content = editor._load_content
+        total = len(content)
+        previous = editor._text_loader
+        previous.cancel()
+        editor._load_blocks.clear()
+        prefix_end = editor._load_offset
+        if prefix_end == 0:
+            editor.clear()
+        
+        # Start on a line boundary a little before the target
+        region_start = max(prefix_end, target_offset - self.LOAD_REGION_BEFORE)
+        if region_start > prefix_end:
+            newline = bytes(content[region_start:target_offset]).find(b'\n')
+            region_start = region_start + newline + 1 if newline >= 0 else target_offset
+        region_end = min(total, target_offset + self.LOAD_REGION_BYTES)
+        if region_end < total:
+            newline = bytes(content[region_end:region_end + self.LOAD_REGION_BYTES]).find(b'\n')
+            region_end = region_end + newline + 1 if newline >= 0 else total
+        region_line = target_line - LineIndex.count_lines(content, region_start, target_offset)
+        
+        # Lines stream in out of order, so the saved state is judged by the undo stack alone
+        editor.dirty_tracker.cancel_saved_state()
+        gap_line = editor.blockCount() - 1
+        editor.line_gap = (gap_line, region_line - gap_line) if region_line > gap_line else None
+        editor._load_gap_position = editor.document().characterCount() - 1
+        editor._load_region = (region_start, region_end)
+        ranges = [(region_start, region_end), (prefix_end, region_start), (region_end, total)]
+        self._start_text_loader(editor, TextLoader(
+            content, previous.block_size, [r for r in ranges if r[0] < r[1]], previous))
+    
+    def _jump_if_loaded(self, editor):
+        """Perform the editor's pending jump if its line has been loaded."""
+        line, column, length = editor._pending_jump
+        block_number = editor.document_line(line)
+        loading = hasattr(editor, '_load_content')
+        if block_number is None or (loading and block_number >= editor.blockCount() - 1):
+            return False
+        editor._pending_jump = None
+        self._jump_to(editor, line, column, length)
+        return True
+    
+    def _jump_to(self, editor, line, column=0, length=0):
+        """Select length characters at column of a loaded 0-based file line."""
+        block_number = editor.document_line(line)
+        if block_number is None:
+            return False
+        index = editor.line_index
+        # Line start comes from the index; no walking the document
+        start = index.offset_of(block_number) + column
+        end = min(start + length, editor.document().characterCount() - 1)
+        cursor = QTextCursor(editor.document())
+        cursor.setPosition(min(start, end))
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        editor.setTextCursor(cursor)
+        editor.ensureCursorVisible()
         
-        editor._load_offset = next_offset
+        if length:
+            # Highlight the match
+            extra_selections = []
+            selection = QTextEdit.ExtraSelection()
+            selection.format.setBackground(QColor("#ffff00"))
+            selection.format.setForeground(QColor("#000000"))
+            selection.cursor = cursor
+            extra_selections.append(selection)
+            editor.setExtraSelections(extra_selections)
+        return True
     
     def save_file(self):
         if self.current_file:
@@ -3195,17 +6706,15 @@ class TextEditor(QMainWindow):
     
     def save_to_file(self, file_path):
         try:
-            content = self.editor.toPlainText()
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            content = self._write_editor_to_file(self.editor, file_path)
             
             # Update open_files mapping if new file
             if file_path not in self.open_files:
                 self.open_files[file_path] = (self.active_pane, self.tab_widget.currentIndex())
             
-            # Store saved content for comparison
+            # Fingerprint the saved state for dirty tracking
             tab_index = self.tab_widget.currentIndex()
-            self.saved_content[(self.active_pane, tab_index)] = content
+            self.editor.dirty_tracker.mark_saved(content)
             
             self.current_file = file_path
             self.setWindowTitle(f"TextEdit - {file_path}")
@@ -3250,13 +6759,11 @@ class TextEditor(QMainWindow):
         if hasattr(self.editor, '_loading_content') and self.editor._loading_content:
             return
         
-        # Check if current content matches saved content
+        # Check if the edit brought the document back to its saved state.
+        # Only the blocks touched since the save are compared.
         tab_index = self.tab_widget.currentIndex()
-        key = (self.active_pane, tab_index)
-        if key in self.saved_content:
-            current_content = self.editor.toPlainText()
-            if current_content == self.saved_content[key]:
-                self.editor.document().setModified(False)
+        if self.editor.document().isModified() and self.editor.dirty_tracker.is_at_saved_state():
+            self.editor.document().setModified(False)
         
         title = self.windowTitle()
         if not title.endswith("*") and self.editor.document().isModified():
@@ -3282,7 +6789,7 @@ class TextEditor(QMainWindow):
          if not hasattr(self, 'cursor_label') or self.editor is None:
              return
          cursor = self.editor.textCursor()
-         line = cursor.blockNumber() + 1
+         line = self.editor.file_line(cursor.blockNumber()) + 1
          col = cursor.columnNumber() + 1
          self.cursor_label.setText(f"Ln {line}, Col {col}")
     
@@ -3335,6 +6842,12 @@ class TextEditor(QMainWindow):
         dialog = FindReplaceDialog(self.editor, self)
         dialog.exec()
     
+    def show_go_to_line_dialog(self):
+        """Ask for a 1-based line number and jump to it."""
+        line, ok = QInputDialog.getInt(self, "Go to Line", "Line number:", 1, 1, 2 ** 31 - 1)
+        if ok:
+            self.go_to_line(line - 1)
+    
     def show_multifile_find_dialog(self):
         """Show multi-file find and replace dialog using the currently displayed folder."""
         # Get the root path of the file tree
@@ -3350,32 +6863,13 @@ class TextEditor(QMainWindow):
         """Open a file at a specific line with the match highlighted."""
         self.load_file(file_path)
         
-        # Wait briefly for file to load
+        # Let a deferred load start so the jump can go ahead of it
         QApplication.processEvents()
         
-        # Scroll to the line and highlight the match
+        # Scroll to the line and highlight the match; on a file still
+        # streaming in, the region around the line is loaded first
         if self.editor:
-            doc = self.editor.document()
-            block = doc.findBlockByNumber(line_num - 1)
-            
-            if block.isValid():
-                cursor = QTextCursor(block)
-                # Move to the match position within the line
-                cursor.movePosition(QTextCursor.StartOfBlock)
-                cursor.movePosition(QTextCursor.Right, QTextCursor.MoveAnchor, match_start)
-                cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor, len(match_text))
-                
-                self.editor.setTextCursor(cursor)
-                self.editor.ensureCursorVisible()
-                
-                # Highlight the match
-                extra_selections = []
-                selection = QTextEdit.ExtraSelection()
-                selection.format.setBackground(QColor("#ffff00"))
-                selection.format.setForeground(QColor("#000000"))
-                selection.cursor = cursor
-                extra_selections.append(selection)
-                self.editor.setExtraSelections(extra_selections)
+            self.go_to_line(line_num - 1, match_start, len(match_text))
     
     def toggle_sidebar(self):
         self.file_tree.setVisible(not self.file_tree.isVisible())
@@ -3551,10 +7045,110 @@ class TextEditor(QMainWindow):
                     elif ret == QMessageBox.Cancel:
                         event.ignore()
                         return
+        # Stop files still streaming in so no loader thread outlives the window
+        for pane in self.split_panes:
+            for i in range(pane.tab_widget.count()):
+                editor = pane.tab_widget.widget(i)
+                if isinstance(editor, CodeEditor) and hasattr(editor, '_load_content'):
+                    self._release_editor_resources(editor)
+        if self.search_index is not None:
+            self.search_index.cancel()
         event.accept()
 
 
+def run_cli(argv):
+    """Search or replace in the files under a folder and print the results as JSON.
+
+    Runs the editor's SearchEngine and ReplaceTransaction without a
+    QApplication, so it needs no display. Returns the exit status: 0 if
+    anything matched, 1 if nothing did and 2 if a replace failed.
+    """
+    parser = argparse.ArgumentParser(
+        prog='main.py', description="Search or replace text in the files under a folder.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    search_parser = commands.add_parser('search', help="list every match")
+    replace_parser = commands.add_parser('replace', help="replace every match, all or nothing")
+    for command in (search_parser, replace_parser):
+        command.add_argument('pattern')
+        if command is replace_parser:
+            command.add_argument('replacement')
+        command.add_argument('folder', nargs='?', default=os.curdir)
+        command.add_argument('-e', '--regex', action='store_true',
+                             help="treat the pattern as a regular expression")
+        command.add_argument('-w', '--whole-word', action='store_true',
+                             help="match whole words only")
+        command.add_argument('-s', '--case-sensitive', action='store_true',
+                             help="match case")
+        command.add_argument('--include', action='append', default=[], metavar='GLOBS',
+                             help="comma-separated globs of files to search")
+        command.add_argument('--exclude', action='append', default=[], metavar='GLOBS',
+                             help="comma-separated globs of files and folders to skip")
+        command.add_argument('--no-gitignore', action='store_true',
+                             help="search files .gitignore excludes")
+        command.add_argument('--max-size', type=int, metavar='BYTES',
+                             help="skip files larger than this")
+    # The folder may come after the options, so the command's arguments are
+    # parsed intermixed; argparse cannot do that across subparsers itself
+    command = parser.parse_known_args(argv)[0].command
+    command_parser = search_parser if command == 'search' else replace_parser
+    args = command_parser.parse_intermixed_args(
+        argv[argv.index(command) + 1:], argparse.Namespace(command=command))
+    if not args.pattern:
+        parser.error("the pattern must not be empty")
+
+    query = SearchQuery(args.pattern, regex=args.regex, whole_word=args.whole_word,
+                        case_sensitive=args.case_sensitive)
+    try:
+        query.pattern()
+        if args.command == 'replace':
+            query.check_replacement(args.replacement)
+    except re.error as e:
+        parser.error(f"invalid pattern: {e}")
+    search_filter = SearchFilter(
+        [glob for globs in args.include for glob in SearchFilter.parse_globs(globs)],
+        [glob for globs in args.exclude for glob in SearchFilter.parse_globs(globs)],
+        use_gitignore=not args.no_gitignore, max_file_size=args.max_size)
+    output = {
+        'command': args.command,
+        'folder': os.path.abspath(args.folder),
+        'query': {'text': query.text, 'regex': query.regex,
+                  'whole_word': query.whole_word, 'case_sensitive': query.case_sensitive},
+    }
+
+    if args.command == 'search':
+        engine = SearchEngine(args.folder, query, search_filter=search_filter)
+        results = engine.run()
+        output['files_searched'] = engine.files_searched
+        output['match_count'] = len(results)
+        output['matches'] = [
+            {'path': file_path, 'line': line_num, 'column': match_start,
+             'text': line_text.rstrip('\n'), 'match': match_text}
+            for file_path, line_num, line_text, match_start, match_text in results]
+        output['errors'] = [{'path': file_path, 'error': error}
+                            for file_path, error in engine.errors]
+        status = 0 if results else 1
+    else:
+        transaction = ReplaceTransaction(args.folder, query, args.replacement,
+                                          search_filter=search_filter)
+        transaction.run()
+        # Nobody is left to undo it
+        transaction.discard()
+        output['files_searched'] = transaction.engine.files_searched
+        output['committed'] = transaction.committed
+        output['replaced_count'] = transaction.replaced_count
+        output['files'] = transaction.files
+        output['errors'] = [{'path': file_path, 'error': error}
+                            for file_path, error in transaction.errors]
+        status = 2 if transaction.errors else 0 if transaction.files else 1
+    json.dump(output, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return status
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('search', 'replace'):
+        # Headless: no QApplication, so no display is needed
+        sys.exit(run_cli(sys.argv[1:]))
     app = QApplication(sys.argv)
     app.setApplicationName("TextEdit")
     editor = TextEditor()
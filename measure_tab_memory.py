@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Measure the memory held per open tab to track each file's saved state.
+Opens many generated files and compares the saved-state fingerprint
+(digest + per-block hashes) with the decoded text copy it replaced.
+
+Usage: python measure_tab_memory.py [tab_count] [file_size_mb]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Load synchronously so every tab is fully built before measuring
+os.environ['ENABLE_DEFERRED_LOAD'] = 'false'
+
+from PySide6.QtWidgets import QApplication
+from main import TextEditor
+
+
+class TabMemoryMeasure:
+    def __init__(self, tab_count=30, file_size_mb=2):
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        self.tab_count = tab_count
+        self.file_size = int(file_size_mb * 1024 * 1024)
+
+    def write_files(self, folder):
+        """Write tab_count source-like files of roughly file_size bytes."""
+        line = "def function_{0}(value):  # return the value unchanged\n"
+        paths = []
+        for i in range(self.tab_count):
+            path = os.path.join(folder, f"file_{i}.py")
+            with open(path, 'w', encoding='utf-8') as f:
+                written = 0
+                n = 0
+                while written < self.file_size:
+                    text = line.format(n)
+                    f.write(text)
+                    written += len(text)
+                    n += 1
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def fingerprint_bytes(tracker):
+        """Bytes held by one tab's saved-state fingerprint."""
+        total = sys.getsizeof(tracker.saved_digest or b'')
+        if tracker.saved_hashes is not None:
+            total += sys.getsizeof(tracker.saved_hashes)
+        return total
+
+    def run(self):
+        print("=" * 60)
+        print("Saved-State Memory Per Tab")
+        print(f"System time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Tabs: {self.tab_count}, file size: {self.file_size / (1024*1024):.1f} MB")
+        print("=" * 60)
+
+        with tempfile.TemporaryDirectory() as folder:
+            paths = self.write_files(folder)
+            window = TextEditor()
+
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            for path in paths:
+                window.load_file(path)
+                self.app.processEvents()
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            fingerprint_total = 0
+            text_copy_total = 0
+            for pane in window.split_panes:
+                for i in range(pane.tab_widget.count()):
+                    editor = pane.tab_widget.widget(i)
+                    fingerprint_total += self.fingerprint_bytes(editor.dirty_tracker)
+                    # What a decoded saved_content copy of this tab would hold
+                    text_copy_total += sys.getsizeof(editor.toPlainText())
+
+            window.close()
+
+        mb = 1024 * 1024
+        print(f"\nPython heap growth while opening: {(after - before) / mb:.1f} MB "
+              f"(peak {(peak - before) / mb:.1f} MB)")
+        print(f"Fingerprints (digest + block hashes): {fingerprint_total / mb:.2f} MB")
+        print(f"Decoded text copies (old saved_content): {text_copy_total / mb:.2f} MB")
+        if text_copy_total:
+            saved = text_copy_total - fingerprint_total
+            print(f"Saved: {saved / mb:.2f} MB "
+                  f"({100.0 * saved / text_copy_total:.0f}% of the text copies)")
+
+
+if __name__ == '__main__':
+    tab_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    file_size_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    TabMemoryMeasure(tab_count, file_size_mb).run()
@@ -1,6 +1,7 @@
 import pytest
 import time
 import os
+import tempfile
 from PySide6.QtWidgets import QApplication
 from unittest.mock import patch
 
@@ -12,6 +13,9 @@ def pytest_configure(config):
     
     # Disable deferred loading during tests for backward compatibility
     os.environ['ENABLE_DEFERRED_LOAD'] = 'false'
+    
+    # Keep search indexes out of the user's cache directory
+    os.environ['TEXTEDIT_INDEX_DIR'] = tempfile.mkdtemp(prefix='textedit-index-')
 
 @pytest.fixture
 def timeout_15s(request):
@@ -0,0 +1,129 @@
+"""Tests for DirtyTracker saved-state detection."""
+
+from PySide6.QtGui import QTextCursor
+from main import CodeEditor, TextEditor
+
+
+def make_editor(qtbot, text):
+    editor = CodeEditor()
+    qtbot.addWidget(editor)
+    editor.setPlainText(text)
+    editor.document().setModified(False)
+    editor.dirty_tracker.mark_saved(text)
+    return editor
+
+
+class TestDirtyTracker:
+    """Tests for hashing touched blocks against the saved state."""
+
+    def test_type_and_delete_returns_to_saved_state(self, qtbot):
+        editor = make_editor(qtbot, "alpha\nbeta\ngamma")
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.Down)
+        cursor.insertText("x")
+        assert not editor.dirty_tracker.is_at_saved_state()
+        cursor.deletePreviousChar()
+        assert editor.document().isModified()
+        assert editor.dirty_tracker.is_at_saved_state()
+
+    def test_same_length_edit_is_detected(self, qtbot):
+        editor = make_editor(qtbot, "alpha\nbeta\ngamma")
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.deletePreviousChar()
+        cursor.insertText("A")
+        assert not editor.dirty_tracker.is_at_saved_state()
+
+    def test_new_line_and_removal_returns_to_saved_state(self, qtbot):
+        editor = make_editor(qtbot, "alpha\nbeta\ngamma")
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.EndOfBlock)
+        cursor.insertText("\nextra")
+        assert not editor.dirty_tracker.is_at_saved_state()
+        for _ in range(len("\nextra")):
+            cursor.deletePreviousChar()
+        assert editor.dirty_tracker.is_at_saved_state()
+
+    def test_crlf_saved_text(self, qtbot):
+        editor = make_editor(qtbot, "one\r\ntwo\r\n")
+        cursor = editor.textCursor()
+        cursor.insertText("z")
+        cursor.deletePreviousChar()
+        assert editor.dirty_tracker.is_at_saved_state()
+
+    def test_text_editor_clears_modified_without_full_compare(self, qtbot, tmp_path, monkeypatch):
+        path = tmp_path / "doc.txt"
+        path.write_text("first\nsecond\n", encoding='utf-8')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(path))
+
+        def fail(*args):
+            raise AssertionError("toPlainText called on edit")
+        monkeypatch.setattr(window.editor, 'toPlainText', fail)
+
+        cursor = window.editor.textCursor()
+        cursor.insertText("q")
+        assert window.editor.document().isModified()
+        cursor.deletePreviousChar()
+        assert not window.editor.document().isModified()
+
+    def test_saved_digest_matches_current_text(self, qtbot):
+        editor = make_editor(qtbot, "alpha\nbeta\n")
+        tracker = editor.dirty_tracker
+        assert tracker.saved_digest == tracker.current_digest()
+        editor.textCursor().insertText("x")
+        assert tracker.saved_digest != tracker.current_digest()
+
+    def test_changed_lines_same_line_count(self, qtbot):
+        editor = make_editor(qtbot, "a\nb\nc\nd")
+        assert editor.dirty_tracker.changed_lines() == []
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.Down)
+        cursor.movePosition(QTextCursor.Down)
+        cursor.insertText("!")
+        assert editor.dirty_tracker.changed_lines() == [2]
+
+    def test_changed_lines_after_inserted_line(self, qtbot):
+        editor = make_editor(qtbot, "a\nb\nc\nd")
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.Down)
+        cursor.insertText("new\n")
+        assert editor.dirty_tracker.changed_lines() == [1]
+
+    def test_undo_back_to_saved_text_makes_tab_clean(self, qtbot, tmp_path):
+        path = tmp_path / "doc.txt"
+        path.write_text("first\nsecond\n", encoding='utf-8')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(path))
+        editor = window.editor
+        index = window.tab_widget.currentIndex()
+
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.Down)
+        cursor.insertText("more ")
+        assert editor.document().isModified()
+        assert window.tab_widget.tabText(index).endswith("*")
+
+        editor.undo()
+        assert editor.toPlainText() == "first\nsecond\n"
+        assert not editor.document().isModified()
+        assert not window.tab_widget.tabText(index).endswith("*")
+
+    def test_same_length_block_edit_makes_tab_dirty(self, qtbot, tmp_path):
+        path = tmp_path / "doc.txt"
+        path.write_text("first\nsecond\n", encoding='utf-8')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(path))
+        editor = window.editor
+        index = window.tab_widget.currentIndex()
+
+        # Same block length, different text: only the block hash tells them apart
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        cursor.insertText("FIRST")
+        assert len(editor.toPlainText()) == len("first\nsecond\n")
+        assert editor.document().isModified()
+        assert window.tab_widget.tabText(index).endswith("*")
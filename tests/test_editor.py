@@ -4,7 +4,7 @@ import tempfile
 from pathlib import Path
 from PySide6.QtCore import Qt, QPoint, QTimer, QDir, QUrl, QSize, QMimeData, QEvent, QPointF
 from PySide6.QtGui import QTextCursor, QFont, QColor, QTextDocument, QMouseEvent, QDropEvent, QResizeEvent, QDragEnterEvent, QDragMoveEvent
-from PySide6.QtWidgets import QApplication, QMessageBox, QFileDialog, QScrollArea, QWidget, QPushButton, QFileSystemModel
+from PySide6.QtWidgets import QApplication, QMessageBox, QFileDialog, QWidget, QPushButton, QFileSystemModel
 from unittest.mock import patch, Mock, MagicMock
 
 from main import (
@@ -3512,21 +3512,14 @@ class TestMultiFileSearchResultsDialog:
         assert results_dialog.isVisible()
         assert search_dialog.isVisible()
         
-        # Get the first search result button
-        scroll_area = results_dialog.findChild(QScrollArea)
-        assert scroll_area is not None
+        # Get the first search result row
+        view = results_dialog.results_view
+        assert view.model().rowCount() == 1
+        row_rect = view.visualRect(view.model().index(0, 0))
+        assert row_rect.isValid()
         
-        # Get the button widget from scroll area
-        scroll_widget = scroll_area.widget()
-        layout = scroll_widget.layout()
-        assert layout.count() > 0
-        
-        # Get the first button (search result)
-        button_widget = layout.itemAt(0).widget()
-        assert button_widget is not None
-        
-        # Click the button (simulate user clicking on a search result)
-        qtbot.mouseClick(button_widget, Qt.LeftButton)
+        # Click the row (simulate user clicking on a search result)
+        qtbot.mouseClick(view.viewport(), Qt.LeftButton, pos=row_rect.center())
         
         # Give Qt time to process the close event
         qtbot.wait(100)
@@ -6688,115 +6681,6 @@ class TestFindReplaceDialogEdgeCases:
         assert cursor.selectionStart() == 0
 
 
-class TestSearchResultButton:
-    """Tests for SearchResultButton hover effects and interactions."""
-
-    def test_search_result_button_mouse_enter(self, qtbot):
-        """Test SearchResultButton changes style on mouse enter."""
-        from main import SearchResultButton, TextEditor
-        
-        window = TextEditor()
-        qtbot.addWidget(window)
-        
-        button = SearchResultButton(
-            file_path="test.txt",
-            line_num=1,
-            line_text="hello world",
-            match_start=0,
-            match_text="hello",
-            text_editor=window
-        )
-        qtbot.addWidget(button)
-        
-        # Record original stylesheet
-        original_style = button.label.styleSheet()
-        
-        # Simulate mouse enter
-        button.enterEvent(None)
-        
-        # Stylesheet should change to hover style
-        hover_style = button.label.styleSheet()
-        assert original_style != hover_style
-        assert "#007acc" in hover_style  # Blue border on hover
-        assert "#3e3e42" in hover_style  # Darker background on hover
-
-    def test_search_result_button_mouse_leave(self, qtbot):
-        """Test SearchResultButton restores style on mouse leave."""
-        from main import SearchResultButton, TextEditor
-        
-        window = TextEditor()
-        qtbot.addWidget(window)
-        
-        button = SearchResultButton(
-            file_path="test.txt",
-            line_num=1,
-            line_text="hello world",
-            match_start=0,
-            match_text="hello",
-            text_editor=window
-        )
-        qtbot.addWidget(button)
-        
-        # First enter
-        button.enterEvent(None)
-        hover_style = button.label.styleSheet()
-        
-        # Then leave
-        button.leaveEvent(None)
-        normal_style = button.label.styleSheet()
-        
-        # Should revert to normal style
-        assert hover_style != normal_style
-        assert "#007acc" not in normal_style  # No blue border
-        assert "#2d2d30" in normal_style  # Normal background
-
-    def test_search_result_button_highlights_match_text(self, qtbot):
-        """Test SearchResultButton correctly highlights the matched text."""
-        from main import SearchResultButton, TextEditor
-        
-        window = TextEditor()
-        qtbot.addWidget(window)
-        
-        button = SearchResultButton(
-            file_path="test.txt",
-            line_num=5,
-            line_text="this is a hello world string",
-            match_start=10,
-            match_text="hello",
-            text_editor=window
-        )
-        qtbot.addWidget(button)
-        
-        # Check that HTML contains proper formatting
-        html_text = button.label.text()
-        assert "test.txt:5" in html_text  # File and line info
-        assert "#ffff00" in html_text  # Yellow background for match
-        assert "#000000" in html_text  # Black text for match
-        assert "hello" in html_text
-
-    def test_search_result_button_cursor_changes(self, qtbot):
-        """Test SearchResultButton has pointing hand cursor."""
-        from main import SearchResultButton, TextEditor
-        
-        window = TextEditor()
-        qtbot.addWidget(window)
-        
-        button = SearchResultButton(
-            file_path="test.txt",
-            line_num=1,
-            line_text="hello world",
-            match_start=0,
-            match_text="hello",
-            text_editor=window
-        )
-        qtbot.addWidget(button)
-        
-        # Button should have pointing hand cursor
-        assert button.cursor().shape() == Qt.PointingHandCursor
-        # Label should also have pointing hand cursor
-        assert button.label.cursor().shape() == Qt.PointingHandCursor
-
-
 class TestMultiFileSearchAndReplace:
     """Tests for multifile find and replace functionality."""
 
@@ -10282,7 +10166,7 @@ class TestCoverageGapsAdvanced:
             original_open = open
             def mock_open_func(*args, **kwargs):
                 if 'test.txt' in args[0]:
-                    raise Exception("File read error")
+                    raise OSError("File read error")
                 return original_open(*args, **kwargs)
             
             with patch('builtins.open', side_effect=mock_open_func):
@@ -10848,60 +10732,6 @@ class TestCoverageGapsAdvanced:
         
         signal_spy.assert_called_once()
     
-    def test_search_result_button_mouse_press(self, qtbot):
-        """Test SearchResultButton opens file on click."""
-        from main import SearchResultButton
-        
-        editor_window = TextEditor()
-        qtbot.addWidget(editor_window)
-        
-        btn = SearchResultButton(
-            file_path=__file__,
-            line_num=1,
-            line_text="test line",
-            match_start=0,
-            match_text="test",
-            text_editor=editor_window
-        )
-        qtbot.addWidget(btn)
-        
-        # Simulate mouse press
-        with patch.object(editor_window, 'open_file_with_line'):
-            btn.mousePressEvent(Mock())
-            assert True
-    
-    def test_search_result_button_close_dialog_on_click(self, qtbot):
-        """Test SearchResultButton closes parent dialogs."""
-        from main import SearchResultButton, MultiFileSearchResultsDialog
-        
-        editor_window = TextEditor()
-        qtbot.addWidget(editor_window)
-        
-        # Create a results dialog
-        results = [(__file__, 1, "test line", 0, "test")]
-        results_dialog = MultiFileSearchResultsDialog(results, editor_window)
-        qtbot.addWidget(results_dialog)
-        
-        btn = SearchResultButton(
-            file_path=__file__,
-            line_num=1,
-            line_text="test",
-            match_start=0,
-            match_text="test",
-            text_editor=editor_window
-        )
-        
-        # Set parent dialog
-        btn.setParent(results_dialog)
-        qtbot.addWidget(btn)
-        
-        # Simulate mouse press (should close dialogs)
-        with patch.object(editor_window, 'open_file_with_line'):
-            btn.mousePressEvent(Mock())
-            # Should have attempted to close dialogs
-            assert True
-
-
 class TestAggressive95Coverage:
     """Aggressive tests with heavy mocking to reach 95% coverage."""
     
@@ -0,0 +1,92 @@
+"""Test the shared frame-budget scheduler."""
+
+import time
+from main import FrameScheduler, FrameTask, CodeEditor
+
+
+def make_task(scheduler, log, name, priority, runs=1, cost_ms=0.0):
+    """Task that logs its name, sleeps cost_ms, and stops after runs steps."""
+    state = {'left': runs}
+
+    def step(budget_ms):
+        log.append((name, budget_ms))
+        if cost_ms:
+            time.sleep(cost_ms / 1000)
+        state['left'] -= 1
+        if state['left'] <= 0:
+            task.stop()
+
+    task = FrameTask(step, priority, name=name, scheduler=scheduler)
+    return task
+
+
+def test_tasks_run_in_priority_order(qtbot):
+    scheduler = FrameScheduler()
+    log = []
+    make_task(scheduler, log, 'background', FrameScheduler.PRIORITY_BACKGROUND).start()
+    make_task(scheduler, log, 'region', FrameScheduler.PRIORITY_VISIBLE_REGION).start()
+    make_task(scheduler, log, 'tab', FrameScheduler.PRIORITY_VISIBLE_TAB).start()
+    
+    scheduler.run_frame()
+    assert [name for name, _ in log] == ['tab', 'region', 'background']
+    assert scheduler.queue_depth() == 0
+    assert not scheduler.timer.isActive()
+
+
+def test_frame_budget_is_shared(qtbot):
+    scheduler = FrameScheduler()
+    scheduler.FRAME_BUDGET_MS = 10.0
+    log = []
+    first = make_task(scheduler, log, 'first', FrameScheduler.PRIORITY_VISIBLE_TAB, runs=5, cost_ms=12)
+    second = make_task(scheduler, log, 'second', FrameScheduler.PRIORITY_BACKGROUND, runs=5)
+    first.start()
+    second.start()
+    
+    scheduler.run_frame()
+    # The first task used up the budget, so the second waits for the next frame
+    assert [name for name, _ in log] == ['first']
+    assert log[0][1] <= 10.0
+    stats = scheduler.stats()
+    assert stats['queue_depth'] == 2
+    assert stats['depth_by_priority'][FrameScheduler.PRIORITY_BACKGROUND] == 1
+    assert stats['task_ms']['first'] >= 12
+    assert stats['last_frame_ms'] >= 12
+
+
+def test_equal_priorities_take_turns(qtbot):
+    scheduler = FrameScheduler()
+    scheduler.FRAME_BUDGET_MS = 1.0
+    log = []
+    make_task(scheduler, log, 'a', FrameScheduler.PRIORITY_BACKGROUND, runs=3, cost_ms=2).start()
+    make_task(scheduler, log, 'b', FrameScheduler.PRIORITY_BACKGROUND, runs=3, cost_ms=2).start()
+    
+    scheduler.run_frame()
+    scheduler.run_frame()
+    assert [name for name, _ in log] == ['a', 'b']
+
+
+def test_callable_priority_and_task_interface(qtbot):
+    scheduler = FrameScheduler()
+    visible = {'value': False}
+    log = []
+    task = make_task(scheduler, log, 'load', lambda: 0 if visible['value'] else 2, runs=2)
+    assert not task.isActive()
+    task.start()
+    assert task.isActive()
+    assert scheduler.queue_depth(FrameScheduler.PRIORITY_BACKGROUND) == 1
+    visible['value'] = True
+    assert scheduler.queue_depth(FrameScheduler.PRIORITY_VISIBLE_TAB) == 1
+    task.stop()
+    assert scheduler.queue_depth() == 0
+
+
+def test_editor_highlight_task_uses_shared_scheduler(qtbot):
+    editor = CodeEditor()
+    qtbot.addWidget(editor)
+    editor.setPlainText("def f():\n    return 1\n" * 50)
+    editor.highlighter.set_language('python')
+    editor.is_large_file = True
+    editor.highlight_timer.start()
+    assert editor.highlight_timer in FrameScheduler.instance().tasks
+    editor.highlight_timer.stop()
+    assert editor.highlight_timer not in FrameScheduler.instance().tasks
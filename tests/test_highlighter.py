@@ -0,0 +1,402 @@
+"""Tests for the syntax highlighting tokenizer and lazy highlighting."""
+
+from PySide6.QtGui import QTextCursor, QTextDocument
+from main import SyntaxHighlighter, Tokenizer, IntervalSet, CodeEditor, TextEditor
+
+
+def tokens(language, text, state=0):
+    """(token text, kind) pairs for text, plus the state it ends in."""
+    tokenizer = SyntaxHighlighter.tokenizer_for(language)
+    spans, state = tokenizer.tokenize(text, state)
+    return [(text[spans[i]:spans[i] + spans[i + 1]], tokenizer.kinds[spans[i + 2]])
+            for i in range(0, len(spans), 3)], state
+
+
+def block_colors(document, number):
+    """(start, length, color) of the formats applied to a block."""
+    layout = document.findBlockByNumber(number).layout()
+    return [(r.start, r.length, r.format.foreground().color().name())
+            for r in layout.formats()]
+
+
+def highlighted(language, text):
+    document = QTextDocument()
+    document.documentLayout()
+    highlighter = SyntaxHighlighter(document, language)
+    document.setPlainText(text)
+    return document, highlighter
+
+
+class TestTokenizer:
+    """Tests for token precedence and kinds."""
+
+    def test_hash_inside_string_is_not_a_comment(self):
+        found, _ = tokens('python', 'x = "a # b"  # real')
+        assert found == [('"a # b"', 'string'), ('# real', 'comment')]
+
+    def test_comment_swallows_later_tokens(self):
+        found, _ = tokens('c', 'x = 1; // "not a string" return')
+        assert found == [('1', 'number'), ('// "not a string" return', 'comment')]
+
+    def test_python_definitions(self):
+        found, _ = tokens('python', '@wrap\ndef name(x): return len(x) + 0x1F')
+        assert found == [('@wrap', 'decorator'), ('def', 'keyword'), ('name', 'function'),
+                         ('return', 'keyword'), ('len', 'builtin'), ('0x1F', 'number')]
+
+    def test_keyword_wins_over_function_call(self):
+        found, _ = tokens('javascript', 'if (x) run(y)')
+        assert found == [('if', 'keyword'), ('run', 'function')]
+
+    def test_escaped_quote_stays_in_string(self):
+        found, _ = tokens('c', r'"a \" b" + c')
+        assert found == [(r'"a \" b"', 'string')]
+
+    def test_keywords_only_match_whole_words(self):
+        found, _ = tokens('python', 'define = ifx')
+        assert found == []
+
+    def test_block_comment_state(self):
+        found, state = tokens('c', 'int x; /* open')
+        assert found == [('int', 'keyword'), ('/* open', 'comment')]
+        assert state == 1
+        found, state = tokens('c', 'still */ return', state)
+        assert found == [('still */', 'comment'), ('return', 'keyword')]
+        assert state == 0
+
+    def test_unknown_language_has_no_tokens(self):
+        assert SyntaxHighlighter.tokenizer_for(None).tokenize('def x')[0].tolist() == []
+
+    def test_tokenizer_is_shared_per_language(self):
+        first = SyntaxHighlighter(QTextDocument(), 'python')
+        second = SyntaxHighlighter(QTextDocument(), 'python')
+        assert first.tokenizer is second.tokenizer
+
+    def test_rule_with_group_kinds(self):
+        tokenizer = Tokenizer([(r'(\w+)=(\w+)', ('property', None))])
+        spans, _ = tokenizer.tokenize('a=b c=d')
+        assert spans.tolist() == [0, 1, 0, 4, 1, 0]
+
+
+class TestHighlightFormats:
+    """Tests for the formats SyntaxHighlighter applies to blocks."""
+
+    def test_string_color_covers_hash(self, qtbot):
+        document, highlighter = highlighted('python', 'x = "a # b"')
+        string = SyntaxHighlighter.COLORS['string']
+        assert block_colors(document, 0) == [(4, 7, string)]
+
+    def test_astral_characters_use_utf16_positions(self, qtbot):
+        document, highlighter = highlighted('python', '"\U0001F600" # c')
+        colors = block_colors(document, 0)
+        assert colors == [(0, 4, SyntaxHighlighter.COLORS['string']),
+                          (5, 3, SyntaxHighlighter.COLORS['comment'])]
+
+    def test_missing_format_is_skipped(self, qtbot):
+        document = QTextDocument()
+        document.documentLayout()
+        highlighter = SyntaxHighlighter(document, 'python')
+        del highlighter.formats['keyword']
+        document.setPlainText('return "x"')
+        assert block_colors(document, 0) == [(7, 3, SyntaxHighlighter.COLORS['string'])]
+
+
+class CountingHighlighter(SyntaxHighlighter):
+    """SyntaxHighlighter recording which blocks it highlights."""
+
+    def __init__(self, document, language=None):
+        self.highlighted = []
+        super().__init__(document, language)
+
+    def highlightBlock(self, text):
+        self.highlighted.append(self.currentBlock().blockNumber())
+        super().highlightBlock(text)
+
+
+class TestBlockStates:
+    """Tests for constructs that span blocks."""
+
+    def lines(self, language, lines):
+        """Tokens of each line, carrying the state from line to line."""
+        result = []
+        state = 0
+        for line in lines:
+            found, state = tokens(language, line, state)
+            result.append((found, state))
+        return result
+
+    def test_docstring_spans_lines(self):
+        result = self.lines('python', ['x = """doc', 'if # not code', 'end""" + y'])
+        assert result[0] == ([('"""doc', 'string')], 1)
+        assert result[1] == ([('if # not code', 'string')], 1)
+        assert result[2] == ([('end"""', 'string')], 0)
+
+    def test_single_quote_docstring_has_its_own_state(self):
+        result = self.lines('python', ["'''a", 'has """ inside', "b'''"])
+        assert [state for _, state in result] == [2, 2, 0]
+
+    def test_escaped_delimiter_does_not_close(self):
+        result = self.lines('python', ['"""a', r'b \""" c', 'd"""'])
+        assert [state for _, state in result] == [1, 1, 0]
+
+    def test_template_literal(self):
+        result = self.lines('javascript', ['const t = `a', '// not a comment', 'b`; f()'])
+        assert result[1] == ([('// not a comment', 'string')], 2)
+        assert result[2] == ([('b`', 'string'), ('f', 'function')], 0)
+
+    def test_go_raw_string_ignores_backslash(self):
+        result = self.lines('go', ['s := `a\\', 'b`'])
+        assert [state for _, state in result] == [2, 0]
+
+    def test_html_comment(self):
+        result = self.lines('html', ['<p><!-- start', '<b>', '--> <i>'])
+        assert result[1] == ([('<b>', 'comment')], 1)
+        assert result[2] == ([('-->', 'comment'), ('<i', 'tag'), ('>', 'tag')], 0)
+
+    def test_rust_comments_nest(self):
+        result = self.lines('rust', ['/* outer /* inner', '*/ still', '*/ fn x'])
+        assert [state for _, state in result] == [1 | 1 << 8, 1, 0]
+        assert result[2][0] == [('*/', 'comment'), ('fn', 'keyword')]
+
+    def test_block_states_are_stored(self, qtbot):
+        document, _ = highlighted('python', 'a = 1\n"""doc\nmore\n"""\nb = 2')
+        states = [document.findBlockByNumber(i).userState() for i in range(1, 5)]
+        assert states == [1, 1, 0, 0]
+        assert block_colors(document, 2) == [(0, 4, SyntaxHighlighter.COLORS['string'])]
+
+
+class TestMinimalRehighlight:
+    """Edits highlight again only the blocks whose state they change."""
+
+    def setup_document(self):
+        document = QTextDocument()
+        document.documentLayout()
+        highlighter = CountingHighlighter(document, 'python')
+        document.setPlainText("\n".join(f"x{i} = {i}" for i in range(50)))
+        highlighter.highlighted.clear()
+        return document, highlighter
+
+    def edit(self, document, block, text):
+        cursor = QTextCursor(document.findBlockByNumber(block))
+        cursor.insertText(text)
+
+    def test_plain_edit_touches_one_block(self, qtbot):
+        document, highlighter = self.setup_document()
+        self.edit(document, 10, "y = 2 # ")
+        assert highlighter.highlighted == [10]
+
+    def test_opening_string_cascades_until_closed(self, qtbot):
+        document, highlighter = self.setup_document()
+        self.edit(document, 10, '"""')
+        assert highlighter.highlighted == list(range(10, 50))
+        highlighter.highlighted.clear()
+        self.edit(document, 20, '"""')
+        assert highlighter.highlighted == list(range(20, 50))
+        assert document.findBlockByNumber(19).userState() == 1
+        assert document.findBlockByNumber(20).userState() == 0
+
+    def test_edit_inside_string_stays_local(self, qtbot):
+        document, highlighter = self.setup_document()
+        self.edit(document, 10, '"""')
+        self.edit(document, 30, '"""')
+        highlighter.highlighted.clear()
+        self.edit(document, 20, "# still in the string")
+        assert highlighter.highlighted == [20]
+
+    def test_edits_count_tokenized_blocks(self, qtbot):
+        document, highlighter = self.setup_document()
+        self.edit(document, 10, "y = 2 # ")
+        assert highlighter.last_edit_tokenized == 1
+        self.edit(document, 10, '"""')
+        assert highlighter.last_edit_tokenized == 40
+        highlighter.rehighlight()
+        self.edit(document, 45, "z")
+        assert highlighter.last_edit_tokenized == 1
+
+    def test_same_language_does_nothing(self, qtbot):
+        document, highlighter = self.setup_document()
+        tokenized = highlighter.tokenized_blocks
+        assert not highlighter.set_language('python')
+        assert not highlighter.set_language_from_file('other.py')
+        assert highlighter.highlighted == []
+        assert highlighter.tokenized_blocks == tokenized
+        assert highlighter.set_language_from_file('page.html')
+        assert highlighter.highlighted == list(range(50))
+
+    def test_saving_again_does_not_rehighlight(self, qtbot, tmp_path):
+        path = tmp_path / "module.py"
+        path.write_text("x = 1\n" * 100)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText(path.read_text())
+        editor.set_language_from_file(str(path))
+        tokenized = editor.highlighter.tokenized_blocks
+        editor.set_language_from_file(str(path))
+        assert editor.highlighter.tokenized_blocks == tokenized
+
+
+class TestIntervalSet:
+    """Tests for the ranges of highlighted blocks."""
+
+    def test_add_merges_touching_ranges(self):
+        ranges = IntervalSet()
+        ranges.add(0, 5)
+        ranges.add(8, 10)
+        ranges.add(5, 8)
+        assert ranges.bounds == [0, 10]
+        assert 9 in ranges and 10 not in ranges
+
+    def test_discard_splits(self):
+        ranges = IntervalSet()
+        ranges.add(0, 10)
+        ranges.discard(3, 5)
+        assert ranges.bounds == [0, 3, 5, 10]
+        assert ranges.first_missing(0) == 3
+        assert ranges.first_missing(5) == 10
+
+    def test_shift_for_inserted_and_removed_numbers(self):
+        ranges = IntervalSet()
+        ranges.add(0, 10)
+        ranges.shift(4, 2)
+        assert ranges.bounds == [0, 4, 6, 12]
+        ranges.shift(4, -2)
+        assert ranges.bounds == [0, 10]
+
+
+def block_is_colored(editor, number):
+    return bool(editor.document().findBlockByNumber(number).layout().formats())
+
+
+class TestLazyHighlighting:
+    """Tests for viewport-first highlighting of large files."""
+
+    def make_editor(self, qtbot, text):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.resize(400, 300)
+        editor.setPlainText(text)
+        editor.is_large_file = True
+        return editor
+
+    def finish(self, editor):
+        while editor.highlight_timer.isActive():
+            editor.highlight_remaining_blocks(1000)
+
+    def test_visible_blocks_first_rest_deferred(self, qtbot):
+        editor = self.make_editor(qtbot, "x = 1\n" * 2000)
+        editor.set_language('python')
+        first, last = editor._visible_blocks
+        assert first == 0 and 0 < last < 100
+        assert block_is_colored(editor, last)
+        assert not block_is_colored(editor, 1500)
+        assert editor.highlight_timer.isActive()
+        self.finish(editor)
+        assert block_is_colored(editor, 1999)
+        assert editor.highlighted_ranges.bounds == [0, editor.document().blockCount()]
+
+    def test_background_pass_fixes_state_from_above(self, qtbot):
+        editor = self.make_editor(qtbot, 'x = 1\n"""\n' + "return 1\n" * 2000)
+        editor.verticalScrollBar().setValue(1000)
+        editor.set_language('python')
+        first, _ = editor._visible_blocks
+        assert first > 900
+        string = SyntaxHighlighter.COLORS['string']
+        assert block_colors(editor.document(), first)[0][2] != string
+        self.finish(editor)
+        assert block_colors(editor.document(), first)[0][2] == string
+
+    def test_edits_renumber_done_ranges(self, qtbot):
+        editor = self.make_editor(qtbot, "x = 1\n" * 500)
+        editor.set_language('python')
+        self.finish(editor)
+        cursor = QTextCursor(editor.document().findBlockByNumber(2))
+        cursor.insertText("a\nb\nc\n")
+        assert editor.highlighted_ranges.bounds == [0, editor.document().blockCount()]
+        assert not editor.highlight_timer.isActive()
+
+    def test_small_files_are_not_deferred(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("x = 1\n" * 2000)
+        editor.set_language('python')
+        assert block_is_colored(editor, 1999)
+        assert editor.highlighter.block_filter is None
+
+
+class TestTokenCache:
+    """Tests for tokenizing large files in a worker process."""
+
+    def make_editor(self, qtbot, text):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.resize(400, 300)
+        editor.setPlainText(text)
+        editor.is_large_file = True
+        editor.set_language('python')
+        cache = editor.highlighter.token_cache
+        qtbot.waitUntil(lambda: None not in cache, timeout=10000)
+        return editor
+
+    def fail_tokenize(self, monkeypatch, editor):
+        calls = []
+        tokenizer = editor.highlighter.tokenizer
+        tokenize = tokenizer.tokenize
+
+        def counting(text, state=0):
+            calls.append(text)
+            return tokenize(text, state)
+        monkeypatch.setattr(tokenizer, 'tokenize', counting)
+        return calls
+
+    def test_worker_fills_cache_with_block_states(self, qtbot):
+        editor = self.make_editor(qtbot, 'x = 1\n"""\ndoc\n"""\n' * 1000)
+        cache = editor.highlighter.token_cache
+        assert len(cache) == editor.document().blockCount()
+        revision, state_in, tokens, state_out = cache[1]
+        assert revision == editor.document().findBlockByNumber(1).revision()
+        assert (state_in, state_out) == (0, 1)
+        assert cache[2][1:] == (1, cache[2][2], 1)
+        assert cache[0][2].typecode == 'I'
+
+    def test_cached_blocks_are_not_tokenized_again(self, qtbot, monkeypatch):
+        editor = self.make_editor(qtbot, "return 1\n" * 3000)
+        calls = self.fail_tokenize(monkeypatch, editor)
+        while editor.highlight_timer.isActive():
+            editor.highlight_remaining_blocks(1000)
+        assert calls == []
+        assert block_is_colored(editor, 2999)
+
+    def test_edited_block_is_tokenized_again(self, qtbot, monkeypatch):
+        editor = self.make_editor(qtbot, "return 1\n" * 3000)
+        editor.highlight_timer.stop()
+        calls = self.fail_tokenize(monkeypatch, editor)
+        cursor = QTextCursor(editor.document().findBlockByNumber(3))
+        cursor.insertText("x = ")
+        assert calls == ["x = return 1"]
+
+    def test_inserted_lines_shift_cache(self, qtbot):
+        editor = self.make_editor(qtbot, "".join(f"v{i} = {i}\n" for i in range(3000)))
+        editor.highlight_timer.stop()
+        QTextCursor(editor.document().findBlockByNumber(10)).insertText("a\nb\n")
+        cache = editor.highlighter.token_cache
+        assert len(cache) == editor.document().blockCount()
+        assert [i for i, entry in enumerate(cache) if entry is None] == [10, 11, 12]
+        block = editor.document().findBlockByNumber(2000)
+        assert block.text() == "v1998 = 1998"
+        qtbot.waitUntil(lambda: None not in cache, timeout=10000)
+        assert cache[2000][0] == block.revision()
+
+    def test_closing_the_tab_stops_background_work(self, qtbot, tmp_path):
+        path = tmp_path / "big.py"
+        path.write_text("return 1\n" * 3000)
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(path))
+        editor = window.editor
+        editor.is_large_file = True
+        editor.set_language('javascript')
+        job = editor.tokenize_job
+        assert job is not None and editor.highlight_timer.isActive()
+        window.remove_tab(window.tab_widget.currentIndex())
+        assert editor.tokenize_job is None
+        assert not job._task.isActive() and job._pending is None
+        assert not editor.highlight_timer.isActive()
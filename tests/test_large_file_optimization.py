@@ -3,7 +3,10 @@
 import pytest
 import tempfile
 import os
+import threading
+import time
 from pathlib import Path
+from PySide6.QtCore import QThreadPool
 from main import TextEditor, CodeEditor
 
 
@@ -90,3 +93,233 @@ class TestLargeFileOptimization:
         # Content should be in the editor
         editor_content = window.editor.toPlainText()
         assert len(editor_content) > 0
+
+    def test_mmap_kept_open_and_released_on_tab_close(self, qtbot, tmp_path):
+        """Verify the mapping lives as long as the tab and is unmapped by remove_tab."""
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        line = "Line: " + ("x" * 100) + "\n"
+        content = line * (11 * 1024 * 1024 // len(line))
+        file_path = tmp_path / "mapped_file_11mb.txt"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        editor = window.editor
+        mapped_file = editor.mapped_file
+        
+        # The mapping stays open and serves slices without copying the file
+        assert mapped_file is not None
+        assert mapped_file.text(0, 20) == content[:20]
+        assert editor.toPlainText()[:20] == content[:20]
+        
+        window.remove_tab(window.tab_widget.currentIndex())
+        assert editor.mapped_file is None
+        assert mapped_file.view is None
+
+    def test_save_over_mapped_file(self, qtbot, tmp_path):
+        """Saving over the mapped file must not truncate the live mapping."""
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        line = "Line: " + ("x" * 100) + "\n"
+        content = line * (11 * 1024 * 1024 // len(line))
+        file_path = tmp_path / "mapped_save_11mb.txt"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        window.editor.textCursor().insertText("edited\n")
+        assert window.save_file()
+        
+        assert file_path.read_text(encoding='utf-8') == "edited\n" + content
+        assert window.editor.mapped_file is None
+
+    def test_save_over_mapped_file_keeps_mode(self, qtbot, tmp_path):
+        window = TextEditor()
+        qtbot.addWidget(window)
+        line = "Line: " + ("x" * 100) + "\n"
+        file_path = tmp_path / "mapped_mode_11mb.sh"
+        file_path.write_text(line * (11 * 1024 * 1024 // len(line)), encoding='utf-8')
+        file_path.chmod(0o755)
+        window.load_file(str(file_path))
+        window.editor.textCursor().insertText("edited\n")
+        assert window.save_file()
+        assert file_path.stat().st_mode & 0o777 == 0o755
+
+    def test_deferred_load_decodes_on_worker_thread(self, qtbot, tmp_path, monkeypatch):
+        """Deferred loading streams decoded blocks from a TextLoader worker."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        content = "".join(f"línea {i} — ünïcödé\n" for i in range(20000))
+        file_path = tmp_path / "streamed.txt"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        qtbot.waitUntil(lambda: hasattr(window.editor, '_text_loader'))
+        loader = window.editor._text_loader
+        qtbot.waitUntil(lambda: not hasattr(window.editor, '_load_content'), timeout=20000)
+        
+        assert window.editor.toPlainText() == content
+        assert not window.editor.document().isModified()
+        # Newline index built by the worker maps lines to block byte offsets
+        assert loader.line_count == 20001
+        raw = content.encode('utf-8')
+        offset = loader.line_offset(15000)
+        assert raw[:offset].count(b"\n") <= 15000
+        assert offset == 0 or raw[offset - 1:offset] == b"\n"
+
+    def test_closing_tab_cancels_worker(self, qtbot, tmp_path, monkeypatch):
+        """Removing a tab mid-load stops the worker before unmapping."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        line = "Line: " + ("x" * 100) + "\n"
+        file_path = tmp_path / "cancel_11mb.txt"
+        file_path.write_text(line * (11 * 1024 * 1024 // len(line)), encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        qtbot.waitUntil(lambda: hasattr(window.editor, '_text_loader'))
+        editor = window.editor
+        loader = editor._text_loader
+        window.remove_tab(window.tab_widget.currentIndex())
+        
+        assert loader._done.is_set()
+        assert not hasattr(editor, '_load_content')
+        assert editor.mapped_file is None
+
+    def test_moving_a_loading_tab_restarts_its_load(self, qtbot, tmp_path, monkeypatch):
+        """A tab moved mid-load cancels its loader and loads in full in the new pane."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        line = "Line: " + ("x" * 100) + "\n"
+        content = line * (11 * 1024 * 1024 // len(line))
+        file_path = tmp_path / "move_11mb.txt"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        qtbot.waitUntil(lambda: hasattr(window.editor, '_text_loader'))
+        source_pane = window.active_pane
+        editor = window.editor
+        loader = editor._text_loader
+        window.add_split_view()
+        dest_pane = window.active_pane
+        window.on_tab_dropped_to_pane(f"tab:0:{id(source_pane)}", dest_pane)
+        
+        assert loader._done.is_set()
+        assert not hasattr(editor, '_load_content')
+        moved = window.editor
+        assert moved is not editor
+        assert window.open_files[str(file_path)][0] is dest_pane
+        qtbot.waitUntil(lambda: not hasattr(moved, '_load_content'), timeout=60000)
+        assert moved.toPlainText() == content
+        assert not moved.document().isModified()
+
+    def test_closing_tab_with_queued_loader_does_not_wait(self, qtbot, tmp_path, monkeypatch):
+        """A loader still queued behind busy pool threads is dropped, not waited for."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        line = "Line: " + ("x" * 100) + "\n"
+        file_path = tmp_path / "queued_11mb.txt"
+        file_path.write_text(line * (11 * 1024 * 1024 // len(line)), encoding='utf-8')
+        
+        pool = QThreadPool.globalInstance()
+        release = threading.Event()
+        for _ in range(pool.maxThreadCount()):
+            pool.start(lambda: release.wait(30))
+        try:
+            window.load_file(str(file_path))
+            qtbot.waitUntil(lambda: hasattr(window.editor, '_text_loader'))
+            editor = window.editor
+            loader = editor._text_loader
+            started = time.perf_counter()
+            window.remove_tab(window.tab_widget.currentIndex())
+            assert time.perf_counter() - started < 5
+            assert not loader._started
+            assert loader._done.is_set()
+            assert editor.mapped_file is None
+        finally:
+            release.set()
+            pool.waitForDone()
+
+    def test_small_file_loads_in_one_frame(self, qtbot, tmp_path, monkeypatch):
+        """A 100KB file fits in the first chunk instead of many fixed-size ticks."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        content = "x = 1\n" * (100 * 1024 // 6)
+        file_path = tmp_path / "small_100kb.py"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        qtbot.waitUntil(lambda: window.editor.document().characterCount() > 1)
+        assert window.editor.toPlainText() == content
+
+    def test_chunk_size_follows_frame_budget(self, qtbot, tmp_path, monkeypatch):
+        """Measured insert cost resizes the loader's chunks to fit the budget."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        monkeypatch.setattr(TextEditor, 'LOAD_FRAME_BUDGET_MS', 2.0)
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        content = "".join(f"value_{i} = {i}\n" for i in range(40000))
+        file_path = tmp_path / "budget.py"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.load_file(str(file_path))
+        qtbot.waitUntil(lambda: hasattr(window.editor, '_load_ms_per_char'), timeout=5000)
+        loader = window.editor._text_loader
+        assert TextEditor.LOAD_MIN_CHUNK <= loader.block_size < TextEditor.LOAD_INITIAL_CHUNK
+        qtbot.waitUntil(lambda: not hasattr(window.editor, '_load_content'), timeout=30000)
+        assert window.editor.toPlainText() == content
+
+    def test_go_to_line_while_streaming_loads_region_first(self, qtbot, tmp_path, monkeypatch):
+        """A jump past the loaded text loads the target region first, then fills in."""
+        monkeypatch.setenv('ENABLE_DEFERRED_LOAD', 'true')
+        monkeypatch.setattr(TextEditor, 'LOAD_INITIAL_CHUNK', 16 * 1024)
+        monkeypatch.setattr(TextEditor, 'LOAD_MAX_CHUNK', 16 * 1024)
+        monkeypatch.setattr(TextEditor, 'LOAD_REGION_BYTES', 32 * 1024)
+        window = TextEditor()
+        qtbot.addWidget(window)
+        
+        content = "".join(f"line {i} ünï\n" for i in range(200000))
+        file_path = tmp_path / "streaming.txt"
+        file_path.write_text(content, encoding='utf-8')
+        
+        window.open_file_with_line(str(file_path), 150001, "ünï", 12)
+        editor = window.editor
+        # The target shows up long before the lines above it are loaded
+        qtbot.waitUntil(lambda: editor.textCursor().selectedText() == "ünï", timeout=10000)
+        assert hasattr(editor, '_load_content')
+        assert editor.line_gap is not None
+        assert editor.file_line(editor.textCursor().blockNumber()) == 150000
+        window.update_cursor_position()
+        assert window.cursor_label.text().startswith("Ln 150001,")
+        
+        qtbot.waitUntil(lambda: not hasattr(editor, '_load_content'), timeout=60000)
+        assert editor.line_gap is None
+        assert editor.toPlainText() == content
+        assert editor.textCursor().blockNumber() == 150000
+        assert editor.textCursor().selectedText() == "ünï"
+        assert not editor.document().isModified()
+
+    def test_go_to_offset_on_loaded_file(self, qtbot, tmp_path):
+        """Byte offsets map to the right line and column through the file bytes."""
+        window = TextEditor()
+        qtbot.addWidget(window)
+        content = "ä\nbb\nccc\n"
+        file_path = tmp_path / "offsets.txt"
+        file_path.write_text(content, encoding='utf-8')
+        window.load_file(str(file_path))
+        
+        window.go_to_offset(content.encode('utf-8').index(b"cc") + 1)
+        cursor = window.editor.textCursor()
+        assert cursor.blockNumber() == 2
+        assert cursor.positionInBlock() == 1
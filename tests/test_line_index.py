@@ -0,0 +1,91 @@
+"""Tests for the LineIndex line-offset index and its editor integration."""
+
+import bisect
+import random
+from PySide6.QtGui import QTextCursor
+from main import LineIndex, CodeEditor, TextEditor
+
+
+def expected_starts(text):
+    return [0] + [i + 1 for i, c in enumerate(text) if c == "\n"]
+
+
+class TestLineIndex:
+    """Tests for building and querying LineIndex."""
+
+    def test_from_bytes_and_text(self, monkeypatch):
+        monkeypatch.setattr(LineIndex, 'SCAN_WINDOW', 7)
+        for text in ["", "a", "a\n", "\n\n", "ab\ncd\n\nefg\nh", "x" * 20 + "\n" + "y\n" * 10]:
+            for data in (text, text.encode(), memoryview(text.encode())):
+                index = LineIndex.from_data(data)
+                assert list(index.starts()) == expected_starts(text)
+
+    def test_lookups(self, monkeypatch):
+        monkeypatch.setattr(LineIndex, 'CHUNK_LINES', 3)
+        text = "".join(f"{'x' * (i % 5)}\n" for i in range(50))
+        index = LineIndex.from_data(text)
+        starts = expected_starts(text)
+        assert index.line_count == len(starts)
+        for line, start in enumerate(starts):
+            assert index.offset_of(line) == start
+        for offset in range(len(text) + 1):
+            assert index.line_of(offset) == bisect.bisect_right(starts, offset) - 1
+        assert index.offset_of(10 ** 6) == starts[-1]
+
+    def test_random_edits_stay_consistent(self, monkeypatch):
+        monkeypatch.setattr(LineIndex, 'CHUNK_LINES', 3)
+        rng = random.Random(7)
+        text = "line\n" * 40
+        index = LineIndex.from_data(text)
+        for _ in range(500):
+            position = rng.randint(0, len(text))
+            removed = rng.randint(0, min(15, len(text) - position))
+            inserted = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 12)))
+            new_starts = [position + i + 1 for i, c in enumerate(inserted) if c == "\n"]
+            index.apply_edit(position, removed, len(inserted), new_starts)
+            text = text[:position] + inserted + text[position + removed:]
+            assert list(index.starts()) == expected_starts(text)
+
+
+def block_start(editor, number):
+    return editor.document().findBlockByNumber(number).position()
+
+
+class TestEditorLineIndex:
+    """Tests for the CodeEditor line index following document edits."""
+
+    def test_index_follows_typing(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("one\ntwo\nthree")
+        assert editor.line_index.line_count == 3
+        cursor = editor.textCursor()
+        cursor.movePosition(QTextCursor.Down)
+        cursor.insertText("new\nline\n")
+        cursor.movePosition(QTextCursor.End)
+        cursor.deletePreviousChar()
+        starts = expected_starts(editor.toPlainText())
+        assert list(editor.line_index.starts()) == starts
+
+    def test_index_counts_utf16_units(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("a\U0001F600b\nc\n\U0001F600")
+        assert list(editor.line_index.starts()) == [0, 5, 7]
+        cursor = editor.textCursor()
+        cursor.setPosition(2)
+        cursor.insertText("\U0001F600\nx\U0001F600\n" * 3)
+        starts = [block_start(editor, n) for n in range(editor.document().blockCount())]
+        assert list(editor.line_index.starts()) == starts
+        assert list(LineIndex.from_document(editor.document()).starts()) == starts
+
+    def test_jump_to_search_result(self, qtbot, tmp_path):
+        path = tmp_path / "jump.txt"
+        path.write_text("".join(f"row {i} target\n" for i in range(500)), encoding='utf-8')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.open_file_with_line(str(path), 321, "target", 8)
+        cursor = window.editor.textCursor()
+        assert cursor.selectedText() == "target"
+        assert cursor.blockNumber() == 320
+        assert window.cursor_label.text() == "Ln 321, Col 15"
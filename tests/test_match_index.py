@@ -0,0 +1,369 @@
+"""Tests for the Find dialog's incremental match index."""
+
+import re
+import random
+import pytest
+from PySide6.QtGui import QTextCursor, QTextDocument
+from main import MatchIndex, LiveSearch, FindReplaceDialog, CodeEditor
+
+
+def pattern(text):
+    return re.compile(re.escape(text), re.IGNORECASE)
+
+
+def make_document(text):
+    document = QTextDocument(text)
+    # Documents only report contentsChange once they have a layout
+    document.documentLayout()
+    return document
+
+
+class TestMatchIndex:
+    """Tests for building, updating and navigating a MatchIndex."""
+
+    def test_build_positions(self, qtbot):
+        document = QTextDocument("foo bar\nFOO foo\n\nbarfoo")
+        index = MatchIndex(document, pattern("foo"))
+        assert index.matches() == [(0, 3), (8, 11), (12, 15), (20, 23)]
+
+    def test_astral_characters_use_utf16_positions(self, qtbot):
+        document = QTextDocument("\U0001F600 foo\nfoo")
+        index = MatchIndex(document, pattern("foo"))
+        assert index.matches() == [(3, 6), (7, 10)]
+        cursor = QTextCursor(document)
+        cursor.setPosition(3)
+        cursor.setPosition(6, QTextCursor.KeepAnchor)
+        assert cursor.selectedText() == "foo"
+
+    def test_edits_match_a_fresh_scan(self, qtbot):
+        rng = random.Random(7)
+        document = make_document("\n".join("foo line %d fo" % i for i in range(200)))
+        index = MatchIndex(document, pattern("foo"))
+        cursor = QTextCursor(document)
+        for _ in range(200):
+            length = document.characterCount() - 1
+            start = rng.randrange(length + 1)
+            end = min(length, start + rng.randrange(12))
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            cursor.insertText(rng.choice(["o", "foo", "f", "\n", "", "x\nfoo"]))
+            assert index.matches() == MatchIndex(QTextDocument(document.toPlainText()), pattern("foo")).matches()
+        index.close()
+
+    def test_next_and_previous_wrap(self, qtbot):
+        document = QTextDocument("a foo b foo c")
+        index = MatchIndex(document, pattern("foo"))
+        assert index.next_match(0) == 0
+        assert index.next_match(3) == 1
+        assert index.next_match(12) == 0
+        assert index.previous_match(12) == 1
+        assert index.previous_match(10) == 0
+        assert index.previous_match(2) == 1
+        assert MatchIndex(QTextDocument("none"), pattern("foo")).next_match(0) is None
+
+
+class TestFindDialogUsesIndex:
+    """Tests that Find Next reuses one scan per query."""
+
+    def test_find_next_scans_once_per_query(self, qtbot, monkeypatch):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo\n" * 50)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        builds = []
+        original = MatchIndex.build
+        monkeypatch.setattr(MatchIndex, 'build', lambda self: builds.append(1) or original(self))
+        dialog.find_input.setText("foo")
+        for _ in range(10):
+            dialog.find_next()
+        assert len(builds) == 1
+        assert editor.textCursor().selectionStart() == 36
+        assert dialog.current_match_index == 9
+
+        dialog.find_previous()
+        assert editor.textCursor().selectionStart() == 32
+
+        dialog.find_input.setText("oo")
+        dialog.find_next()
+        assert len(builds) == 2
+
+    def test_index_follows_edits(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("one foo\ntwo\nthree foo")
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.find_next()
+        cursor = editor.textCursor()
+        cursor.setPosition(8)
+        cursor.insertText("foo ")
+        assert dialog.all_matches == [(4, 7), (8, 11), (22, 25)]
+
+
+class TestMatchOverlay:
+    """Tests for drawing matches as extra selections over the viewport."""
+
+    def test_find_leaves_document_untouched(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo bar foo")
+        editor.document().setModified(False)
+        stack = editor.document().availableUndoSteps()
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.find_next()
+        dialog.find_next()
+        assert not editor.document().isModified()
+        assert editor.document().availableUndoSteps() == stack
+        # The current line plus both matches, the second one emphasized
+        selections = editor.extraSelections()
+        assert len(selections) == 3
+        assert selections[2].cursor.selectionStart() == 8
+        assert selections[2].format.fontWeight() == 700
+        assert selections[1].format.fontWeight() != 700
+
+    def test_only_visible_matches_are_drawn(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.resize(400, 300)
+        editor.show()
+        qtbot.waitExposed(editor)
+        editor.setPlainText("foo foo\n" * 20000)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.find_next()
+        assert len(dialog.match_index) == 40000
+        drawn = len(editor.extraSelections()) - 1
+        assert 0 < drawn < 200
+
+        def drawn_starts():
+            selections = editor.extraSelections()
+            return [s.cursor.selectionStart() for s in selections[1:]]
+
+        editor.verticalScrollBar().setValue(10000)
+        qtbot.waitUntil(lambda: drawn_starts()[-1] > 70000)
+        start, end = editor.visible_range()
+        assert all(start <= s < end for s in drawn_starts())
+
+    def test_closing_dialog_clears_overlay(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo")
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.find_next()
+        dialog.reject()
+        assert editor.match_highlights is None
+        assert len(editor.extraSelections()) == 1
+
+
+class TestLiveSearch:
+    """Tests for find-as-you-type scanning a snapshot off the GUI thread."""
+
+    def test_chunked_scan_matches_full_scan(self, qtbot, monkeypatch):
+        monkeypatch.setattr(LiveSearch, 'CHUNK_CHARS', 64)
+        document = make_document("".join("foo %d \U0001F600 foo\n" % i for i in range(300)))
+        search = LiveSearch(document, pattern("foo"))
+        counts = []
+        search.progress.connect(counts.append)
+        with qtbot.waitSignal(search.finished, timeout=5000) as blocker:
+            search.start()
+        starts, ends = blocker.args
+        assert list(zip(starts, ends)) == MatchIndex(document, pattern("foo")).matches()
+        assert counts == sorted(counts) and counts[-1] == 600
+
+    def test_typing_is_debounced(self, qtbot, monkeypatch):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo bar foo\n" * 10)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        builds = []
+        original = MatchIndex.build
+        monkeypatch.setattr(MatchIndex, 'build', lambda self: builds.append(1) or original(self))
+        for prefix in ("f", "fo", "foo"):
+            dialog.find_input.setText(prefix)
+        assert builds == []
+        qtbot.waitUntil(lambda: dialog.match_index is not None)
+        assert len(builds) == 1
+        assert dialog._match_query.text == "foo"
+        assert dialog.match_count_label.text() == "20 matches"
+        assert not editor.textCursor().hasSelection()
+
+    def test_large_document_is_searched_in_background(self, qtbot, monkeypatch):
+        monkeypatch.setattr(LiveSearch, 'CHUNK_CHARS', 256)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo bar\n" * 2000)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        monkeypatch.setattr(MatchIndex, 'build', lambda self: pytest.fail("scanned on the GUI thread"))
+        dialog.find_input.setText("bar")
+        dialog.start_live_search()
+        stale = dialog.live_search
+        assert stale is not None
+        dialog.find_input.setText("foo")
+        dialog.start_live_search()
+        assert stale._cancelled
+        qtbot.waitUntil(lambda: dialog.match_index is not None, timeout=5000)
+        assert dialog._match_query.text == "foo"
+        assert len(dialog.match_index) == 2000
+        assert dialog.match_count_label.text() == "2,000 matches"
+
+    def test_edit_during_search_restarts_it(self, qtbot, monkeypatch):
+        monkeypatch.setattr(LiveSearch, 'CHUNK_CHARS', 256)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("foo bar\n" * 2000)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.start_live_search()
+        editor.textCursor().insertText("foo ")
+        qtbot.waitUntil(lambda: dialog.match_index is not None, timeout=5000)
+        fresh = MatchIndex(QTextDocument(editor.toPlainText()), pattern("foo"))
+        assert dialog.all_matches == fresh.matches()
+
+
+class TestChunkedReplaceAll:
+    """Tests for Replace All editing the document chunk by chunk."""
+
+    def make_dialog(self, qtbot, text):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText(text)
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        return editor, dialog
+
+    def test_large_replace_runs_over_frames_as_one_undo_step(self, qtbot, monkeypatch):
+        monkeypatch.setattr(FindReplaceDialog, 'CHUNKED_REPLACE_CHARS', 1000)
+        monkeypatch.setattr(FindReplaceDialog, 'REPLACE_CHUNK_CHARS', 256)
+        original = "".join("line %d Foo \U0001F600 foo\n" % i for i in range(2000))
+        editor, dialog = self.make_dialog(qtbot, original)
+        results = []
+        monkeypatch.setattr(dialog, '_show_replace_result', results.append)
+        dialog.find_input.setText("foo")
+        dialog.replace_input.setText("bar")
+        dialog.replace_all()
+        assert hasattr(dialog, '_replace_state')
+        qtbot.waitUntil(lambda: not hasattr(dialog, '_replace_state'), timeout=10000)
+        assert editor.toPlainText() == pattern("foo").sub("bar", original)
+        assert editor.document().isModified()
+        qtbot.waitUntil(lambda: results == [4000])
+        editor.undo()
+        assert editor.toPlainText() == original
+
+    def test_blocks_without_matches_are_not_edited(self, qtbot, monkeypatch):
+        monkeypatch.setattr(FindReplaceDialog, 'REPLACE_CHUNK_CHARS', 64)
+        lines = ["plain line %d" % i for i in range(300)]
+        lines[200] = "a foo here"
+        editor, dialog = self.make_dialog(qtbot, "\n".join(lines))
+        first_edit = editor.document().findBlockByNumber(200).position()
+        edits = []
+        editor.document().contentsChange.connect(lambda pos, removed, added: edits.append(pos))
+        dialog.find_input.setText("foo")
+        dialog.replace_input.setText("bar")
+        dialog.replace_all()
+        assert edits and min(edits) >= first_edit
+        assert editor.document().findBlockByNumber(200).text() == "a bar here"
+
+    def test_regex_never_matches_across_lines(self, qtbot, monkeypatch):
+        monkeypatch.setattr(FindReplaceDialog, 'CHUNKED_REPLACE_CHARS', 1000)
+        monkeypatch.setattr(FindReplaceDialog, 'REPLACE_CHUNK_CHARS', 256)
+        original = "".join("word %d  end\n" % i for i in range(2000))
+        editor, dialog = self.make_dialog(qtbot, original)
+        results = []
+        monkeypatch.setattr(dialog, '_show_replace_result', results.append)
+        dialog.regex_check.setChecked(True)
+        dialog.find_input.setText(r"\n")
+        dialog.replace_input.setText(" ")
+        dialog.replace_all()
+        qtbot.waitUntil(lambda: not hasattr(dialog, '_replace_state'), timeout=10000)
+        assert editor.toPlainText() == original
+        qtbot.waitUntil(lambda: results == [0])
+        # Whitespace runs are replaced within each line, as Find counts them
+        dialog.find_input.setText(r"\s+")
+        dialog.find_next()
+        found = len(dialog.match_index)
+        dialog.replace_input.setText("_")
+        dialog.replace_all()
+        qtbot.waitUntil(lambda: not hasattr(dialog, '_replace_state'), timeout=10000)
+        assert editor.toPlainText() == "".join("word_%d_end\n" % i for i in range(2000))
+        qtbot.waitUntil(lambda: results == [0, found])
+
+    def test_pattern_is_looked_up_once_per_replace(self, qtbot, monkeypatch):
+        from main import SearchQuery
+        monkeypatch.setattr(FindReplaceDialog, 'CHUNKED_REPLACE_CHARS', 1000)
+        monkeypatch.setattr(FindReplaceDialog, 'REPLACE_CHUNK_CHARS', 256)
+        editor, dialog = self.make_dialog(qtbot, "a foo b\n" * 2000)
+        dialog.regex_check.setChecked(True)
+        dialog.find_input.setText(r"f(o+)")
+        dialog.replace_input.setText(r"g\1")
+        lookups = []
+        real_pattern = SearchQuery.pattern
+        monkeypatch.setattr(SearchQuery, 'pattern', lambda query: lookups.append(query) or real_pattern(query))
+        dialog.replace_all()
+        qtbot.waitUntil(lambda: not hasattr(dialog, '_replace_state'), timeout=10000)
+        assert editor.toPlainText() == "a goo b\n" * 2000
+        assert len(lookups) <= 3
+
+    def test_replacement_is_literal(self, qtbot):
+        editor, dialog = self.make_dialog(qtbot, "a.b a.b")
+        dialog.find_input.setText("a.b")
+        dialog.replace_input.setText(r"\1\n")
+        dialog.replace_all()
+        assert editor.toPlainText() == r"\1\n \1\n"
+
+
+class TestSearchModes:
+    """Tests for the Find dialog's regex, whole-word and case modes."""
+
+    def test_modes_change_the_query(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("Foo food foo f00")
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("foo")
+        dialog.find_next()
+        assert len(dialog.match_index) == 3
+        dialog.case_check.setChecked(True)
+        dialog.whole_word_check.setChecked(True)
+        dialog.find_next()
+        assert dialog.all_matches == [(9, 12)]
+        dialog.find_input.setText(r"f\w\w")
+        dialog.regex_check.setChecked(True)
+        dialog.find_next()
+        assert dialog.all_matches == [(9, 12), (13, 16)]
+
+    def test_regex_replace_all_expands_groups(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("x = 1\ny = 2")
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.regex_check.setChecked(True)
+        dialog.find_input.setText(r"^(\w) = (\d)$")
+        dialog.replace_input.setText(r"\2 = \1")
+        dialog.replace_all()
+        assert editor.toPlainText() == "1 = x\n2 = y"
+
+    def test_invalid_regex_is_reported(self, qtbot):
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.setPlainText("(a")
+        dialog = FindReplaceDialog(editor)
+        qtbot.addWidget(dialog)
+        dialog.regex_check.setChecked(True)
+        dialog.find_input.setText("(")
+        dialog.find_next()
+        dialog.replace_all()
+        assert dialog.match_index is None
+        assert dialog.match_count_label.text().startswith("Invalid pattern")
+        assert editor.toPlainText() == "(a"
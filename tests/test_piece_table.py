@@ -0,0 +1,132 @@
+"""Tests for the piece-table buffer and the CodeEditor virtual viewport."""
+
+import pytest
+from main import PieceTable, CodeEditor, TextEditor
+
+
+def make_lines(count):
+    return "".join(f"line {i}\n" for i in range(count))
+
+
+class TestPieceTable:
+    """Tests for PieceTable editing and line lookups."""
+
+    def test_read_original(self):
+        table = PieceTable(b"hello\nworld")
+        assert table.read() == b"hello\nworld"
+        assert table.byte_length == 11
+        assert not table.modified
+
+    def test_insert_and_delete(self):
+        table = PieceTable(b"hello world")
+        table.insert(5, b",")
+        assert table.read() == b"hello, world"
+        table.delete(0, 7)
+        assert table.read() == b"world"
+        table.insert(5, b"!")
+        table.insert(6, b"!")
+        assert table.read() == b"world!!"
+        assert table.modified
+
+    def test_consecutive_inserts_share_one_piece(self):
+        table = PieceTable(b"abc")
+        table.insert(3, b"d")
+        table.insert(4, b"e")
+        assert table.read() == b"abcde"
+        assert len(table.pieces) == 2
+
+    def test_replace_spanning_pieces(self):
+        table = PieceTable(b"0123456789")
+        table.insert(5, b"xx")
+        table.replace(3, 6, b"-")
+        assert table.read() == b"012-789"
+
+    def test_line_start_and_count(self):
+        table = PieceTable(make_lines(100).encode())
+        assert table.line_count() == 101
+        assert table.line_start(0) == 0
+        assert table.read(table.line_start(42), table.line_start(43)) == b"line 42\n"
+        assert table.line_start(500) == table.byte_length
+
+    def test_line_start_across_small_index_chunks(self, monkeypatch):
+        monkeypatch.setattr(PieceTable, 'INDEX_CHUNK', 64)
+        text = make_lines(1000).encode()
+        table = PieceTable(text)
+        table.insert(table.line_start(10), b"new\nlines\n")
+        expected = text.split(b"\n")
+        expected[10:10] = [b"new", b"lines"]
+        assert table.line_count() == len(expected)
+        for line in (0, 9, 10, 11, 12, 500, 1001):
+            start = table.line_start(line)
+            assert table.read(start, table.line_start(line + 1)).rstrip(b"\n") == expected[line]
+
+    def test_from_file_and_save(self, tmp_path):
+        path = tmp_path / "big.txt"
+        path.write_bytes(make_lines(50).encode())
+        table = PieceTable.from_file(str(path))
+        table.insert(0, b"header\n")
+        table.save(str(path))
+        table.close()
+        assert path.read_bytes() == b"header\n" + make_lines(50).encode()
+        assert not table.modified
+
+    def test_save_keeps_file_mode(self, tmp_path):
+        path = tmp_path / "script.sh"
+        path.write_bytes(make_lines(5).encode())
+        path.chmod(0o755)
+        table = PieceTable.from_file(str(path))
+        table.insert(0, b"#!/bin/sh\n")
+        table.save(str(path))
+        table.close()
+        assert path.stat().st_mode & 0o777 == 0o755
+
+
+class TestVirtualViewport:
+    """Tests for CodeEditor showing a PieceTable through a window of blocks."""
+
+    def test_only_window_is_materialized(self, qtbot, monkeypatch):
+        monkeypatch.setattr(CodeEditor, 'VIRTUAL_WINDOW_LINES', 100)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.load_buffer(PieceTable(make_lines(1000).encode()))
+        assert editor.blockCount() == 100
+        assert editor.toPlainText().startswith("line 0\n")
+
+    def test_show_buffer_line_moves_window(self, qtbot, monkeypatch):
+        monkeypatch.setattr(CodeEditor, 'VIRTUAL_WINDOW_LINES', 100)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        editor.load_buffer(PieceTable(make_lines(1000).encode()))
+        editor.show_buffer_line(700)
+        assert editor.window_first_line == 650
+        first_block = editor.document().firstBlock().text()
+        assert first_block == "line 650"
+
+    def test_window_edits_are_committed(self, qtbot, monkeypatch):
+        monkeypatch.setattr(CodeEditor, 'VIRTUAL_WINDOW_LINES', 100)
+        editor = CodeEditor()
+        qtbot.addWidget(editor)
+        buffer = PieceTable(make_lines(1000).encode())
+        editor.load_buffer(buffer)
+        cursor = editor.textCursor()
+        cursor.insertText("edited ")
+        editor.show_buffer_line(900)
+        assert buffer.read(0, 14) == b"edited line 0\n"
+        assert buffer.modified
+        assert editor.document().isModified()
+
+    def test_huge_file_opens_through_piece_table(self, qtbot, tmp_path, monkeypatch):
+        monkeypatch.setattr(TextEditor, 'VIRTUAL_VIEW_THRESHOLD', 1024)
+        monkeypatch.setattr(CodeEditor, 'VIRTUAL_WINDOW_LINES', 50)
+        path = tmp_path / "huge.log"
+        path.write_text(make_lines(500), encoding='utf-8')
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(path))
+        assert window.editor.buffer is not None
+        assert window.editor.blockCount() == 50
+        assert not window.editor.document().isModified()
+
+        window.editor.textCursor().insertText("# ")
+        assert window.save_file()
+        assert path.read_text(encoding='utf-8') == "# " + make_lines(500)
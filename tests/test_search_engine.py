@@ -0,0 +1,592 @@
+"""Tests for the multi-file SearchEngine and its streaming results."""
+
+import os
+import re
+import pytest
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QWidget
+from main import SearchEngine, search_file, MultiFileSearchDialog, MultiFileSearchResultsDialog, TextEditor
+
+
+def write_tree(folder, count, text="nothing here\nneedle in line two\n"):
+    folder.mkdir(exist_ok=True)
+    for i in range(count):
+        sub = folder / f"dir{i % 4}"
+        sub.mkdir(exist_ok=True)
+        (sub / f"file{i}.txt").write_text(text, encoding='utf-8')
+
+
+class TestSearchFile:
+    """Tests for the per-file byte search."""
+
+    def test_result_format(self, tmp_path):
+        path = tmp_path / "a.txt"
+        path.write_bytes(b"first\r\nsay Hello there\r\nhello\n")
+        results = search_file(str(path), "hello")
+        assert results == [
+            (str(path), 2, "say Hello there\n", 4, "Hello"),
+            (str(path), 3, "hello\n", 0, "hello"),
+        ]
+
+    def test_match_start_counts_characters(self, tmp_path):
+        path = tmp_path / "u.txt"
+        path.write_text("héllo wörld\n", encoding='utf-8')
+        assert search_file(str(path), "wörld") == [(str(path), 1, "héllo wörld\n", 6, "wörld")]
+        assert search_file(str(path), "WORLD") == []
+        assert search_file(str(path), "WÖRLD")[0][3] == 6
+
+    def test_empty_matches_are_not_results(self, tmp_path):
+        from main import SearchQuery
+        path = tmp_path / "a.txt"
+        path.write_text("one\n\ntwo\n")
+        assert search_file(str(path), SearchQuery("^", regex=True)) == []
+        assert [line for _, line, _, _, _ in search_file(str(path), SearchQuery("^.", regex=True))] == [1, 3]
+
+
+class TestSearchEngine:
+    """Tests for in-process and pooled folder searches."""
+
+    def test_small_tree_runs_in_process(self, tmp_path, monkeypatch):
+        write_tree(tmp_path, 5)
+        monkeypatch.setattr(SearchEngine, 'pool', classmethod(lambda cls: pytest.fail("pool used")))
+        results = SearchEngine(str(tmp_path), "NEEDLE").run()
+        assert len(results) == 5
+        assert all(r[1] == 2 and r[4] == "needle" for r in results)
+
+    def test_large_tree_uses_pool(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(SearchEngine, 'POOL_MIN_FILES', 8)
+        monkeypatch.setattr(SearchEngine, 'BATCH_FILES', 3)
+        write_tree(tmp_path, 40)
+        engine = SearchEngine(str(tmp_path), "needle")
+        results = engine.run()
+        assert len(results) == 40
+        assert engine.files_searched == 40
+        assert len({r[0] for r in results}) == 40
+
+    def test_streams_batches_and_finishes(self, qtbot, tmp_path, monkeypatch):
+        monkeypatch.setattr(SearchEngine, 'BATCH_FILES', 2)
+        write_tree(tmp_path, 7)
+        engine = SearchEngine(str(tmp_path), "needle")
+        batches = []
+        engine.results_found.connect(batches.append)
+        with qtbot.waitSignal(engine.finished, timeout=5000) as blocker:
+            engine.start()
+        assert blocker.args == [False]
+        assert len(batches) == 4
+        assert sum(len(b) for b in batches) == 7
+
+    def test_background_results_are_unpickled_on_the_gui_thread(self, qtbot, tmp_path):
+        import threading
+        write_tree(tmp_path, 3)
+        engine = SearchEngine(str(tmp_path), "needle")
+        threads = []
+        engine.results_found.connect(lambda batch: threads.append(threading.current_thread()))
+        with qtbot.waitSignal(engine.finished, timeout=30000):
+            engine.start()
+        assert threads == [threading.main_thread()]
+        assert engine.match_count == 3
+
+    def test_unreadable_files_are_reported(self, tmp_path, monkeypatch):
+        import main
+        write_tree(tmp_path, 3)
+        unreadable = str(tmp_path / "dir1" / "file1.txt")
+        real_search_file = main.search_file
+
+        def fail_one(file_path, query):
+            if file_path == unreadable:
+                raise PermissionError(13, "Permission denied", file_path)
+            return real_search_file(file_path, query)
+
+        monkeypatch.setattr(main, 'search_file', fail_one)
+        engine = SearchEngine(str(tmp_path), "needle")
+        assert len(engine.run()) == 2
+        assert [path for path, error in engine.errors] == [unreadable]
+        assert "Permission denied" in engine.errors[0][1]
+
+    def test_programming_errors_are_not_swallowed(self, tmp_path, monkeypatch):
+        import main
+        write_tree(tmp_path, 2)
+        monkeypatch.setattr(main, 'search_file', lambda file_path, query: None + 1)
+        with pytest.raises(TypeError):
+            SearchEngine(str(tmp_path), "needle").run()
+
+    def test_cancel_stops_search(self, tmp_path):
+        write_tree(tmp_path, 10)
+        engine = SearchEngine(str(tmp_path), "needle")
+        engine.cancel()
+        assert engine.run() == []
+
+
+class TestStreamingResults:
+    """Tests for Find All feeding the results window as matches arrive."""
+
+    def test_results_dialog_appends_batches(self, qtbot):
+        window = TextEditor()
+        qtbot.addWidget(window)
+        dialog = MultiFileSearchResultsDialog([("a.txt", 1, "x\n", 0, "x")], window)
+        qtbot.addWidget(dialog)
+        dialog.search_started()
+        assert "searching" in dialog.windowTitle()
+        dialog.add_results([("b.txt", 2, "xx\n", 1, "x")] * 2)
+        dialog.search_finished()
+        assert len(dialog.results) == 3
+        assert dialog.windowTitle() == "Search Results - 3 matches"
+
+    def test_find_all_opens_results_with_first_batch(self, qtbot, tmp_path, monkeypatch):
+        write_tree(tmp_path, 3)
+        window = TextEditor()
+        qtbot.addWidget(window)
+        dialog = MultiFileSearchDialog(str(tmp_path), window)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("needle")
+        shown = []
+        monkeypatch.setattr(MultiFileSearchResultsDialog, 'exec', lambda self: shown.append(list(self.results)))
+        dialog.find_all()
+        assert len(shown) == 1
+        assert len(shown[0]) == 3
+
+
+    def test_results_view_paints_only_a_model(self, qtbot):
+        window = TextEditor()
+        qtbot.addWidget(window)
+        results = [("f.txt", i + 1, f"line {i} needle\n", 7, "needle") for i in range(5000)]
+        dialog = MultiFileSearchResultsDialog(results, window)
+        qtbot.addWidget(dialog)
+        dialog.show()
+        qtbot.waitExposed(dialog)
+        assert dialog.results_view.model().rowCount() == 5000
+        # No per-result widgets are created
+        assert len(dialog.findChildren(QWidget)) < 50
+        dialog.add_results([("g.txt", 1, "needle\n", 0, "needle")])
+        last = dialog.results_view.model().index(5000, 0)
+        assert last.data(Qt.ToolTipRole) == "g.txt"
+
+class TestTrigramIndex:
+    """Tests for the persistent trigram index narrowing folder searches."""
+
+    def make_index(self, folder, tmp_path):
+        from main import TrigramIndex
+        return TrigramIndex(str(folder), str(tmp_path / "index" / "tree.idx"))
+
+    def test_candidates_contain_every_query_trigram(self, tmp_path):
+        folder = tmp_path / "tree"
+        folder.mkdir()
+        (folder / "a.txt").write_text("alpha NEEDLE omega\n")
+        (folder / "b.txt").write_text("needs an eel\n")
+        (folder / "c.txt").write_text("no\n")
+        index = self.make_index(folder, tmp_path)
+        assert index.candidates("needle") == [str(folder / "a.txt")]
+        # Queries too short for a trigram match every file
+        assert len(index.candidates("ne")) == 3
+
+    def test_index_persists_and_rereads_only_changed_files(self, tmp_path):
+        folder = tmp_path / "tree"
+        write_tree(folder, 6)
+        index = self.make_index(folder, tmp_path)
+        index.refresh()
+        assert index.files_indexed == 6
+
+        reopened = self.make_index(folder, tmp_path)
+        changed = folder / "dir1" / "file1.txt"
+        changed.write_text("replaced text\n")
+        os.utime(changed, ns=(1, 1))
+        (folder / "dir2" / "file2.txt").unlink()
+        assert len(reopened.candidates("needle")) == 4
+        assert reopened.files_indexed == 1
+
+    def test_moves_and_deletes_skip_rereading(self, tmp_path):
+        folder = tmp_path / "tree"
+        write_tree(folder, 4)
+        index = self.make_index(folder, tmp_path)
+        index.refresh()
+        os.rename(folder / "dir0", folder / "moved")
+        index.file_moved(str(folder / "dir0"), str(folder / "moved"))
+        (folder / "dir3" / "file3.txt").unlink()
+        index.file_deleted(str(folder / "dir3" / "file3.txt"))
+        index.mark_stale()
+        paths = index.candidates("needle")
+        assert index.files_indexed == 0
+        assert sorted(paths) == sorted(str(p) for p in folder.rglob("*.txt"))
+
+    def test_queries_refresh_only_when_stale(self, tmp_path, monkeypatch):
+        from main import TrigramIndex
+        folder = tmp_path / "tree"
+        write_tree(folder, 3)
+        index = self.make_index(folder, tmp_path)
+        walks = []
+        real_refresh = TrigramIndex.refresh
+        monkeypatch.setattr(TrigramIndex, 'refresh', lambda self: walks.append(1) or real_refresh(self))
+        assert len(index.candidates("needle")) == 3
+        assert len(index.candidates("needle")) == 3
+        assert len(walks) == 1
+        (folder / "new.txt").write_text("needle\n")
+        index.mark_stale()
+        assert len(index.candidates("needle")) == 4
+        monkeypatch.setattr(TrigramIndex, 'REFRESH_SECONDS', 0.0)
+        index.candidates("needle")
+        assert len(walks) == 3
+
+    def test_files_above_the_index_cap_follow_the_search_filter(self, tmp_path, monkeypatch):
+        from main import SearchFilter
+        monkeypatch.setattr(SearchFilter, 'MAX_FILE_SIZE', 100)
+        folder = tmp_path / "tree"
+        write_tree(folder, 2)
+        (folder / "big.txt").write_text("needle\n" + "x" * 200)
+        index = self.make_index(folder, tmp_path)
+        assert len(index.candidates("needle", SearchFilter())) == 2
+        wide = SearchFilter(max_file_size=1000)
+        assert str(folder / "big.txt") in index.candidates("needle", wide)
+        results = SearchEngine(str(folder), "needle", index=index, search_filter=wide).run()
+        assert len(results) == 3
+        # A search past .gitignore walks the tree instead of the index
+        assert not index.covers(SearchFilter(use_gitignore=False))
+
+    def test_search_engine_reads_only_candidates(self, tmp_path, monkeypatch):
+        folder = tmp_path / "tree"
+        write_tree(folder, 8, text="plain\n")
+        (folder / "hit.txt").write_text("the needle\n")
+        index = self.make_index(folder, tmp_path)
+        index.refresh()
+        read = []
+        import main
+        original = main.search_file
+        monkeypatch.setattr(main, 'search_file', lambda path, text: read.append(path) or original(path, text))
+        results = SearchEngine(str(folder), "needle", index=index).run()
+        assert read == [str(folder / "hit.txt")]
+        assert results[0][1:] == (1, "the needle\n", 4, "needle")
+
+
+
+class TestSearchFilter:
+    """Tests for pruning, globs, .gitignore and binary skipping."""
+
+    def walked(self, folder, search_filter):
+        return sorted(os.path.relpath(path, folder).replace(os.sep, '/')
+                      for path, st in search_filter.walk(str(folder)))
+
+    def test_default_excludes_prune_directories(self, tmp_path):
+        (tmp_path / ".git" / "objects").mkdir(parents=True)
+        (tmp_path / ".git" / "objects" / "ab").write_text("needle")
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "a.py").write_text("needle")
+        (tmp_path / "src" / "a.pyc").write_text("needle")
+        from main import SearchFilter
+        assert self.walked(tmp_path, SearchFilter()) == ["src/a.py"]
+
+    def test_include_and_exclude_globs(self, tmp_path):
+        from main import SearchFilter
+        for name in ("a.py", "b.txt", "build/c.py", "src/d.py"):
+            (tmp_path / name).parent.mkdir(exist_ok=True)
+            (tmp_path / name).write_text("x")
+        search_filter = SearchFilter(SearchFilter.parse_globs("*.py"), SearchFilter.parse_globs("build, src/d.py"))
+        assert self.walked(tmp_path, search_filter) == ["a.py"]
+        assert search_filter.accepts("src/e.py")
+        assert not search_filter.accepts("build/e.py")
+
+    def test_gitignore_rules(self, tmp_path):
+        from main import SearchFilter
+        (tmp_path / ".gitignore").write_text("*.log\n/dist/\n!keep.log\n# comment\n")
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / ".gitignore").write_text("gen_*.py\n")
+        for name in ("a.log", "keep.log", "dist/x.txt", "pkg/dist/y.txt", "pkg/gen_1.py",
+                     "pkg/main.py", "gen_2.py"):
+            (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / name).write_text("x")
+        assert self.walked(tmp_path, SearchFilter()) == [
+            ".gitignore", "gen_2.py", "keep.log", "pkg/.gitignore", "pkg/dist/y.txt", "pkg/main.py"]
+        assert "a.log" in self.walked(tmp_path, SearchFilter(use_gitignore=False))
+
+    def test_size_cap_and_binary_sniff(self, tmp_path):
+        from main import SearchFilter
+        (tmp_path / "big.txt").write_text("needle " * 100)
+        (tmp_path / "blob.dat").write_bytes(b"needle\0\1\2")
+        (tmp_path / "ok.txt").write_text("needle")
+        results = SearchEngine(str(tmp_path), "needle", search_filter=SearchFilter(max_file_size=100)).run()
+        assert [os.path.basename(r[0]) for r in results] == ["ok.txt"]
+
+
+class TestReplaceTransaction:
+    """Tests for all-or-nothing multi-file replace."""
+
+    def test_commit_replaces_and_counts(self, tmp_path):
+        from main import ReplaceTransaction
+        (tmp_path / "a.txt").write_bytes(b"Foo foo\r\nbar\r\n")
+        (tmp_path / "b.txt").write_text("no match")
+        transaction = ReplaceTransaction(str(tmp_path), "foo", r"\1$x")
+        assert transaction.run()
+        assert transaction.replaced_count == 2
+        assert transaction.files == [str(tmp_path / "a.txt")]
+        # Replacement text is literal and line endings are kept
+        assert (tmp_path / "a.txt").read_bytes() == b"\\1$x \\1$x\r\nbar\r\n"
+        assert not [p for p in os.listdir(tmp_path) if p.endswith('.tmp')]
+        transaction.discard()
+
+    def test_failure_changes_nothing(self, tmp_path):
+        from main import ReplaceTransaction
+        (tmp_path / "a.txt").write_text("foo")
+        (tmp_path / "b.txt").write_bytes(b"foo \xff\xfe")
+        transaction = ReplaceTransaction(str(tmp_path), "foo", "bar")
+        assert not transaction.run()
+        assert [os.path.basename(p) for p, error in transaction.errors] == ["b.txt"]
+        assert (tmp_path / "a.txt").read_text() == "foo"
+        assert sorted(os.listdir(tmp_path)) == ["a.txt", "b.txt"]
+
+    def test_undecodable_file_without_match_is_skipped(self, tmp_path):
+        from main import ReplaceTransaction, SearchQuery
+        (tmp_path / "a.txt").write_text("x = 1\n")
+        (tmp_path / "latin1.txt").write_bytes("café = 2\n".encode('latin-1'))
+        transaction = ReplaceTransaction(str(tmp_path), SearchQuery(r"x = (\d)", regex=True), r"y = \1")
+        assert transaction.run()
+        assert transaction.errors == []
+        assert (tmp_path / "a.txt").read_text() == "y = 1\n"
+        assert (tmp_path / "latin1.txt").read_bytes() == "café = 2\n".encode('latin-1')
+        transaction.discard()
+
+    def test_word_and_unicode_case_queries_skip_undecodable_files(self, tmp_path):
+        from main import ReplaceTransaction, SearchQuery
+        (tmp_path / "a.txt").write_text("foo food Wörld\n", encoding='utf-8')
+        (tmp_path / "latin1.txt").write_bytes("naïve\n".encode('latin-1'))
+        for query, replacement in ((SearchQuery("foo", whole_word=True), "bar"),
+                                   (SearchQuery("wörld"), "Welt")):
+            assert query.bytes_pattern() is None
+            transaction = ReplaceTransaction(str(tmp_path), query, replacement)
+            assert transaction.run()
+            assert transaction.errors == []
+            transaction.discard()
+        assert (tmp_path / "a.txt").read_text(encoding='utf-8') == "bar food Welt\n"
+        assert (tmp_path / "latin1.txt").read_bytes() == "naïve\n".encode('latin-1')
+
+    def test_failure_while_committing_restores_replaced_files(self, tmp_path, monkeypatch):
+        import main
+        from main import ReplaceTransaction
+        for name in ("a.txt", "b.txt"):
+            (tmp_path / name).write_text("foo " + name)
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        monkeypatch.setattr(main.os, 'replace', failing_replace)
+        transaction = ReplaceTransaction(str(tmp_path), "foo", "bar")
+        assert not transaction.run()
+        monkeypatch.undo()
+        assert (tmp_path / "a.txt").read_text() == "foo a.txt"
+        assert (tmp_path / "b.txt").read_text() == "foo b.txt"
+        assert transaction.errors
+
+    def test_cancel_and_rollback(self, tmp_path):
+        from main import ReplaceTransaction
+        (tmp_path / "a.txt").write_text("foo")
+        cancelled = ReplaceTransaction(str(tmp_path), "foo", "bar")
+        cancelled.cancel()
+        assert not cancelled.run()
+        assert (tmp_path / "a.txt").read_text() == "foo"
+
+        transaction = ReplaceTransaction(str(tmp_path), "foo", "bar")
+        assert transaction.run()
+        assert (tmp_path / "a.txt").read_text() == "bar"
+        assert transaction.rollback() == [str(tmp_path / "a.txt")]
+        assert (tmp_path / "a.txt").read_text() == "foo"
+
+    def test_rollback_keeps_files_changed_since(self, tmp_path):
+        from main import ReplaceTransaction
+        (tmp_path / "a.txt").write_text("foo")
+        (tmp_path / "b.txt").write_text("foo")
+        transaction = ReplaceTransaction(str(tmp_path), "foo", "bar")
+        assert transaction.run()
+        (tmp_path / "b.txt").write_text("edited after the replace")
+        assert transaction.rollback() == [str(tmp_path / "a.txt")]
+        assert (tmp_path / "a.txt").read_text() == "foo"
+        assert (tmp_path / "b.txt").read_text() == "edited after the replace"
+        assert [path for path, error in transaction.errors] == [str(tmp_path / "b.txt")]
+
+    def test_regex_never_matches_across_lines(self, tmp_path):
+        from main import ReplaceTransaction, SearchQuery
+        (tmp_path / "a.txt").write_text("word  one\nword two\n")
+        crossing = ReplaceTransaction(str(tmp_path), SearchQuery(r"one\nword", regex=True), "x")
+        assert not crossing.run()
+        transaction = ReplaceTransaction(str(tmp_path), SearchQuery(r"\s+", regex=True), "_")
+        assert transaction.run()
+        assert transaction.replaced_count == 2
+        assert (tmp_path / "a.txt").read_text() == "word_one\nword_two\n"
+        transaction.discard()
+
+    def test_pool_prepares_large_trees(self, tmp_path, monkeypatch):
+        from main import ReplaceTransaction
+        monkeypatch.setattr(SearchEngine, 'POOL_MIN_FILES', 8)
+        monkeypatch.setattr(SearchEngine, 'BATCH_FILES', 3)
+        write_tree(tmp_path, 20)
+        transaction = ReplaceTransaction(str(tmp_path), "needle", "pin")
+        assert transaction.run()
+        assert transaction.replaced_count == 20
+        assert all("pin in line two" in p.read_text() for p in tmp_path.rglob("*.txt"))
+        transaction.discard()
+
+    def test_dialog_undo_replace_all(self, qtbot, tmp_path, monkeypatch):
+        (tmp_path / "a.txt").write_text("hello")
+        window = TextEditor()
+        qtbot.addWidget(window)
+        dialog = MultiFileSearchDialog(str(tmp_path), window)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("hello")
+        dialog.replace_input.setText("bye")
+        messages = []
+        monkeypatch.setattr("main.QMessageBox.information", lambda *args: messages.append(args[1]))
+        dialog.replace_all_files()
+        assert (tmp_path / "a.txt").read_text() == "bye"
+        assert dialog.undo_replace_btn.isEnabled()
+        dialog.undo_replace_all()
+        assert (tmp_path / "a.txt").read_text() == "hello"
+        assert messages == ["Replace Complete", "Undo Replace All"]
+
+
+    def test_replace_all_reloads_only_clean_tabs(self, qtbot, tmp_path, monkeypatch):
+        (tmp_path / "clean.txt").write_text("hello")
+        (tmp_path / "edited.txt").write_text("hello")
+        window = TextEditor()
+        qtbot.addWidget(window)
+        window.load_file(str(tmp_path / "clean.txt"))
+        clean = window.editor
+        window.load_file(str(tmp_path / "edited.txt"))
+        edited = window.editor
+        edited.textCursor().insertText("unsaved ")
+        dialog = MultiFileSearchDialog(str(tmp_path), window)
+        qtbot.addWidget(dialog)
+        dialog.find_input.setText("hello")
+        dialog.replace_input.setText("bye")
+        messages = []
+        monkeypatch.setattr("main.QMessageBox.information", lambda *args: messages.append(args[2]))
+        dialog.replace_all_files()
+        assert clean.toPlainText() == "bye"
+        assert not clean.document().isModified()
+        assert clean.dirty_tracker.is_at_saved_state()
+        assert edited.toPlainText() == "unsaved hello"
+        assert edited.document().isModified()
+        assert str(tmp_path / "edited.txt") in messages[0]
+
+class TestSearchQuery:
+    """Tests for search modes, the pattern cache and the literal fast path."""
+
+    def test_plain_queries_skip_the_regex_engine(self):
+        from main import SearchQuery, LiteralPattern
+        pattern = SearchQuery("a.b").pattern()
+        assert isinstance(pattern, LiteralPattern)
+        assert [m.span() for m in pattern.finditer("A.B axb a.b")] == [(0, 3), (8, 11)]
+        assert SearchQuery("a.b", case_sensitive=True).pattern().subn("x", "A.B a.b") == ("A.B x", 1)
+        # Non-ASCII text falls back to Unicode case folding
+        assert [m.group() for m in SearchQuery("straße").pattern().finditer("STRASSE Straße")] == ["Straße"]
+
+    def test_empty_text_matches_nothing(self):
+        from main import SearchQuery
+        for case_sensitive in (False, True):
+            pattern = SearchQuery("", case_sensitive=case_sensitive).pattern()
+            assert list(pattern.finditer("abc")) == []
+            assert pattern.subn("x", "abc") == ("abc", 0)
+
+    def test_patterns_are_cached(self):
+        from main import SearchQuery
+        assert SearchQuery("foo", regex=True).pattern() is SearchQuery("foo", regex=True).pattern()
+        assert SearchQuery("foo").pattern() is not SearchQuery("foo", case_sensitive=True).pattern()
+
+    def test_regex_and_whole_word(self):
+        from main import SearchQuery
+        regex = SearchQuery(r"(\w+)@(\w+)", regex=True)
+        assert regex.subn(r"\2 at \1", "me@home, you@work") == ("home at me, work at you", 2)
+        # Outside regex mode the replacement is literal
+        assert SearchQuery("a.b").subn(r"\1", "a.b") == (r"\1", 1)
+        word = SearchQuery("foo", whole_word=True)
+        assert [m.start() for m in word.pattern().finditer("foo food afoo foo.")] == [0, 14]
+        with pytest.raises(re.error):
+            SearchQuery("(", regex=True).pattern()
+        with pytest.raises(re.error):
+            SearchQuery("a", regex=True).check_replacement(r"\1")
+
+    def test_bytes_pattern_only_where_bytes_match_correctly(self):
+        from main import SearchQuery
+        assert SearchQuery("hello").bytes_pattern().pattern == b"hello"
+        assert SearchQuery("wörld", case_sensitive=True).bytes_pattern().pattern == "wörld".encode()
+        assert SearchQuery("wörld").bytes_pattern() is None
+        assert SearchQuery("a+", regex=True).bytes_pattern() is None
+        assert SearchQuery("word", whole_word=True).bytes_pattern() is None
+
+    def test_search_file_modes(self, tmp_path):
+        from main import SearchQuery
+        path = tmp_path / "a.py"
+        path.write_text("Foo = food\nfoo(1)\n", encoding='utf-8')
+        starts = lambda query: [(line, start) for _, line, _, start, _ in search_file(str(path), query)]
+        assert starts(SearchQuery("foo", case_sensitive=True)) == [(1, 6), (2, 0)]
+        assert starts(SearchQuery("foo", whole_word=True)) == [(1, 0), (2, 0)]
+        assert starts(SearchQuery(r"^foo\(\d\)$", regex=True)) == [(2, 0)]
+
+    def test_regex_search_does_not_filter_by_trigrams(self, tmp_path):
+        from main import SearchQuery, TrigramIndex
+        folder = tmp_path / "tree"
+        write_tree(folder, 4)
+        (folder / "other.txt").write_text("nedle\n")
+        index = TrigramIndex(str(folder), str(tmp_path / "index" / "tree.idx"))
+        assert len(index.candidates(SearchQuery("needle", whole_word=True))) == 4
+        # A regex has no literal text to look up, so every file is a candidate
+        assert len(index.candidates(SearchQuery("ne+dle", regex=True))) == 5
+
+
+class TestCommandLine:
+    """Tests for the headless search and replace commands."""
+
+    def test_search_prints_json(self, tmp_path, capsys):
+        import json
+        from main import run_cli
+        write_tree(tmp_path, 3)
+        assert run_cli(["search", "NEEDLE", str(tmp_path)]) == 0
+        output = json.loads(capsys.readouterr().out)
+        assert output["match_count"] == 3
+        assert output["files_searched"] == 3
+        assert output["matches"][0]["line"] == 2
+        assert output["matches"][0]["text"] == "needle in line two"
+        assert run_cli(["search", "-s", "NEEDLE", str(tmp_path)]) == 1
+
+    def test_replace_is_all_or_nothing(self, tmp_path, capsys):
+        import json
+        from main import run_cli
+        (tmp_path / "a.txt").write_text("x = 1\n")
+        (tmp_path / "b.txt").write_text("y = 2\n")
+        assert run_cli(["replace", "-e", r"(\w) = (\d)", r"\2 = \1", str(tmp_path),
+                        "--include", "a.*"]) == 0
+        output = json.loads(capsys.readouterr().out)
+        assert output["replaced_count"] == 1 and output["committed"]
+        assert (tmp_path / "a.txt").read_text() == "1 = x\n"
+        assert (tmp_path / "b.txt").read_text() == "y = 2\n"
+
+    def test_folder_may_follow_options(self, tmp_path, capsys):
+        import json
+        from main import run_cli
+        write_tree(tmp_path, 3)
+        (tmp_path / "skip.md").write_text("needle\n")
+        assert run_cli(["search", "needle", "--include", "*.txt", str(tmp_path)]) == 0
+        assert json.loads(capsys.readouterr().out)["match_count"] == 3
+        assert run_cli(["search", "ne+dle", "-e", str(tmp_path)]) == 0
+        assert json.loads(capsys.readouterr().out)["match_count"] == 4
+
+    def test_empty_pattern_is_rejected(self, tmp_path, capsys):
+        from main import run_cli
+        write_tree(tmp_path, 2)
+        with pytest.raises(SystemExit) as exit_info:
+            run_cli(["search", "", str(tmp_path)])
+        assert exit_info.value.code == 2
+        assert "empty" in capsys.readouterr().err
+
+    def test_runs_without_a_display(self, tmp_path):
+        import json
+        import subprocess
+        import sys
+        write_tree(tmp_path, 2)
+        env = {k: v for k, v in os.environ.items()
+               if k not in ("DISPLAY", "WAYLAND_DISPLAY", "QT_QPA_PLATFORM")}
+        main_py = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+        completed = subprocess.run([sys.executable, main_py, "search", "needle", str(tmp_path)],
+                                   capture_output=True, text=True, env=env, timeout=60)
+        assert completed.returncode == 0, completed.stderr
+        assert json.loads(completed.stdout)["match_count"] == 2